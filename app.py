@@ -1,12 +1,137 @@
 from flask import Flask
 from flask_restful import Api
 
+# How IDs are allocated - 'counter' for one process, 'block' to reserve
+# blocks of IDs from a file shared by several processes, or 'snowflake' for
+# time-based IDs, with a different worker number per process (see ids.py)
+ID_ALLOCATOR = 'counter'
+ID_BLOCK_PATH = 'bowling.ids'
+ID_BLOCK_SIZE = 1000
+ID_WORKER = 0
+# Storage backend for the DB - 'memory', 'sqlite', 'journal', 'shared' or
+# 'tiered' (see persistence.py)
+DB_BACKEND = 'memory'
+# SQLite database file, and its synchronous pragma
+DB_PATH = 'bowling.db'
+DB_SYNCHRONOUS = 'FULL'
+# Journal file, how many records to write between fsyncs (0 to leave it to the
+# OS), and how many records to write between snapshots
+JOURNAL_PATH = 'bowling.journal'
+JOURNAL_FSYNC_EVERY = 1
+JOURNAL_SNAPSHOT_EVERY = 100000
+# Shared memory file for the 'shared' backend, which lets several worker
+# processes serve the same data, and how many players and games it holds,
+# with up to how many players per game
+SHARED_PATH = '/dev/shm/bowling'
+SHARED_PLAYERS = 100000
+SHARED_GAMES = 100000
+SHARED_MAX_PLAYERS = 8
+# For the 'tiered' backend: where to archive completed games, seconds a
+# completed game can go unread before it's archived, the most games to keep in
+# memory before archiving the least recently used completed ones early, and
+# how many archived games to cache once read
+TIERED_PATH = 'bowling.archive'
+TIERED_IDLE = 300
+TIERED_MAX_HOT = 100000
+TIERED_CACHE_SIZE = 1024
+# How responses are serialized - 'compiled' (see serializers.py), or 'marshal'
+# for flask_restful's marshal
+SERIALIZER = 'compiled'
+# How many rendered game responses to cache
+RENDER_CACHE_SIZE = 4096
+# Full game responses of at least this many bytes are gzipped for clients
+# that accept it, at this level - None not to compress them
+GZIP_MIN_SIZE = 1024
+GZIP_LEVEL = 6
+# Seconds between heartbeats on idle event streams, and how many updates per
+# game are kept for clients resuming a stream
+SSE_HEARTBEAT = 15
+SSE_HISTORY = 32
+# Server for runserver.py - 'flask' for the development server, 'gevent'
+# to hold many idle event streams without a thread each, or 'asgi' to serve
+# the players, games and frames routes from an event loop (see asgi.py)
+SERVER = 'flask'
+# For the 'asgi' server: threads to write to storage on, off the event loop,
+# and threads to run the Flask app on for the routes it passes on to it (an
+# open event stream holds one)
+ASGI_THREADS = 8
+ASGI_FLASK_THREADS = 64
+# Whether to time requests and serve metrics at /metrics
+METRICS = True
+# Profiling requests with cProfile - a directory to write their stats to
+# (None to turn it off), a request header that has a request profiled when
+# it's set (None to ignore it), the fraction of other requests to profile at
+# random, and how many stats files to keep.  `python -m profiling` shows the
+# functions that took the most time
+PROFILE_DIR = None
+PROFILE_HEADER = 'X-Profile'
+PROFILE_SAMPLE = 0.0
+PROFILE_KEEP = 1000
+# File to record every request to, for replaying later with
+# `python -m benchmarks.load replay` - None not to record
+RECORD_TRAFFIC = None
+HOST = '127.0.0.1'
+PORT = 5000
+
 app = Flask(__name__)
 app.config.from_object(__name__)
+app.config.from_envvar('BOWLING_SETTINGS', silent=True)
+
+import ids
+ids.configure(app.config)
+
+import metrics
+metrics.configure(app.config)
+if app.config['METRICS']:
+    metrics.instrument(app)
+
+if app.config['PROFILE_DIR']:
+    import profiling
+    profiling.instrument(app, app.config['PROFILE_DIR'],
+                         app.config['PROFILE_HEADER'],
+                         app.config['PROFILE_SAMPLE'], app.config['PROFILE_KEEP'])
+
+if app.config['RECORD_TRAFFIC']:
+    import traffic
+    traffic.record(app, app.config['RECORD_TRAFFIC'])
+
+from persistence import DB
+DB.configure(app.config)
+
+from routes import (RestPlayer, RestPlayerStats, RestLeaderboard, RestGame,
+                    RestGameList, RestGameEvents, RestFrameRecorder,
+                    RestShotRecorder, RestFrameBatch, RestExport, RestImport,
+                    RestMetrics)
+from events import hub
+from models import Player, Game
+
+RestGame.rendered.maxsize = app.config['RENDER_CACHE_SIZE']
+RestGame.compressed.maxsize = app.config['RENDER_CACHE_SIZE']
+hub.history = app.config['SSE_HISTORY']
 
-from routes import RestPlayer, RestGame, RestFrameRecorder
+metrics.registry.gauge('bowling_players', 'Players in the DB',
+                       lambda: len(DB.get(Player)))
+metrics.registry.gauge('bowling_games', 'Games in the DB',
+                       lambda: len(DB.get(Game)))
+metrics.registry.gauge('bowling_render_cache_entries',
+                       'Rendered game responses cached',
+                       lambda: len(RestGame.rendered))
+metrics.registry.gauge('bowling_gzip_cache_entries',
+                       'Gzipped game responses cached',
+                       lambda: len(RestGame.compressed))
+metrics.registry.gauge('process_resident_memory_bytes',
+                       'Resident memory size in bytes', metrics.resident_memory)
 
 api = Api(app)
 api.add_resource(RestPlayer, '/player', '/player/<int:id>')
+api.add_resource(RestPlayerStats, '/player/<int:id>/stats')
+api.add_resource(RestLeaderboard, '/leaderboard')
 api.add_resource(RestGame, '/game', '/game/<int:id>')
+api.add_resource(RestGameList, '/games', '/player/<int:pid>/games')
+api.add_resource(RestGameEvents, '/game/<int:id>/events')
 api.add_resource(RestFrameRecorder, '/game/<int:gid>/player/<int:pid>/frame')
+api.add_resource(RestShotRecorder, '/game/<int:gid>/player/<int:pid>/shot')
+api.add_resource(RestFrameBatch, '/game/<int:gid>/frames')
+api.add_resource(RestExport, '/export')
+api.add_resource(RestImport, '/import')
+api.add_resource(RestMetrics, '/metrics')
@@ -0,0 +1,356 @@
+""" An asyncio (ASGI) front end for the REST API, so open connections don't
+each hold a thread.
+
+Run it with `SERVER = 'asgi'` (which needs `pip install uvicorn`), or with any
+ASGI server, e.g. `uvicorn asgi:application`.  The routes lane consoles use -
+creating and getting players and games, and posting frames - are served
+here, through the same schemas, controllers and renderers as the Flask
+resources, with the same request and response formats.  Anything that writes
+to storage, and so might wait for a game's lock or the disk, runs on a pool
+of `ASGI_THREADS` threads.  So do lookups, with the backends whose reads can
+wait too - 'shared', on its fcntl locks, and 'tiered', on its archive.  With
+the others they're done on the event loop, which renders the game's latest
+snapshot.
+
+Every other request is passed on to the Flask app, on a pool of
+`ASGI_FLASK_THREADS` threads - an open event stream holds one of them.
+"""
+import asyncio
+import io
+import logging
+import queue
+import re
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+from urllib.parse import parse_qsl
+
+from flask_restful.representations.json import output_json
+from werkzeug.exceptions import HTTPException, InternalServerError, NotFound
+from werkzeug.http import parse_accept_header, parse_etags, quote_etag
+
+from app import app
+from controllers import PlayerController as pc
+from controllers import GameController as gc
+from models import Player
+from persistence import DB
+from routes import (RestPlayer, RestGame, RestFrameRecorder, serialize_game,
+                    game_body, game_tag, since_version)
+from serializers import serialize_with
+import metrics
+
+log = logging.getLogger(__name__)
+
+serialize_player = serialize_with(Player.serialize)
+
+JSON = [(b'content-type', b'application/json')]
+
+
+class Request(object):
+    """ What the schemas need of a request: its Content-Type, body and query
+    string """
+
+    def __init__(self, scope, body):
+        self.headers = dict((k.decode('latin-1'), v.decode('latin-1'))
+                            for k, v in scope['headers'])
+        self.environ = {'CONTENT_TYPE': self.headers.get('content-type', '')}
+        self.args = dict(parse_qsl(scope['query_string'].decode('latin-1'),
+                                   keep_blank_values=True))
+        self.body = body
+
+    def get_data(self, cache=True):
+        return self.body
+
+    @property
+    def gzipped(self):
+        """ Whether the client accepts gzip """
+        return bool(parse_accept_header(
+            self.headers.get('accept-encoding'))['gzip'])
+
+
+def render(data):
+    """ JSON for a response, as flask_restful renders it.  Needs an app
+    context. """
+    return output_json(data, 200).get_data()
+
+
+async def get_player(req, id):
+    player = await reading(pc.get, id)
+    if player is None:
+        raise NotFound()
+    with app.app_context():
+        return 200, [], render(serialize_player.serialize(player))
+
+
+async def create_player(req):
+    args = RestPlayer.schema.parse(req)
+    player = await writing(pc.create, args['name'])
+    with app.app_context():
+        return 200, [], render(serialize_player.serialize(player))
+
+
+async def get_game(req, id):
+    game = await reading(gc.get, id)
+    if game is None:
+        raise NotFound()
+    game = game.snapshot()
+    since = since_version(req)
+    tag = game_tag(game, since)
+    if parse_etags(req.headers.get('if-none-match')).contains_weak(tag):
+        return 304, [('ETag', quote_etag(tag))], b''
+    with app.app_context():
+        body, headers = game_body(game, since, req.gzipped)
+    return 200, headers, body
+
+
+async def create_game(req):
+    args = RestGame.schema.parse(req)
+    game = await writing(gc.create, args['players'])
+    with app.app_context():
+        return 200, [], render(serialize_game.serialize(game.snapshot()))
+
+
+async def post_frame(req, gid, pid):
+    args = RestFrameRecorder.schema.parse(req)
+    since = since_version(req)
+    game = await writing(gc.frame_for_player, gid, pid, args['shots'])
+    with app.app_context():
+        body, headers = game_body(game, since, req.gzipped)
+    return 200, headers, body
+
+
+# (method, path, handler, resource endpoint for metrics)
+ROUTES = [
+    ('GET', re.compile(r'/player/(\d+)$'), get_player, 'restplayer'),
+    ('POST', re.compile(r'/player$'), create_player, 'restplayer'),
+    ('GET', re.compile(r'/game/(\d+)$'), get_game, 'restgame'),
+    ('POST', re.compile(r'/game$'), create_game, 'restgame'),
+    ('POST', re.compile(r'/game/(\d+)/player/(\d+)/frame$'), post_frame,
+     'restframerecorder'),
+]
+
+_writers = None
+_flask = None
+
+
+def configure(config):
+    """ Size the thread pools """
+    global _writers, _flask
+    _writers = ThreadPoolExecutor(config['ASGI_THREADS'],
+                                  thread_name_prefix='asgi-writer')
+    _flask = ThreadPoolExecutor(config['ASGI_FLASK_THREADS'],
+                                thread_name_prefix='asgi-flask')
+
+
+def writing(f, *args):
+    """ Call `f` on a writer thread """
+    return asyncio.get_running_loop().run_in_executor(_writers, f, *args)
+
+
+async def reading(f, *args):
+    """ Call `f` to look something up - on a writer thread if the storage's
+    reads can wait """
+    if DB.storage.blocking_reads:
+        return await writing(f, *args)
+    return f(*args)
+
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+async def respond(send, status, headers, body):
+    headers = [(k.lower().encode('latin-1'), v.encode('latin-1'))
+               for k, v in headers]
+    if status != 304:
+        headers = JSON + headers
+    headers.append((b'content-length', b'%d' % len(body)))
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def serve(scope, receive, send, handler, endpoint, ids):
+    """ Serve a request from one of the ROUTES """
+    start = perf_counter()
+    body = await read_body(receive)
+    if body is None:
+        return
+    try:
+        status, headers, body = await handler(Request(scope, body),
+                                              *[int(i) for i in ids])
+    except HTTPException as e:
+        status, headers = e.code, []
+        with app.app_context():
+            body = render(getattr(e, 'data', None) or
+                          {'message': e.description})
+    except Exception:
+        log.exception('Exception on %s %s', scope['method'], scope['path'])
+        status, headers = 500, []
+        with app.app_context():
+            body = render({'message': InternalServerError.description})
+    await respond(send, status, headers, body)
+    metrics.requests.observe(perf_counter() - start, endpoint,
+                             scope['method'], str(status))
+
+
+class _Input(io.RawIOBase):
+    """ A request body for the Flask app, read (on its thread) from the
+    chunks `pass_on` receives """
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.chunk = b''
+        self.done = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self.chunk and not self.done:
+            self.chunk = self.chunks.get()
+            if self.chunk is None:
+                self.chunk, self.done = b'', True
+        n = min(len(b), len(self.chunk))
+        b[:n] = self.chunk[:n]
+        self.chunk = self.chunk[n:]
+        return n
+
+
+def environ_for(scope, body):
+    """ The WSGI environ for an ASGI request """
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': 'HTTP/%s' % scope.get('http_version', '1.1'),
+        'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BufferedReader(body),
+        'wsgi.input_terminated': True,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = 'HTTP_' + name
+        if name in environ:
+            value = environ[name] + ',' + value
+        environ[name] = value
+    return environ
+
+
+async def pass_on(scope, receive, send):
+    """ Serve a request with the Flask app, on one of its threads.  The body
+    is streamed to it as it arrives, and its response back as it's
+    generated - until the client goes away. """
+    loop = asyncio.get_running_loop()
+    chunks = queue.Queue()
+    gone = threading.Event()
+
+    async def receiving():
+        body = True
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                gone.set()
+                if body:
+                    chunks.put(None)
+                return
+            if body:
+                chunks.put(message.get('body', b''))
+                if not message.get('more_body'):
+                    chunks.put(None)
+                    body = False
+
+    def sending(message):
+        asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+    def call():
+        response = {'started': False}
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and response['started']:
+                raise exc_info[1].with_traceback(exc_info[2])
+            response['status'] = int(status[:3])
+            response['headers'] = [(k.lower().encode('latin-1'),
+                                    v.encode('latin-1')) for k, v in headers]
+            return write
+
+        def write(data):
+            if not response['started']:
+                sending({'type': 'http.response.start',
+                         'status': response['status'],
+                         'headers': response['headers']})
+                response['started'] = True
+            if data:
+                sending({'type': 'http.response.body', 'body': data,
+                         'more_body': True})
+
+        result = app(environ_for(scope, _Input(chunks)), start_response)
+        try:
+            for data in result:
+                if gone.is_set():
+                    return
+                write(data)
+            write(b'')
+            sending({'type': 'http.response.body', 'body': b''})
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+
+    receiver = asyncio.ensure_future(receiving())
+    try:
+        await loop.run_in_executor(_flask, call)
+    finally:
+        receiver.cancel()
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            _writers.shutdown()
+            _flask.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    """ The ASGI application """
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] != 'http':
+        return
+    # Traffic is recorded by the Flask app - when recording, it gets
+    # everything
+    routes = ROUTES if not app.config['RECORD_TRAFFIC'] else ()
+    for method, path, handler, endpoint in routes:
+        if method == scope['method']:
+            match = path.match(scope['path'])
+            if match:
+                return await serve(scope, receive, send, handler, endpoint,
+                                   match.groups())
+    await pass_on(scope, receive, send)
+
+
+configure(app.config)
@@ -0,0 +1,18 @@
+""" Benchmarks for the bowling service.  Each module is runnable on its own,
+e.g. `python -m benchmarks.memory` from the repo root. """
+import random
+
+from models import Game
+from benchmarks.frames import random_frame
+
+
+def random_game(players, rng=random):
+    """ Roll the frames of a random game for `players` players, in the order
+    they're bowled """
+    return [random_frame(rng, i >= (Game.FRAMES - 1) * players)
+            for i in range(Game.FRAMES * players)]
+
+
+def marking(shot):
+    """ How a Shot is posted to the API: a pin count, 'X', '/' or None """
+    return {-1: 'X', -2: '/', -3: None}.get(int(shot), int(shot))
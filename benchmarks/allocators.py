@@ -0,0 +1,41 @@
+""" IDs per second from each allocator in ids.py, against the random IDs
+models used to get, and the cost of creating a Player with each. """
+import os
+import random
+import shutil
+import sys
+import tempfile
+import timeit
+
+import ids
+from models import Player
+
+
+def best(stmt, number):
+    return number / min(timeit.repeat(stmt, number=number, repeat=5))
+
+
+def main(number=1000000):
+    tmp = tempfile.mkdtemp()
+    old = ids.allocator
+    try:
+        allocators = [
+            ('counter', ids.CounterAllocator()),
+            ('block', ids.BlockAllocator(os.path.join(tmp, 'bowling.ids'))),
+            ('snowflake', ids.SnowflakeAllocator()),
+        ]
+        print('%-10s %14s %14s' % ('', 'IDs/s', 'Players/s'))
+        print('%-10s %14.0f %14s' % (
+            'random', best(lambda: random.randint(1, 100000), number), '-'))
+        for name, allocator in allocators:
+            ids.use(allocator)
+            print('%-10s %14.0f %14.0f' % (
+                name, best(allocator.allocate, number),
+                best(lambda: Player('mario'), number // 4)))
+    finally:
+        ids.use(old)
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
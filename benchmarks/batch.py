@@ -0,0 +1,46 @@
+""" Throughput of the NumPy batch scorer.
+
+Generates N random, complete games in the (N x 21) matrix form and scores them
+all at once with `scoring.score`.
+"""
+import sys
+import time
+
+import numpy as np
+
+import scoring
+from models import Frame, Game
+
+
+def random_games(n, seed=1234):
+    """ An (n x 21) matrix of random, complete games """
+    rng = np.random.RandomState(seed)
+    rolls = np.full((n, Game.ROLLS), int(Frame.Shot.nil), dtype=np.int8)
+    first = rng.randint(0, 11, size=(n, Game.FRAMES))
+    second = (rng.random_sample((n, Game.FRAMES)) * (11 - first)).astype(int)
+    strike = first == 10
+    spare = ~strike & (first + second == 10)
+    rolls[:, 0:20:2] = np.where(strike, scoring.STRIKE, first)
+    rolls[:, 1:20:2] = np.where(strike, scoring.NIL,
+                                np.where(spare, scoring.SPARE, second))
+    # Tenth frame: a strike gets a second ball, and strikes and spares get
+    # the fill ball
+    tenth_strike = strike[:, 9]
+    rolls[tenth_strike, 19] = rng.randint(0, 10, size=tenth_strike.sum())
+    fill = tenth_strike | spare[:, 9]
+    rolls[fill, 20] = rng.randint(0, 10, size=fill.sum())
+    return rolls
+
+
+def main(n=1000000):
+    rolls = random_games(n)
+    start = time.time()
+    s = scoring.score(rolls)
+    elapsed = time.time() - start
+    assert s.complete.all()
+    print('%d games scored in %.2fs (%.0f games/s), mean score %.1f' % (
+        n, elapsed, n / elapsed, s.totals[:, -1].mean()))
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,45 @@
+""" Importing whole games: one `POST /game/<gid>/frames` per game against a
+`POST /game/<gid>/player/<pid>/frame` per frame. """
+import json
+import random
+import sys
+import time
+
+import app
+from benchmarks import random_game, marking
+
+
+def post(client, url, data):
+    resp = client.post(url, data=json.dumps(data), content_type='application/json')
+    assert resp.status_code == 200, resp.data
+    return json.loads(resp.data)
+
+
+def main(games=50, players_per_game=6):
+    client = app.app.test_client()
+    rng = random.Random(1234)
+    pids = [post(client, '/player', dict(name='bowler %d' % i))['id']
+            for i in range(players_per_game)]
+    frames = [dict(pid=pids[i % players_per_game],
+                   shots=[marking(s) for s in shots])
+              for i, shots in enumerate(random_game(players_per_game, rng))]
+    results = {}
+    for mode in ('single', 'batch'):
+        gids = [post(client, '/game', dict(players=pids))['id'] for _ in range(games)]
+        start = time.time()
+        for gid in gids:
+            if mode == 'single':
+                for frame in frames:
+                    post(client, '/game/%d/player/%d/frame' % (gid, frame['pid']),
+                         dict(shots=frame['shots']))
+            else:
+                post(client, '/game/%d/frames' % gid, dict(frames=frames))
+        results[mode] = time.time() - start
+        print('%-7s %d games of %d frames: %.2fs (%.0f frames/s)' % (
+            mode, games, len(frames), results[mode],
+            games * len(frames) / results[mode]))
+    print('batch is %.1fx faster' % (results['single'] / results['batch']))
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,97 @@
+""" Throughput and memory of bulk export and import.
+
+Loads N random two-player games into an empty DB with `bulk.load` (the
+NDJSON is generated as it's read), then exports them as NDJSON and as a CSV
+of rolls, throwing the output away.  Reports rows a second each way - lines
+of NDJSON, or rolls - and the peak memory each export allocated while it ran,
+traced with tracemalloc in a second pass (which is slower).  Pass 'tiered' to
+load into the 'tiered' backend, which keeps memory bounded.
+
+    python -m benchmarks.bulk [games] [backend]
+"""
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import bulk
+from benchmarks import random_game, marking
+from metrics import resident_memory
+from persistence import DB, MemoryStorage, TieredStorage
+
+PLAYERS = 1000
+
+
+def pool(rng, size=1009):
+    """ Random two-player games, as each player's frames - rolling games is
+    slower than loading them, so they're reused """
+    games = []
+    for _ in range(size):
+        frames = [[marking(s) for s in frame] for frame in random_game(2, rng)]
+        games.append([frames[0::2], frames[1::2]])
+    return games
+
+
+def records(games, frames):
+    """ Generate an NDJSON export of `games` games between PLAYERS players,
+    with `frames` from the pool """
+    for pid in range(1, PLAYERS + 1):
+        yield bulk.dumps({'type': 'player', 'id': pid,
+                          'name': 'player %d' % pid})
+    for i in range(games):
+        yield bulk.dumps({'type': 'game', 'id': PLAYERS + 1 + i,
+                          'players': [i % PLAYERS + 1, (i + 1) % PLAYERS + 1],
+                          'frames': frames[i % len(frames)]})
+
+
+def drain(format):
+    """ Export the DB, counting rows and bytes """
+    rows = size = 0
+    for chunk in bulk.export(format):
+        rows += chunk.count(b'\n')
+        size += len(chunk)
+    return rows, size
+
+
+def main(games=1000000, backend='memory'):
+    tmp = tempfile.mkdtemp()
+    old = DB.storage
+    try:
+        if backend == 'tiered':
+            DB.use(TieredStorage(os.path.join(tmp, 'bowling.archive'),
+                                 idle=0, max_hot=10000))
+        else:
+            DB.use(MemoryStorage())
+        frames = pool(random.Random(1234))
+        rolls = sum(sum(1 for f in frames[i % len(frames)] for frame in f
+                        for m in frame if m is not None)
+                    for i in range(min(games, len(frames))))
+        rolls = rolls * games // max(min(games, len(frames)), 1)
+        rss = resident_memory()
+        start = time.time()
+        bulk.load(records(games, frames))
+        elapsed = time.time() - start
+        print('%d games (%s), about %d rolls' % (games, backend, rolls))
+        print('  %-7s %7.2fs %10.0f games/s %10.0f rolls/s  +%.0fMB resident' % (
+            'import', elapsed, games / elapsed, rolls / elapsed,
+            (resident_memory() - rss) / 1e6))
+        for format in bulk.FORMATS:
+            start = time.time()
+            rows, size = drain(format)
+            elapsed = time.time() - start
+            tracemalloc.start()
+            drain(format)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print('  %-7s %7.2fs %10.0f rows/s %11.1fMB out  %.1fMB peak' % (
+                format, elapsed, rows / elapsed, size / 1e6, peak / 1e6))
+    finally:
+        DB.use(old)
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main(*[int(a) if a.isdigit() else a for a in sys.argv[1:]])
@@ -0,0 +1,94 @@
+""" Bytes on the wire and latency for a 10-frame, 6-player game, posting
+its frames and polling it from a scoreboard after each one, with full
+responses, gzipped full responses, and deltas (?since=<version>).
+
+    python -m benchmarks.delta
+    python -m benchmarks.delta --url http://127.0.0.1:5000 --games 20
+"""
+import argparse
+import json
+import random
+import time
+
+import traffic
+from benchmarks import random_game, marking
+
+MODES = ('full', 'gzip', 'delta')
+
+
+def wire_size(data, headers):
+    """ Bytes in a response's body and headers """
+    return len(data) + sum(len(k) + len(v) + 4 for k, v in headers.items())
+
+
+def play(client, pids, frames, mode, samples):
+    """ Post `frames` to a new game in turn, polling the game after each.
+    Appends (request, bytes, seconds) to `samples`. """
+    body = lambda data: json.dumps(data).encode('utf-8')
+    json_type = {'Content-Type': 'application/json'}
+    status, data, _ = client.request('POST', '/game', body(dict(players=pids)),
+                                     json_type)
+    gid = json.loads(data)['id']
+    headers = {'Accept-Encoding': 'gzip'} if mode == 'gzip' else {}
+    # The version the poster and the scoreboard last saw
+    posted = polled = 0
+    for i, shots in enumerate(frames):
+        query = '?since=%d' % posted if mode == 'delta' else ''
+        start = time.perf_counter()
+        status, data, resp = client.request(
+            'POST', '/game/%d/player/%d/frame%s' % (gid, pids[i % len(pids)], query),
+            body(dict(shots=[marking(s) for s in shots])),
+            dict(json_type, **headers))
+        samples.append(('POST frame', wire_size(data, resp),
+                        time.perf_counter() - start))
+        assert status == 200, data
+        posted += 1
+        query = '?since=%d' % polled if mode == 'delta' else ''
+        start = time.perf_counter()
+        status, data, resp = client.request('GET', '/game/%d%s' % (gid, query),
+                                            None, headers)
+        samples.append(('GET game', wire_size(data, resp),
+                        time.perf_counter() - start))
+        assert status == 200, data
+        polled = posted
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--url', help='server to use (default: the app in '
+                        'this process)')
+    parser.add_argument('--games', type=int, default=50,
+                        help='games to play each way (default 50)')
+    parser.add_argument('--players', type=int, default=6)
+    args = parser.parse_args(argv)
+    if args.url:
+        client = traffic.HTTPClient(args.url)
+    else:
+        import app
+        client = traffic.TestClient(app.app)
+    pids = [json.loads(client.request(
+        'POST', '/player', json.dumps(dict(name='bowler %d' % i)).encode('utf-8'),
+        {'Content-Type': 'application/json'})[1])['id']
+        for i in range(args.players)]
+    rng = random.Random(1234)
+    games = [random_game(args.players, rng) for _ in range(args.games)]
+    print('%d games of %d players, %d frames each' % (
+        args.games, args.players, len(games[0])))
+    print('%-6s %-11s %11s %11s %9s %9s' % ('', '', 'bytes/game', 'bytes/req',
+                                            'p50 ms', 'p99 ms'))
+    for mode in MODES:
+        samples = []
+        for frames in games:
+            play(client, pids, frames, mode, samples)
+        for name in ('POST frame', 'GET game'):
+            sizes = [s[1] for s in samples if s[0] == name]
+            latencies = sorted(s[2] for s in samples if s[0] == name)
+            print('%-6s %-11s %11.0f %11.0f %9.3f %9.3f' % (
+                mode, name, sum(sizes) / float(args.games),
+                sum(sizes) / float(len(sizes)),
+                latencies[len(latencies) // 2] * 1e3,
+                latencies[int(len(latencies) * 0.99)] * 1e3))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+""" Frames to bowl, for the benchmarks and tests """
+import random
+
+from models import Frame
+
+
+def random_ball(rng=random):
+    """ Roll a random ball at a full rack, as a Shot """
+    pins = rng.randint(0, 10)
+    return Frame.Shot.strike if pins == 10 else Frame.Shot(pins)
+
+
+def random_frame(rng=random, tenth=False):
+    """ Roll a random, valid frame as a list of 2 Shots - or in the `tenth`
+    frame, 3 after a strike or spare """
+    first = rng.randint(0, 10)
+    if first == 10:
+        if not tenth:
+            return [Frame.Shot.strike, Frame.Shot.nil]
+        fill = random_frame(rng)
+        if fill[1] == Frame.Shot.nil:
+            fill[1] = random_ball(rng)
+        return [Frame.Shot.strike] + fill
+    second = rng.randint(0, 10 - first)
+    if first + second == 10:
+        if tenth:
+            return [Frame.Shot(first), Frame.Shot.spare, random_ball(rng)]
+        return [Frame.Shot(first), Frame.Shot.spare]
+    return [Frame.Shot(first), Frame.Shot(second)]
+
+
+def tenth(shots):
+    """ A frame as bowled in the tenth - with fill balls after a strike or
+    spare.  Takes Shots, or markings as the API does. """
+    if shots[0] in (Frame.Shot.strike, 'X'):
+        return [shots[0]] * 3
+    if shots[1] in (Frame.Shot.spare, '/'):
+        return shots + [shots[0]]
+    return shots
@@ -0,0 +1,83 @@
+""" Game listing latency as the number of stored games grows from 1k to 1M.
+
+Games of two players (out of 100) are kept in the 'shared' backend, which
+holds a million games in a couple of hundred MB, and every tenth one is
+played to the end.  At each size, pages of 20 games are fetched through the
+full Flask stack from random starting points: all games, a player's games,
+and active games.
+"""
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import app
+from controllers import PlayerController, GameController
+from indexes import game_index
+from models import Frame, Game
+from persistence import DB, SharedMemoryStorage
+
+
+def percentile(samples, p):
+    return sorted(samples)[min(len(samples) - 1, int(len(samples) * p))]
+
+
+def grow(pids, gids, count, rng):
+    open_frame = [Frame.Shot.four, Frame.Shot.three]
+    while len(gids) < count:
+        players = rng.sample(pids, 2)
+        game = GameController.create(players)
+        gids.append(game.id)
+        if len(gids) % 10 == 0:
+            for _ in range(Game.FRAMES * 2):
+                game.post_frame(game.current_player or game.players[0], open_frame)
+            DB.frame_posted(game, game.players[0], open_frame)
+            game_index.completed(game)
+
+
+def measure(client, url, gids, rng, requests=300):
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        resp = client.get(url % rng.choice(gids))
+        latencies.append((time.perf_counter() - start) * 1e6)
+        assert resp.status_code == 200
+    return percentile(latencies, 0.5), percentile(latencies, 0.99)
+
+
+def main(largest=1000000):
+    tmp = tempfile.mkdtemp(dir='/dev/shm' if os.path.isdir('/dev/shm') else None)
+    old = DB.storage
+    rng = random.Random(1234)
+    try:
+        DB.use(SharedMemoryStorage(os.path.join(tmp, 'bowling.shm'),
+                                   players=2000, games=largest + largest // 10,
+                                   max_players=2))
+        client = app.app.test_client()
+        pids = [PlayerController.create('player %d' % i).id for i in range(100)]
+        gids = []
+        print('%9s %21s %21s %21s' % ('games', 'all p50/p99 us',
+                                      'player p50/p99 us', 'active p50/p99 us'))
+        size = 1000
+        while size <= largest:
+            grow(pids, gids, size, rng)
+            pid = rng.choice(pids)
+            results = [
+                measure(client, '/games?after=%d', gids, rng),
+                measure(client, '/player/%d/games?after=%%d' % pid,
+                        [gid for gid in game_index.page(pid=pid, limit=100)], rng),
+                measure(client, '/games?status=active&after=%d', gids, rng),
+            ]
+            print('%9d %21s %21s %21s' % ((size,) + tuple(
+                '%.0f / %.0f' % r for r in results)))
+            size *= 10
+    finally:
+        DB.use(old)
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
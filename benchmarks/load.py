@@ -0,0 +1,319 @@
+""" A load generator for the REST API, and a replayer for recorded traffic.
+
+`generate` plays like a bowling alley on league night.  Each lane creates
+its players, starts a game, and posts its frames in turn order, with rolls
+drawn from a distribution of strikes and spares (`--rolls`, or `--strike`
+and `--spare`).  Then it starts another game, until `--games` games are
+played or `--seconds` are up.  Meanwhile scoreboards poll the games in
+progress, with If-None-Match, every `--poll` seconds, and now and then list
+the active games.
+
+`replay` sends traffic recorded with `RECORD_TRAFFIC` (or `generate
+--record`) again, `--speed` times as fast - 0 for as fast as it'll go.
+
+Both run requests from a pool of threads, against the app in this process
+through its test client, or against a server with `--url`, and report
+requests a second and latency percentiles for each kind of request.
+
+    python -m benchmarks.load generate --lanes 24 --games 500
+    python -m benchmarks.load generate --url http://127.0.0.1:5000 --seconds 60
+    python -m benchmarks.load replay traffic.jsonl --speed 10
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import traffic
+
+# Named roll distributions: the chance of a strike, and of picking up the
+# spare after the first ball of a frame.  'random' draws pins uniformly.
+ROLLS = {
+    'random': None,
+    'novice': (0.05, 0.15),
+    'league': (0.2, 0.45),
+    'pro': (0.55, 0.8),
+}
+
+NAMES = ('mario', 'luigi', 'peach', 'toad', 'yoshi', 'wario', 'daisy',
+         'bowser')
+
+
+class Bowler(object):
+    """ Rolls frames as they'd be posted to the API, e.g. ['X', None],
+    [7, '/'] or [4, 3], and ['X', 'X', 6] in the tenth.  With no strike and
+    spare rates, the pins are uniformly random. """
+
+    def __init__(self, strike=None, spare=None, rng=random):
+        self.strike = strike
+        self.spare = spare
+        self.rng = rng
+
+    def frame(self, tenth=False):
+        shots = self._frame()
+        if not tenth:
+            return shots
+        if shots[0] == 'X':
+            # Two fill balls, bowled like a frame of their own
+            fill = self._frame()
+            if fill[1] is None:
+                fill[1] = self._frame()[0]
+            return ['X'] + fill
+        if shots[1] == '/':
+            return shots + [self._frame()[0]]
+        return shots
+
+    def _frame(self):
+        rng = self.rng
+        if self.strike is None:
+            first = rng.randint(0, 10)
+            if first == 10:
+                return ['X', None]
+            second = rng.randint(0, 10 - first)
+            return [first, '/' if first + second == 10 else second]
+        if rng.random() < self.strike:
+            return ['X', None]
+        # Missed strikes mostly leave a few pins standing
+        first = min(rng.randint(0, 9), rng.randint(0, 9), key=lambda n: -n)
+        if rng.random() < self.spare:
+            return [first, '/']
+        return [first, rng.randint(0, 9 - first)]
+
+
+class Load(object):
+    """ Requests sent through a `traffic.Client`, and how long they took """
+
+    def __init__(self, client):
+        self.client = client
+        self.samples = []
+        self.errors = 0
+
+    def request(self, method, path, data=None, headers=None):
+        """ Send a request, noting its latency.  Returns the status, the body
+        and the headers. """
+        body = None
+        if data is not None:
+            body = json.dumps(data)
+            headers = dict(headers or {}, **{'Content-Type': 'application/json'})
+        start = time.perf_counter()
+        status, data, headers = self.client.request(method, path, body, headers)
+        self.samples.append((traffic.label(method, path.partition('?')[0]),
+                             status, time.perf_counter() - start))
+        if status >= 400:
+            self.errors += 1
+        return status, data, headers
+
+
+class Alley(object):
+    """ Lanes playing games, and scoreboards watching them """
+
+    def __init__(self, load, bowler, lanes=8, players=4, games=None,
+                 seconds=None, pace=0.0, scoreboards=8, poll=1.0, seed=None):
+        self.load = load
+        self.bowler = bowler
+        self.lanes = lanes
+        self.players = players
+        self.games = games
+        self.deadline = time.time() + seconds if seconds else None
+        self.pace = pace
+        self.scoreboards = scoreboards
+        self.poll = poll
+        self.rng = random.Random(seed)
+        self.started = 0
+        # Games in progress
+        self.active = []
+        self.done = threading.Event()
+        self._lock = threading.Lock()
+
+    def next_game(self):
+        """ Whether a lane should start another game """
+        with self._lock:
+            if self.done.is_set() or (self.deadline and time.time() > self.deadline):
+                return False
+            if self.games is not None and self.started >= self.games:
+                return False
+            self.started += 1
+            return True
+
+    def lane(self, number):
+        load = self.load
+        pids = []
+        for i in range(self.players):
+            status, data, _ = load.request('POST', '/player', dict(
+                name='%s %d' % (NAMES[i % len(NAMES)], number)))
+            if status != 200:
+                return
+            pids.append(json.loads(data)['id'])
+        while self.next_game():
+            status, data, _ = load.request('POST', '/game', dict(players=pids))
+            if status != 200:
+                return
+            gid = json.loads(data)['id']
+            with self._lock:
+                self.active.append(gid)
+            try:
+                for frame in range(10):
+                    for pid in pids:
+                        if self.pace:
+                            time.sleep(self.pace)
+                        load.request('POST', '/game/%d/player/%d/frame' % (gid, pid),
+                                     dict(shots=self.bowler.frame(frame == 9)))
+            finally:
+                with self._lock:
+                    self.active.remove(gid)
+
+    def scoreboard(self, number):
+        load = self.load
+        rng = random.Random(self.rng.random())
+        etags = {}
+        polls = 0
+        while not self.done.is_set():
+            with self._lock:
+                gid = rng.choice(self.active) if self.active else None
+            if gid is None:
+                self.done.wait(0.01)
+                continue
+            polls += 1
+            if polls % 10 == 0:
+                load.request('GET', '/games?status=active')
+            headers = {'If-None-Match': etags[gid]} if gid in etags else None
+            status, _, headers = load.request('GET', '/game/%d' % gid, None,
+                                              headers)
+            if headers.get('ETag'):
+                etags[gid] = headers.get('ETag')
+            self.done.wait(self.poll)
+
+    def run(self):
+        with ThreadPoolExecutor(self.lanes + self.scoreboards) as pool:
+            boards = [pool.submit(self.scoreboard, i)
+                      for i in range(self.scoreboards)]
+            lanes = [pool.submit(self.lane, i) for i in range(self.lanes)]
+            try:
+                for lane in lanes:
+                    lane.result()
+            finally:
+                self.done.set()
+            for board in boards:
+                board.result()
+
+
+def percentiles(samples, ps=(0.5, 0.9, 0.99)):
+    samples = sorted(samples)
+    return [samples[min(len(samples) - 1, int(len(samples) * p))] for p in ps]
+
+
+def report(samples, seconds, out=sys.stdout):
+    """ Print requests a second and latency percentiles by kind of request.
+    `samples` are (label, status, seconds). """
+    by_label = defaultdict(list)
+    errors = defaultdict(int)
+    for name, status, latency in samples:
+        by_label[name].append(latency)
+        errors[name] += status >= 400 or status == 0
+    rows = [('all requests', [s[2] for s in samples], sum(errors.values()))]
+    rows += [(name, by_label[name], errors[name]) for name in sorted(by_label)]
+    out.write('%-40s %8s %9s %8s %8s %8s %8s %7s\n' % (
+        '', 'requests', 'req/s', 'p50 ms', 'p90 ms', 'p99 ms', 'max ms', 'errors'))
+    for name, latencies, failed in rows:
+        if not latencies:
+            continue
+        p50, p90, p99 = percentiles(latencies)
+        out.write('%-40s %8d %9.1f %8.2f %8.2f %8.2f %8.2f %7d\n' % (
+            name, len(latencies), len(latencies) / seconds, p50 * 1e3,
+            p90 * 1e3, p99 * 1e3, max(latencies) * 1e3, failed))
+
+
+def client_for(args):
+    if args.url:
+        return traffic.HTTPClient(args.url)
+    import app
+    if getattr(args, 'record', None):
+        traffic.record(app.app, args.record)
+    return traffic.TestClient(app.app)
+
+
+def generate(args):
+    if args.strike is not None or args.spare is not None:
+        rates = (args.strike or 0.0, args.spare or 0.0)
+    else:
+        rates = ROLLS[args.rolls]
+    rng = random.Random(args.seed)
+    bowler = Bowler(*(rates or (None, None)), rng=rng)
+    load = Load(client_for(args))
+    alley = Alley(load, bowler, lanes=args.lanes, players=args.players,
+                  games=args.games, seconds=args.seconds, pace=args.pace,
+                  scoreboards=args.scoreboards, poll=args.poll, seed=args.seed)
+    start = time.time()
+    alley.run()
+    seconds = time.time() - start
+    print('%d games, %d lanes, %d scoreboards, %.1fs' % (
+        alley.started, args.lanes, args.scoreboards, seconds))
+    report(load.samples, seconds)
+
+
+def replay(args):
+    entries = traffic.read(args.file)
+    start = time.time()
+    results = traffic.replay(entries, client_for(args), args.speed, args.threads)
+    seconds = time.time() - start
+    changed = sum(1 for r in results if r[1] != r[2])
+    print('%d requests replayed in %.1fs, %d with a different status than '
+          'recorded' % (len(results), seconds, changed))
+    report([(name, status, latency) for name, _, status, latency in results],
+           seconds)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    gen = commands.add_parser('generate', help='play games and poll them')
+    gen.add_argument('--url', help='server to load, e.g. http://127.0.0.1:5000 '
+                     '(default: the app in this process)')
+    gen.add_argument('--lanes', type=int, default=8,
+                     help='games played at once (default 8)')
+    gen.add_argument('--players', type=int, default=4,
+                     help='players per game (default 4)')
+    gen.add_argument('--games', type=int,
+                     help='games to play (default 100, unless --seconds)')
+    gen.add_argument('--seconds', type=float, help='how long to play for')
+    gen.add_argument('--pace', type=float, default=0.0,
+                     help='seconds between frames on a lane (default 0)')
+    gen.add_argument('--rolls', choices=sorted(ROLLS), default='league',
+                     help='roll distribution (default league)')
+    gen.add_argument('--strike', type=float, help='chance of a strike')
+    gen.add_argument('--spare', type=float,
+                     help='chance of picking up a spare')
+    gen.add_argument('--scoreboards', type=int, default=8,
+                     help='scoreboards polling games (default 8)')
+    gen.add_argument('--poll', type=float, default=1.0,
+                     help='seconds between scoreboard polls (default 1)')
+    gen.add_argument('--seed', type=int, help='random seed')
+    gen.add_argument('--record', help='record the traffic to this file '
+                     '(only without --url)')
+    gen.set_defaults(run=generate)
+
+    rep = commands.add_parser('replay', help='replay recorded traffic')
+    rep.add_argument('file', help='file recorded with RECORD_TRAFFIC')
+    rep.add_argument('--url', help='server to replay to (default: the app in '
+                     'this process)')
+    rep.add_argument('--speed', type=float, default=1.0,
+                     help='times as fast as recorded - 0 for as fast as '
+                     'possible (default 1)')
+    rep.add_argument('--threads', type=int, default=16,
+                     help='requests in flight at once (default 16)')
+    rep.set_defaults(run=replay)
+
+    args = parser.parse_args(argv)
+    if args.command == 'generate' and args.games is None and args.seconds is None:
+        args.games = 100
+    args.run(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+""" Memory footprint of games held in memory.
+
+Plays N full games (4 players, 10 frames each) and reports the memory
+retained by the games, as measured by tracemalloc.
+"""
+import random
+import sys
+import time
+import tracemalloc
+
+from models import Player, Game
+from benchmarks import random_frame
+
+
+def play(games, players_per_game, rng):
+    players = [Player('player %d' % i) for i in range(players_per_game)]
+    held = []
+    for _ in range(games):
+        g = Game(players)
+        for _ in range(10 * players_per_game):
+            g.post_frame(g.current_player or players[0],
+                         random_frame(rng, g.current_frame == Game.FRAMES))
+        held.append(g)
+    return held
+
+
+def main(games=10000, players_per_game=4):
+    rng = random.Random(1234)
+    tracemalloc.start()
+    start = time.time()
+    held = play(games, players_per_game, rng)
+    elapsed = time.time() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print('%d games x %d players: %.1f MiB retained (%.0f bytes/game), '
+          '%.1f MiB peak, %.2fs' % (
+              len(held), players_per_game, current / 2.0 ** 20,
+              float(current) / len(held), peak / 2.0 ** 20, elapsed))
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
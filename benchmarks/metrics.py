@@ -0,0 +1,83 @@
+""" What metrics cost per request.
+
+Times each piece of instrumentation on its own - timing a request, and a
+function timed with the decorator - and adds them up for a frame post,
+which times the request and four steps (parse, frame_for_player, post_frame
+and marshal).  Then times whole frame
+posts through the test client with metrics on and off, which is noisier.
+"""
+import json
+import types
+import sys
+import timeit
+
+import app
+import metrics
+from controllers import PlayerController, GameController
+from metrics import Histogram
+from models import Game
+
+
+def best(f, number):
+    return min(timeit.repeat(f, number=number, repeat=5)) / number * 1e6
+
+
+def request():
+    """ What timing a request costs, us """
+    environ = {'REQUEST_METHOD': 'GET'}
+
+    def start_response(status, headers, exc_info=None):
+        pass
+
+    def bare(environ, start_response):
+        start_response('200 OK', [])
+        return []
+    timed = types.SimpleNamespace(wsgi_app=bare)
+    metrics.instrument(timed)
+    timed = timed.wsgi_app
+    return (best(lambda: timed(environ, start_response), 100000) -
+            best(lambda: bare(environ, start_response), 100000))
+
+
+def posts(client, count=500):
+    pids = [PlayerController.create('bowler %d' % i).id for i in range(2)]
+    data = json.dumps(dict(shots=[4, 3]))
+
+    def play():
+        for _ in range(count // (Game.FRAMES * 2)):
+            gid = GameController.create(pids).id
+            for _ in range(Game.FRAMES):
+                for pid in pids:
+                    client.post('/game/%d/player/%d/frame' % (gid, pid),
+                                data=data, content_type='application/json')
+    return best(play, 1) / count
+
+
+def main():
+    histogram = Histogram('bench', 'bench', ('step',))
+
+    def bare():
+        pass
+    decorated = histogram.timed('step')(bare)
+
+    observe = best(lambda: histogram.observe(0.0001, 'step'), 200000)
+    wrapper = best(decorated, 200000) - best(bare, 200000)
+    hook = request()
+    print('observe            %6.2f us' % observe)
+    print('decorator          %6.2f us' % wrapper)
+    print('request            %6.2f us' % hook)
+    print('frame post total   %6.2f us' % (hook + 4 * wrapper))
+
+    client = app.app.test_client()
+    on = posts(client)
+    metrics.enabled = False
+    try:
+        off = posts(client)
+    finally:
+        metrics.enabled = True
+    print('frame post, metrics on  %7.1f us' % on)
+    print('frame post, metrics off %7.1f us' % off)
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
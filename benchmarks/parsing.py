@@ -0,0 +1,105 @@
+""" Parsing and validating a request's arguments: a reqparse parser built for
+the request, as the resources used to, against their precompiled schemas.
+
+Frame posts include turning the shots into model Shots - per shot through
+the old `Shot.convert`, against `Frame.decode`, which also checks the frame.
+Each call gets a fresh request object, so both sides read and decode the
+body the way they would in a real request.
+"""
+import io
+import json
+import sys
+import time
+
+from werkzeug.test import EnvironBuilder
+
+from flask_restful import reqparse
+
+import app
+from models import Frame
+from routes import RestFrameRecorder, RestGameList, RestPlayer
+
+
+def old_convert(marking):
+    """ Shot.convert as it was """
+    theshot = {
+        'X': Frame.Shot.strike,
+        '/': Frame.Shot.spare,
+        None: Frame.Shot.nil
+    }.get(marking)
+    if theshot is None:
+        return Frame.Shot(marking)
+    return theshot
+
+
+def old_frame(req):
+    parser = reqparse.RequestParser()
+    parser.add_argument('shots', type=list, location='json', required=True)
+    args = parser.parse_args(req)
+    return [old_convert(shot) for shot in args['shots'][:]]
+
+
+def new_frame(req):
+    return Frame.decode(RestFrameRecorder.schema.parse(req)['shots'])
+
+
+def old_player(req):
+    parser = reqparse.RequestParser()
+    parser.add_argument('name', type=str, location='json', required=True)
+    return parser.parse_args(req)
+
+
+def new_player(req):
+    return RestPlayer.schema.parse(req)
+
+
+def old_listing(req):
+    parser = reqparse.RequestParser()
+    parser.add_argument('after', type=int, location='args')
+    parser.add_argument('limit', type=int, location='args', default=20)
+    parser.add_argument('status', location='args', default='all',
+                        choices=('all', 'active'))
+    return parser.parse_args(req)
+
+
+def new_listing(req):
+    return RestGameList.schema.parse(req)
+
+
+CASES = [
+    ('frame post', old_frame, new_frame,
+     dict(method='POST', data=json.dumps(dict(shots=[7, '/'])),
+          content_type='application/json')),
+    ('player post', old_player, new_player,
+     dict(method='POST', data=json.dumps(dict(name='mario mario')),
+          content_type='application/json')),
+    ('game listing', old_listing, new_listing,
+     dict(query_string='after=1234&limit=50&status=active')),
+]
+
+
+def per_request(f, context, number):
+    """ Microseconds per call to `f` with a fresh request, best of 7 """
+    environ = EnvironBuilder('/', **context).get_environ()
+    body = environ['wsgi.input'].read()
+    best = float('inf')
+    for _ in range(7):
+        requests = [app.app.request_class(dict(environ, **{'wsgi.input': io.BytesIO(body)}))
+                    for _ in range(number)]
+        start = time.perf_counter()
+        for req in requests:
+            f(req)
+        best = min(best, time.perf_counter() - start)
+    return best / number * 1e6
+
+
+def main(number=5000):
+    print('%-14s %10s %10s %8s' % ('', 'old us', 'new us', 'speedup'))
+    for name, old, new, context in CASES:
+        before = per_request(old, context, number)
+        after = per_request(new, context, number)
+        print('%-14s %10.2f %10.2f %7.1fx' % (name, before, after, before / after))
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,93 @@
+""" Scoreboard polling: 200 lanes each poll their game once a (simulated)
+second, while frames are posted every so often.
+
+Compares plain polling with no render cache, polling with the render cache,
+and polling with If-None-Match on top.  Reports GET latency, render cache hit
+rate and how many polls were answered with a 304.
+"""
+import json
+import random
+import sys
+import time
+
+import app
+from routes import RestGame
+from benchmarks import random_frame, marking
+
+
+def percentile(samples, p):
+    return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+
+def run(client, lanes, seconds, post_every, use_etag, rng):
+    """ Returns GET latencies in us, the number of 304s, and body bytes sent """
+    latencies = []
+    not_modified = 0
+    sent = 0
+    etags = {}
+    players = {}
+    for lane in lanes:
+        game = json.loads(client.get('/game/%d' % lane).data)
+        players[lane] = [p['id'] for p in game['players']]
+    turns = dict((lane, 0) for lane in lanes)
+    for _ in range(seconds):
+        for lane in lanes:
+            if rng.random() < 1.0 / post_every and turns[lane] < 10 * len(players[lane]):
+                pid = players[lane][turns[lane] % len(players[lane])]
+                tenth = turns[lane] >= 9 * len(players[lane])
+                shots = [marking(s) for s in random_frame(rng, tenth)]
+                client.post('/game/%d/player/%d/frame' % (lane, pid),
+                            data=json.dumps(dict(shots=shots)),
+                            content_type='application/json')
+                turns[lane] += 1
+            headers = {'If-None-Match': etags[lane]} if use_etag and lane in etags else {}
+            start = time.perf_counter()
+            resp = client.get('/game/%d' % lane, headers=headers)
+            latencies.append((time.perf_counter() - start) * 1e6)
+            etags[lane] = resp.headers['ETag']
+            not_modified += resp.status_code == 304
+            sent += len(resp.data)
+    latencies.sort()
+    return latencies, not_modified, sent
+
+
+def new_lanes(client, count, players_per_game):
+    lanes = []
+    pids = [json.loads(client.post('/player', data=json.dumps(dict(name='bowler')),
+                                   content_type='application/json').data)['id']
+            for _ in range(players_per_game)]
+    for _ in range(count):
+        game = json.loads(client.post('/game', data=json.dumps(dict(players=pids)),
+                                      content_type='application/json').data)
+        lanes.append(game['id'])
+    return lanes
+
+
+def main(lanes=200, seconds=30, post_every=15, players_per_game=6):
+    client = app.app.test_client()
+    size = RestGame.rendered.maxsize
+    modes = [
+        ('no cache', 0, False),
+        ('render cache', size, False),
+        ('render cache + ETag', size, True),
+    ]
+    try:
+        for name, maxsize, use_etag in modes:
+            RestGame.rendered.maxsize = maxsize
+            RestGame.rendered.clear()
+            ids = new_lanes(client, lanes, players_per_game)
+            RestGame.rendered.clear()
+            latencies, not_modified, sent = run(client, ids, seconds, post_every,
+                                          use_etag, random.Random(1234))
+            print('%-20s p50 %6.0fus  p99 %6.0fus  mean %6.0fus  '
+                  'cache hits %5.1f%%  304s %5.1f%%  %5.1f MiB sent' % (
+                      name, percentile(latencies, .5), percentile(latencies, .99),
+                      sum(latencies) / len(latencies),
+                      100 * RestGame.rendered.hit_rate(),
+                      100.0 * not_modified / len(latencies), sent / 2.0 ** 20))
+    finally:
+        RestGame.rendered.maxsize = size
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,79 @@
+""" What the profiling hook costs per request.
+
+Times the hook around a bare WSGI app for requests it doesn't profile - with
+the header checked, and with 1% of requests sampled too (so counting the
+ones it does) - against the bare app.  Then times whole frame posts through
+the test client: without the hook, with it, and profiled, writing their
+stats to a temporary directory.
+"""
+import json
+import shutil
+import tempfile
+import timeit
+import types
+
+import app
+import profiling
+from controllers import PlayerController, GameController
+from models import Game
+
+
+def best(f, number):
+    return min(timeit.repeat(f, number=number, repeat=5)) / number * 1e6
+
+
+def hook(directory, **kwargs):
+    """ What the hook costs a request it doesn't profile, us """
+    environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': '/leaderboard'}
+
+    def start_response(status, headers, exc_info=None):
+        pass
+
+    def bare(environ, start_response):
+        start_response('200 OK', [])
+        return []
+    hooked = types.SimpleNamespace(wsgi_app=bare)
+    profiling.instrument(hooked, directory, **kwargs)
+    hooked = hooked.wsgi_app
+    return (best(lambda: hooked(environ, start_response), 100000) -
+            best(lambda: bare(environ, start_response), 100000))
+
+
+def posts(client, headers=None, count=200):
+    pids = [PlayerController.create('bowler %d' % i).id for i in range(2)]
+    data = json.dumps(dict(shots=[4, 3]))
+
+    def play():
+        for _ in range(count // (Game.FRAMES * 2)):
+            gid = GameController.create(pids).id
+            for _ in range(Game.FRAMES):
+                for pid in pids:
+                    client.post('/game/%d/player/%d/frame' % (gid, pid),
+                                data=data, headers=headers,
+                                content_type='application/json')
+    return best(play, 1) / count
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    try:
+        print('hook, header only      %6.2f us' % hook(directory))
+        print('hook, 1%% sampled       %6.2f us' % hook(directory, sample=0.01))
+        client = app.app.test_client()
+        off = posts(client)
+        wsgi_app = app.app.wsgi_app
+        profiling.instrument(app.app, directory, keep=100)
+        try:
+            on = posts(client)
+            profiled = posts(client, {'X-Profile': '1'})
+        finally:
+            app.app.wsgi_app = wsgi_app
+        print('frame post, no hook     %7.1f us' % off)
+        print('frame post, hook        %7.1f us' % on)
+        print('frame post, profiled    %7.1f us' % profiled)
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+""" Startup recovery time of the journal backend.
+
+Writes a journal of N frames (4 player games), then times rebuilding the DB
+from it: first by replaying the whole journal, then from a snapshot taken
+near the end plus the journal written after it.
+"""
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from models import Player, Game
+from persistence import JournalStorage
+from benchmarks import random_frame
+
+
+def write_journal(path, frames, tail, players_per_game=4):
+    """ Write `frames` frames, snapshotting `tail` frames before the end """
+    rng = random.Random(1234)
+    s = JournalStorage(path, fsync_every=0, snapshot_every=0)
+    players = [Player('player %d' % i) for i in range(players_per_game)]
+    for i, p in enumerate(players):
+        p.id = i + 1
+        s.add(p)
+    written = 0
+    gid = 0
+    while written < frames:
+        gid += 1
+        g = Game(players)
+        g.id = gid
+        s.add(g)
+        for _ in range(10 * players_per_game):
+            shots = random_frame(rng, g.current_frame == Game.FRAMES)
+            player = g.current_player or players[0]
+            g.post_frame(player, shots)
+            s.frame_posted(g, player, shots)
+            written += 1
+            if written == frames - tail:
+                s.snapshot()
+    s.close()
+    return gid
+
+
+def timed_load(path):
+    start = time.time()
+    s = JournalStorage(path, snapshot_every=0)
+    elapsed = time.time() - start
+    count = len(s.games)
+    s.close()
+    return elapsed, count
+
+
+def main(frames=1000000, tail=10000):
+    tmp = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp, 'bowling.journal')
+        write_journal(path, frames, tail)
+        print('journal: %.1f MiB, snapshot: %.1f MiB' % (
+            os.path.getsize(path) / 2.0 ** 20,
+            os.path.getsize(path + '.snapshot') / 2.0 ** 20))
+        elapsed, games = timed_load(path)
+        print('snapshot + %d frame tail: %.2fs (%d games)' % (tail, elapsed, games))
+        os.remove(path + '.snapshot')
+        elapsed, games = timed_load(path)
+        print('full replay of %d frames: %.2fs (%d games)' % (frames, elapsed, games))
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
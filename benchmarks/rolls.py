@@ -0,0 +1,64 @@
+""" Throughput of the scoring table.
+
+Plays N random, complete games for one player three ways: rolls straight
+through `PlayerRolls.roll` (one table lookup each), a shot at a time with
+`Game.post_shot`, and a frame at a time with `Game.post_frame`.  Reports
+rolls a second, and checks the three agree.
+"""
+import random
+import sys
+import time
+
+from models import Player, Game, Frame
+from benchmarks import random_game
+
+
+def main(n=20000):
+    rng = random.Random(1234)
+    games = [random_game(1, rng) for _ in range(n)]
+    shots = [[s for frame in frames for s in frame if s != Frame.Shot.nil]
+             for frames in games]
+    rolls = sum(len(s) for s in shots)
+    player = Player('bowler')
+    totals = {}
+
+    PlayerRolls = Game.PlayerRolls
+    table, symbols, width = PlayerRolls.TRANSITIONS, PlayerRolls.symbols, PlayerRolls.SYMBOLS
+    start = time.time()
+    scored = []
+    for balls in shots:
+        r = PlayerRolls(player.id)
+        for shot in balls:
+            r.roll(table[r.state * width + symbols[shot]])
+        scored.append(r.total)
+    totals['table'] = scored, time.time() - start
+
+    start = time.time()
+    scored = []
+    for balls in shots:
+        g = Game([player])
+        for shot in balls:
+            g.post_shot(player, shot)
+        scored.append(g.totals[player.id])
+    totals['post_shot'] = scored, time.time() - start
+
+    start = time.time()
+    scored = []
+    for frames in games:
+        g = Game([player])
+        for frame in frames:
+            g.post_frame(player, frame)
+        scored.append(g.totals[player.id])
+    totals['post_frame'] = scored, time.time() - start
+
+    print('%d games, %d rolls, mean score %.1f' % (
+        n, rolls, sum(totals['table'][0]) / float(n)))
+    for name in ('table', 'post_shot', 'post_frame'):
+        scored, elapsed = totals[name]
+        assert scored == totals['table'][0]
+        print('  %-10s %6.2fs %10.0f rolls/s %8.0f games/s' % (
+            name, elapsed, rolls / elapsed, n / elapsed))
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
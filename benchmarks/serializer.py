@@ -0,0 +1,46 @@
+""" Serializing a game of 8 players in the tenth frame: flask_restful's
+marshal against the compiled serializer, on its own and for a full
+`GET /game/<id>`. """
+import json
+import random
+import sys
+import timeit
+
+import app
+from models import Game
+from controllers import PlayerController, GameController
+from serializers import compile_fields
+from benchmarks import random_frame
+
+
+def make_game(players=8, rounds=9):
+    rng = random.Random(1234)
+    ids = [PlayerController.create('player %d' % i).id for i in range(players)]
+    g = GameController.create(ids)
+    for _ in range(rounds * players):
+        g.post_frame(g.current_player or g.players[0], random_frame(rng))
+    return g
+
+
+def best(stmt, number):
+    return min(timeit.repeat(stmt, number=number, repeat=5)) / number * 1e6
+
+
+def main(number=2000):
+    from flask_restful import marshal
+    g = make_game()
+    compiled = compile_fields(Game.serialize)
+    assert json.dumps(compiled(g)) == json.dumps(marshal(g, Game.serialize))
+    print('serialize only:')
+    print('  marshal   %8.1f us' % best(lambda: marshal(g, Game.serialize), number))
+    print('  compiled  %8.1f us' % best(lambda: compiled(g), number))
+    client = app.app.test_client()
+    url = '/game/%d' % g.id
+    print('GET %s:' % url)
+    for serializer in ('marshal', 'compiled'):
+        app.app.config['SERIALIZER'] = serializer
+        print('  %-9s %8.1f us' % (serializer, best(lambda: client.get(url), number // 4)))
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,203 @@
+""" Requests a second and latency with many connections open, for each server.
+
+Starts each server in a process of its own - the Flask development server
+(threaded, as runserver.py runs it), and the ASGI app under uvicorn - and
+opens CONNECTIONS keep-alive connections to it, like lane consoles.  Each
+creates a player and a one-player game, then polls its game, posting a frame
+every so often (`--posts`, a fraction of requests), and starting a new game
+when one is complete.  Requests are timed once every connection is open and
+has its game.  Reports requests a second, latency percentiles over all
+requests, and the p99 of polls and posts.
+
+The client runs on the same machine, and takes some of its CPU.
+
+    python -m benchmarks.servers [--connections 1000] [--seconds 10]
+"""
+import argparse
+import asyncio
+import json
+import random
+import socket
+import subprocess
+import sys
+import time
+
+from benchmarks import random_frame, marking
+
+SERVERS = ('flask', 'asgi')
+
+
+def serve(server, port):
+    """ Run a server on `port`, quietly """
+    import logging
+    from app import app
+    if server == 'asgi':
+        import uvicorn
+        from asgi import application
+        uvicorn.run(application, host='127.0.0.1', port=port,
+                    log_level='warning', access_log=False, backlog=4096)
+    else:
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        app.run(host='127.0.0.1', port=port, threaded=True)
+
+
+def free_port():
+    s = socket.socket()
+    s.bind(('127.0.0.1', 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+class Connection(object):
+    """ A keep-alive HTTP/1.1 connection """
+
+    def __init__(self, port):
+        self.port = port
+        self.reader = self.writer = None
+
+    async def request(self, method, path, body=None):
+        """ Send a request.  Returns the status and the JSON response. """
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(
+                '127.0.0.1', self.port)
+        head = '%s %s HTTP/1.1\r\nHost: bench\r\n' % (method, path)
+        data = b''
+        if body is not None:
+            data = json.dumps(body).encode('utf-8')
+            head += ('Content-Type: application/json\r\n'
+                     'Content-Length: %d\r\n' % len(data))
+        self.writer.write(head.encode('ascii') + b'\r\n' + data)
+        status = int((await self.reader.readline()).split()[1])
+        length, close = 0, False
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            name, _, value = line.partition(b':')
+            name = name.strip().lower()
+            if name == b'content-length':
+                length = int(value)
+            elif name == b'connection':
+                close = value.strip().lower() == b'close'
+        data = await self.reader.readexactly(length)
+        if close:
+            self.close()
+        return status, json.loads(data)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+
+async def console(port, n, posts, opened, ready, start, latencies, errors):
+    """ A lane console: a player and a game, polled and posted to until
+    `start` is over """
+    rng = random.Random(n)
+    connection = Connection(port)
+    async with opened:
+        _, player = await connection.request('POST', '/player',
+                                             {'name': 'lane %d' % n})
+    pid = player['id']
+    _, game = await connection.request('POST', '/game', {'players': [pid]})
+    ready.append(n)
+    deadline = await start
+    while time.time() < deadline:
+        begin = time.perf_counter()
+        if game['complete']:
+            kind = 'post'
+            status, game = await connection.request('POST', '/game',
+                                                    {'players': [pid]})
+        elif rng.random() < posts:
+            kind = 'post'
+            shots = [marking(s) for s in
+                     random_frame(rng, game['current_frame'] == 10)]
+            status, game = await connection.request(
+                'POST', '/game/%d/player/%d/frame' % (game['id'], pid),
+                {'shots': shots})
+        else:
+            kind = 'poll'
+            status, game = await connection.request('GET',
+                                                    '/game/%d' % game['id'])
+        latencies.append((time.perf_counter() - begin, kind))
+        if status != 200:
+            errors.append(status)
+            return
+    connection.close()
+
+
+async def load(port, args):
+    loop = asyncio.get_running_loop()
+    start = loop.create_future()
+    # Don't overflow the listen queue
+    opened = asyncio.Semaphore(64)
+    ready, latencies, errors = [], [], []
+    tasks = [asyncio.ensure_future(console(port, n, args.posts, opened,
+                                           ready, start, latencies, errors))
+             for n in range(args.connections)]
+    while len(ready) < args.connections:
+        if any(t.done() for t in tasks):
+            for t in tasks:
+                if t.done():
+                    t.result()
+        await asyncio.sleep(0.1)
+    start.set_result(time.time() + args.seconds)
+    await asyncio.gather(*tasks)
+    return latencies, errors
+
+
+def percentile(values, p):
+    return values[min(int(len(values) * p), len(values) - 1)] * 1e3
+
+
+def run(server, args):
+    port = free_port()
+    process = subprocess.Popen([sys.executable, '-m', 'benchmarks.servers',
+                                '--serve', server, '--port', str(port)],
+                               stdout=subprocess.DEVNULL)
+    try:
+        for _ in range(100):
+            try:
+                socket.create_connection(('127.0.0.1', port)).close()
+                break
+            except OSError:
+                time.sleep(0.1)
+        latencies, errors = asyncio.run(load(port, args))
+    finally:
+        process.terminate()
+        process.wait()
+    every = sorted(l for l, _ in latencies)
+    p99 = dict((kind, percentile(sorted(l for l, k in latencies if k == kind),
+                                 0.99)) for kind in ('poll', 'post'))
+    print('%-6s %9.0f %8.2f %8.2f %8.2f %8.2f %9.2f %9.2f %7d' % (
+        server, len(every) / args.seconds, percentile(every, 0.5),
+        percentile(every, 0.9), percentile(every, 0.99), every[-1] * 1e3,
+        p99['poll'], p99['post'], len(errors)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--connections', type=int, default=1000)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--posts', type=float, default=0.1,
+                        help='fraction of requests that post a frame '
+                        '(default 0.1)')
+    parser.add_argument('--servers', default=','.join(SERVERS),
+                        help='servers to compare (default %(default)s)')
+    parser.add_argument('--serve', choices=SERVERS, help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.serve:
+        return serve(args.serve, args.port)
+    print('%d connections, %.0f%% posts' % (args.connections,
+                                             args.posts * 100))
+    print('%-6s %9s %8s %8s %8s %8s %9s %9s %7s' % (
+        '', 'req/s', 'p50 ms', 'p90 ms', 'p99 ms', 'max ms', 'poll p99',
+        'post p99', 'errors'))
+    for server in args.servers.split(','):
+        run(server, args)
+
+
+if __name__ == '__main__':
+    main()
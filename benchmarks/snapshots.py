@@ -0,0 +1,135 @@
+""" Read latency under a read-heavy mix: snapshot reads against locked ones.
+
+Threads read and post to a handful of games at random - 95% reads and 5%
+frame posts by default.  Posts go through the controller, holding the game's
+lock while the frame is scored and written to the storage (the journal,
+fsync'd every record, by default).  Reads render the game as `GET /game/<id>`
+does, through the render cache, either from the game's latest snapshot with
+no lock (`snapshot`, as the app does), or by rendering the live game under
+its lock on a cache miss (`locked`, as it did before snapshots).  Reports
+reads and posts a second and read latency percentiles for each.
+
+    python -m benchmarks.snapshots
+    python -m benchmarks.snapshots --threads 16 --writes 0.1 --backend sqlite
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+
+from flask_restful.representations.json import output_json
+from werkzeug.exceptions import HTTPException
+
+import app
+import routes
+from benchmarks import random_frame, marking
+from controllers import GameController
+from models import Player, Game
+from persistence import DB, MemoryStorage, SQLiteStorage, JournalStorage
+
+MODES = ('snapshot', 'locked')
+
+
+def render_locked(game):
+    """ Render a game as `routes.render_game` did before snapshots: the live
+    game, under its lock, on a cache miss """
+    version = game.version
+    body = routes.RestGame.rendered.get((game.id, version))
+    if body is None:
+        with DB.lock(game.id):
+            version = game.version
+            body = output_json(routes.serialize_game.serialize(game),
+                               200).get_data()
+        routes.RestGame.rendered.put((game.id, version), body)
+    return version, body
+
+
+def worker(mode, games, players, writes, deadline, seed, reads, counts):
+    """ Read and post to `games` at random until `deadline`.  Appends read
+    latencies to `reads`, and counts posts. """
+    rng = random.Random(seed)
+    render = routes.render_game if mode == 'snapshot' else render_locked
+    table = DB.get(Game)
+    with app.app.app_context():
+        while time.time() < deadline:
+            i = rng.randrange(len(games))
+            if rng.random() >= writes:
+                start = time.perf_counter()
+                render(table[games[i]])
+                reads.append(time.perf_counter() - start)
+                continue
+            game = table[games[i]].snapshot()
+            if game.complete:
+                # Start a fresh game in its place
+                games[i] = GameController.create(players).id
+                continue
+            shots = random_frame(rng, game.current_frame == Game.FRAMES)
+            player = game.current_player or game.players[0]
+            try:
+                GameController.frame_for_player(
+                    game.id, player.id, [marking(s) for s in shots])
+                counts['posts'] += 1
+            except HTTPException:
+                # Someone else's turn by now
+                counts['retries'] += 1
+
+
+def run(mode, args, tmp):
+    if args.backend == 'journal':
+        storage = JournalStorage(os.path.join(tmp, mode + '.journal'))
+    elif args.backend == 'sqlite':
+        storage = SQLiteStorage(os.path.join(tmp, mode + '.db'))
+    else:
+        storage = MemoryStorage()
+    DB.use(storage)
+    routes.RestGame.rendered.clear()
+    players = [DB.add(Player('player %d' % i)).id for i in range(2)]
+    games = [GameController.create(players).id for _ in range(args.games)]
+    reads = []
+    counts = {'posts': 0, 'retries': 0}
+    deadline = time.time() + args.seconds
+    threads = [threading.Thread(target=worker, args=(
+        mode, games, players, args.writes, deadline, seed, reads, counts))
+        for seed in range(args.threads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    reads.sort()
+    pct = lambda p: reads[min(int(len(reads) * p), len(reads) - 1)] * 1e3
+    print('%-9s %9.0f %9.0f %9.3f %9.3f %9.3f %9.3f' % (
+        mode, len(reads) / args.seconds, counts['posts'] / args.seconds,
+        pct(0.5), pct(0.99), pct(0.999), reads[-1] * 1e3))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--games', type=int, default=4)
+    parser.add_argument('--writes', type=float, default=0.05,
+                        help='fraction of operations that post a frame '
+                        '(default 0.05)')
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--backend', choices=('journal', 'sqlite', 'memory'),
+                        default='journal')
+    args = parser.parse_args(argv)
+    tmp = tempfile.mkdtemp()
+    old = DB.storage
+    print('%d threads, %d games, %.0f%% posts, %s backend' % (
+        args.threads, args.games, args.writes * 100, args.backend))
+    print('%-9s %9s %9s %9s %9s %9s %9s' % ('', 'reads/s', 'posts/s',
+                                            'p50 ms', 'p99 ms', 'p99.9 ms',
+                                            'max ms'))
+    try:
+        for mode in MODES:
+            run(mode, args, tmp)
+    finally:
+        DB.use(old)
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main()
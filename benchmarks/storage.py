@@ -0,0 +1,50 @@
+""" Frame posts per second through `GameController.frame_for_player` under
+each storage backend, to show what durability costs. """
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from controllers import PlayerController, GameController
+from persistence import DB, MemoryStorage, SQLiteStorage
+from benchmarks import random_game, marking
+
+
+def run(storage, games, players_per_game, rng):
+    DB.use(storage)
+    players = [PlayerController.create('player %d' % i).id
+               for i in range(players_per_game)]
+    frames = [[marking(s) for s in shots]
+              for shots in random_game(players_per_game, rng)]
+    posts = 0
+    start = time.time()
+    for _ in range(games):
+        g = GameController.create(players)
+        for i, shots in enumerate(frames):
+            GameController.frame_for_player(g.id, players[i % len(players)], shots)
+            posts += 1
+    return posts / (time.time() - start)
+
+
+def main(games=200, players_per_game=4):
+    tmp = tempfile.mkdtemp()
+    try:
+        backends = [
+            ('memory', lambda: MemoryStorage()),
+            ('sqlite (synchronous=NORMAL)',
+             lambda: SQLiteStorage(os.path.join(tmp, 'normal.db'), 'NORMAL')),
+            ('sqlite (synchronous=FULL)',
+             lambda: SQLiteStorage(os.path.join(tmp, 'full.db'), 'FULL')),
+        ]
+        for name, make in backends:
+            rate = run(make(), games, players_per_game, random.Random(1234))
+            print('%-28s %10.0f frame posts/s' % (name, rate))
+    finally:
+        DB.use(MemoryStorage())
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
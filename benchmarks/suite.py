@@ -0,0 +1,340 @@
+""" The benchmark suite: scoring in the models, the controllers, and the
+HTTP endpoints through the Flask test client, at several player counts and
+game sizes.  Run it with `make bench`.
+
+Every case reports the best time per operation (a frame posted, a game
+serialized, a request...) over a few repeats.  Results are written to a JSON
+file, and `--compare` checks them against an earlier run, failing if any
+case got slower by more than `--threshold`.
+
+    python -m benchmarks.suite --output bench.json
+    python -m benchmarks.suite --compare baseline.json --threshold 0.1
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import timeit
+
+import app
+from controllers import PlayerController, GameController
+from models import Player, Game, Frame
+from routes import RestGame
+from serializers import compile_fields
+from benchmarks import random_frame, random_game, marking
+
+STRIKE = [Frame.Shot.strike, Frame.Shot.nil]
+SPARE = [Frame.Shot.five, Frame.Shot.spare]
+OPEN = [Frame.Shot.four, Frame.Shot.three]
+# ...as bowled in the tenth frame
+TENTH = {
+    'strikes': [Frame.Shot.strike] * 3,
+    'spares': SPARE + [Frame.Shot.five],
+    'open': OPEN,
+}
+
+PLAYERS = (1, 4, 8)
+# Rounds played in games that are read
+ROUNDS = (1, 5, 9)
+
+# name -> setup function returning (function to time, operations per call)
+cases = {}
+
+
+def case(name):
+    def register(f):
+        cases[name] = f
+        return f
+    return register
+
+
+def players(count):
+    return [PlayerController.create('bowler %d' % i) for i in range(count)]
+
+
+def frames_for(kind, rng):
+    """ A function giving the frame for each post in a game of `kind` - pass
+    it whether it's the tenth frame """
+    if kind == 'random':
+        return lambda tenth: random_frame(rng, tenth)
+    frame = {'strikes': STRIKE, 'spares': SPARE, 'open': OPEN}[kind]
+    return lambda tenth: TENTH[kind] if tenth else frame
+
+
+def played(count, rounds, rng):
+    """ A stored game of `count` players, `rounds` rounds in """
+    game = GameController.create([p.id for p in players(count)])
+    for _ in range(rounds * count):
+        game.post_frame(game.current_player or game.players[0], random_frame(rng))
+    return game
+
+
+# Models
+
+def model_post_frame(kind, count):
+    def setup():
+        rng = random.Random(1)
+        roster = [Player('bowler %d' % i) for i in range(count)]
+        frame = frames_for(kind, rng)
+
+        def play():
+            game = Game(roster)
+            for i in range(Game.FRAMES):
+                for player in roster:
+                    game.post_frame(player, frame(i == Game.FRAMES - 1))
+        return play, Game.FRAMES * count
+    return setup
+
+for kind in ('strikes', 'spares', 'open', 'random'):
+    for count in PLAYERS:
+        case('model.post_frame.%s.p%d' % (kind, count))(model_post_frame(kind, count))
+
+
+def model_post_shot(kind, count):
+    def setup():
+        rng = random.Random(1)
+        roster = [Player('bowler %d' % i) for i in range(count)]
+        frame = frames_for(kind, rng)
+        # The same frames, a shot at a time
+        shots = [(player, [s for s in frame(i == Game.FRAMES - 1)
+                           if s != Frame.Shot.nil])
+                 for i in range(Game.FRAMES) for player in roster]
+        rolls = sum(len(s) for _, s in shots)
+
+        def play():
+            game = Game(roster)
+            post_shot = game.post_shot
+            for player, balls in shots:
+                for shot in balls:
+                    post_shot(player, shot)
+        return play, rolls
+    return setup
+
+for kind in ('strikes', 'spares', 'open', 'random'):
+    for count in PLAYERS:
+        case('model.post_shot.%s.p%d' % (kind, count))(model_post_shot(kind, count))
+
+
+def model_serialize(how, count, rounds):
+    def setup():
+        from flask_restful import marshal
+        game = played(count, rounds, random.Random(1))
+        if how == 'marshal':
+            return lambda: marshal(game, Game.serialize), 1
+        compiled = compile_fields(Game.serialize)
+        return lambda: compiled(game), 1
+    return setup
+
+for how in ('marshal', 'compiled'):
+    for count in PLAYERS:
+        for rounds in ROUNDS:
+            case('model.serialize.%s.p%d.r%d' % (how, count, rounds))(
+                model_serialize(how, count, rounds))
+
+
+# Controllers
+
+@case('controller.create_game.p4')
+def controller_create_game():
+    pids = [p.id for p in players(4)]
+    return lambda: GameController.create(pids), 1
+
+
+def controller_frame(count):
+    def setup():
+        rng = random.Random(1)
+        pids = [p.id for p in players(count)]
+        frames = [[marking(s) for s in shots]
+                  for shots in random_game(count, rng)]
+
+        def play():
+            gid = GameController.create(pids).id
+            for i, shots in enumerate(frames):
+                GameController.frame_for_player(gid, pids[i % count], shots)
+        return play, Game.FRAMES * count
+    return setup
+
+for count in PLAYERS:
+    case('controller.frame_for_player.p%d' % count)(controller_frame(count))
+
+
+def controller_batch(count):
+    def setup():
+        rng = random.Random(1)
+        pids = [p.id for p in players(count)]
+        frames = [(pids[i % count], [marking(s) for s in shots])
+                  for i, shots in enumerate(random_game(count, rng))]
+
+        def play():
+            GameController.frames_for_game(GameController.create(pids).id, frames)
+        return play, 1
+    return setup
+
+for count in PLAYERS:
+    case('controller.frames_for_game.p%d' % count)(controller_batch(count))
+
+
+# HTTP
+
+def post(client, url, data):
+    resp = client.post(url, data=json.dumps(data), content_type='application/json')
+    assert resp.status_code == 200, resp.data
+
+
+def http_frame(count):
+    def setup():
+        client = app.app.test_client()
+        rng = random.Random(1)
+        pids = [p.id for p in players(count)]
+        frames = [dict(shots=[marking(s) for s in shots])
+                  for shots in random_game(count, rng)]
+
+        def play():
+            gid = GameController.create(pids).id
+            for i, frame in enumerate(frames):
+                post(client, '/game/%d/player/%d/frame' % (gid, pids[i % count]),
+                     frame)
+        return play, Game.FRAMES * count
+    return setup
+
+for count in PLAYERS:
+    case('http.post_frame.p%d' % count)(http_frame(count))
+
+
+def http_shot(count):
+    def setup():
+        client = app.app.test_client()
+        rng = random.Random(1)
+        pids = [p.id for p in players(count)]
+        shots = [(pids[i % count], dict(shot=marking(s)))
+                 for i, frame in enumerate(random_game(count, rng))
+                 for s in frame if s != Frame.Shot.nil]
+
+        def play():
+            gid = GameController.create(pids).id
+            for pid, shot in shots:
+                post(client, '/game/%d/player/%d/shot' % (gid, pid), shot)
+        return play, len(shots)
+    return setup
+
+for count in PLAYERS:
+    case('http.post_shot.p%d' % count)(http_shot(count))
+
+
+def http_get_game(count, rounds, cached):
+    def setup():
+        client = app.app.test_client()
+        url = '/game/%d' % played(count, rounds, random.Random(1)).id
+
+        def get():
+            if not cached:
+                RestGame.rendered.clear()
+            assert client.get(url).status_code == 200
+        return get, 1
+    return setup
+
+for count in PLAYERS:
+    for rounds in ROUNDS:
+        case('http.get_game.p%d.r%d' % (count, rounds))(
+            http_get_game(count, rounds, False))
+    case('http.get_game.cached.p%d' % count)(http_get_game(count, 9, True))
+
+
+@case('http.create_game.p4')
+def http_create_game():
+    client = app.app.test_client()
+    pids = [p.id for p in players(4)]
+    return lambda: post(client, '/game', dict(players=pids)), 1
+
+
+@case('http.create_player')
+def http_create_player():
+    client = app.app.test_client()
+    return lambda: post(client, '/player', dict(name='bowler')), 1
+
+
+# Running
+
+def run(names, quick=False, repeat=5):
+    """ Run the named cases.  Returns {name: microseconds per operation}. """
+    results = {}
+    for name in names:
+        f, ops = cases[name]()
+        # Aim for ~0.1s a repeat (less in quick mode)
+        budget = 0.02 if quick else 0.1
+        start = time.perf_counter()
+        f()
+        once = max(time.perf_counter() - start, 1e-7)
+        number = max(1, int(budget / once))
+        best = min(timeit.repeat(f, number=number,
+                                 repeat=2 if quick else repeat))
+        results[name] = best / number / ops * 1e6
+    return results
+
+
+def compare(results, baseline, threshold):
+    """ Compare results against a baseline.  Returns rows of (name, baseline
+    us, result us, change), and the names of cases that got slower by more
+    than `threshold` (0.1 for 10%). """
+    rows = []
+    regressions = []
+    for name in sorted(results):
+        if name not in baseline:
+            rows.append((name, None, results[name], None))
+            continue
+        change = results[name] / baseline[name] - 1
+        rows.append((name, baseline[name], results[name], change))
+        if change > threshold:
+            regressions.append(name)
+    return rows, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('-o', '--output', help='write results to this JSON file')
+    parser.add_argument('-k', '--filter', default='',
+                        help='only run cases with this in their name')
+    parser.add_argument('--compare', metavar='BASELINE',
+                        help='compare against results in this JSON file')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='slowdown that counts as a regression (default 0.1)')
+    parser.add_argument('--quick', action='store_true',
+                        help='fewer, shorter repeats')
+    args = parser.parse_args(argv)
+
+    names = sorted(n for n in cases if args.filter in n)
+    results = run(names, quick=args.quick)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'results': results,
+            }, f, indent=2, sort_keys=True)
+    if not args.compare:
+        for name in names:
+            print('%-45s %10.2f us' % (name, results[name]))
+        return 0
+
+    with open(args.compare) as f:
+        baseline = json.load(f)['results']
+    rows, regressions = compare(results, baseline, args.threshold)
+    for name, before, after, change in rows:
+        if before is None:
+            print('%-45s %10s %10.2f us       new' % (name, '', after))
+        else:
+            print('%-45s %10.2f %10.2f us %+8.1f%%%s' % (
+                name, before, after, change * 100,
+                '  REGRESSION' if name in regressions else ''))
+    if regressions:
+        print('%d regression(s) over %.0f%%' % (len(regressions),
+                                                args.threshold * 100))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,73 @@
+""" Resident memory as games pass through the 'tiered' backend.
+
+Plays two-player games to completion one after another, doing what the
+controllers do for each frame, and reports resident memory, how many games
+are in memory and archived, and the archive's size on disk as they go.
+With the 'tiered' backend memory should stay flat, apart from the listing
+index (about 140 bytes a game).  Pass 0 for `max_hot` to use the 'memory'
+backend instead, for comparison.
+
+    python -m benchmarks.tiering [games] [max_hot]
+"""
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from benchmarks import random_frame
+from indexes import game_index
+from leaderboard import leaderboard
+from metrics import resident_memory
+from models import Player, Game
+from persistence import DB, MemoryStorage, TieredStorage
+
+
+def main(games=2000000, max_hot=10000):
+    tmp = tempfile.mkdtemp()
+    old = DB.storage
+    rng = random.Random(1234)
+    frames = [random_frame(rng) for _ in range(10007)]
+    tenths = [random_frame(rng, True) for _ in range(1009)]
+    try:
+        if max_hot:
+            DB.use(TieredStorage(os.path.join(tmp, 'bowling.archive'),
+                                 max_hot=max_hot))
+        else:
+            DB.use(MemoryStorage())
+        players = [DB.add(Player('player %d' % i)) for i in range(1000)]
+        report = max(games // 20, 1)
+        print('%9s %9s %9s %9s %11s %9s' % ('games', 'rss MB', 'in memory',
+                                           'archived', 'archive MB', 'games/s'))
+        start = time.time()
+        f = 0
+        for n in range(1, games + 1):
+            game = DB.add(Game(rng.sample(players, 2)))
+            game_index.add(game)
+            while not game.complete:
+                player = game.current_player or game.players[0]
+                if game.current_frame == Game.FRAMES:
+                    shots = tenths[f % len(tenths)]
+                else:
+                    shots = frames[f % len(frames)]
+                f += 1
+                game.post_frame(player, shots)
+                DB.frame_posted(game, player, shots)
+            leaderboard.game_completed(game)
+            game_index.completed(game)
+            if n % report == 0:
+                storage = DB.storage
+                archived = getattr(storage, 'narchived', 0)
+                size = (os.path.getsize(storage.path) / 1e6
+                        if archived else 0.0)
+                print('%9d %9.1f %9d %9d %11.1f %9.0f' % (
+                    n, resident_memory() / 1e6, len(storage.games), archived,
+                    size, n / (time.time() - start)))
+    finally:
+        DB.use(old)
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,85 @@
+""" Throughput of frame posts and game reads as worker processes are added,
+all serving the same data from the 'shared' DB backend.
+
+Each worker plays its own games (two players, twenty frames) through the full
+Flask stack for a few seconds, then reads random games played by any worker
+for a few more.  Workers go from 1 to the number of cores, or the count given.
+"""
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import app
+import ids
+from persistence import DB, SharedMemoryStorage
+from benchmarks import random_game, marking
+
+
+def post(client, url, data):
+    return json.loads(client.post(url, data=json.dumps(data),
+                                  content_type='application/json').data)
+
+
+def worker(seed, seconds, start, results):
+    rng = random.Random(seed)
+    client = app.app.test_client()
+    pids = [post(client, '/player', dict(name='bowler'))['id'] for _ in range(2)]
+    while time.time() < start:
+        time.sleep(0.001)
+    posts = 0
+    end = start + seconds
+    while time.time() < end:
+        gid = post(client, '/game', dict(players=pids))['id']
+        for i, shots in enumerate(random_game(2, rng)):
+            post(client, '/game/%d/player/%d/frame' % (gid, pids[i % 2]),
+                 dict(shots=[marking(s) for s in shots]))
+        posts += 20
+    gids = list(DB.games)
+    reads = 0
+    end += seconds
+    while time.time() < end:
+        client.get('/game/%d' % rng.choice(gids))
+        reads += 1
+    results.put((posts, reads))
+
+
+def run(workers, seconds, path):
+    DB.use(SharedMemoryStorage(path, players=1000, games=200000))
+    ctx = multiprocessing.get_context('fork')
+    results = ctx.Queue()
+    start = time.time() + 0.5
+    procs = [ctx.Process(target=worker, args=(i, seconds, start, results))
+             for i in range(workers)]
+    for p in procs:
+        p.start()
+    totals = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+    DB.storage.close()
+    os.unlink(path)
+    return (sum(t[0] for t in totals) / float(seconds),
+            sum(t[1] for t in totals) / float(seconds))
+
+
+def main(max_workers=None, seconds=3):
+    tmp = tempfile.mkdtemp(dir='/dev/shm' if os.path.isdir('/dev/shm') else None)
+    old = DB.storage
+    try:
+        # Workers create players and games, so they need IDs that don't clash
+        ids.use(ids.BlockAllocator(os.path.join(tmp, 'bowling.ids')))
+        print('workers   posts/s    reads/s')
+        for workers in range(1, (max_workers or multiprocessing.cpu_count()) + 1):
+            posts, reads = run(workers, seconds, os.path.join(tmp, 'bowling.shm'))
+            print('%7d %9.0f %10.0f' % (workers, posts, reads))
+    finally:
+        DB.use(old)
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
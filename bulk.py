@@ -0,0 +1,316 @@
+""" Bulk export and import of the DB, a batch at a time.
+
+`export` streams the DB as NDJSON - a line for each player, then one for each
+game, in the order they were created:
+
+    {"type": "player", "id": 1, "name": "mario"}
+    {"type": "game", "id": 3, "players": [1, 2],
+     "frames": [[["X", null], [7, "/"]], [[4, 5]]], "totals": [20, 9]}
+
+A game's `frames` are each player's frames, in turn order, as they'd be
+posted - the frame in progress, if any, has only the shots made so far.
+`rolls` streams a CSV with a row per roll, for analytics: game ID, player ID,
+frame and roll (both from 1), and the pins it knocked down.  Both walk the
+games a page of IDs at a time from the game index, so nothing is built up
+front, and memory doesn't grow with the number of games.
+
+`load` reads an NDJSON export back in.  Games are replayed through the
+models, with no requests, parsing or serializing in the way, and handed to
+the storage `batch` records at a time - one transaction or journal write
+each.  Exported IDs are kept unless they clash.
+
+    python -m bulk export --format rolls --output rolls.csv
+    python -m bulk import bowling.ndjson
+"""
+import argparse
+import json
+import sys
+
+try:
+    from orjson import dumps, loads
+except ImportError:
+    from json import loads
+
+    def dumps(obj):
+        return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+import ids
+from models import Player, Game, Frame, ModelException
+from persistence import DB
+from indexes import game_index
+from leaderboard import leaderboard
+
+# Games to a chunk of output, and records to a storage batch
+BATCH = 1000
+
+FORMATS = ('ndjson', 'rolls')
+MIMETYPES = {'ndjson': 'application/x-ndjson', 'rolls': 'text/csv'}
+ROLLS_HEADER = b'gid,pid,frame,roll,pins\n'
+
+# Shots, as rolled -> scorecard markings, as the API takes them
+MARKINGS = dict((int(s), int(s)) for s in Frame.Shot if s >= Frame.Shot.zero)
+MARKINGS.update({Frame.Shot.strike: 'X', Frame.Shot.spare: '/',
+                 Frame.Shot.nil: None})
+NOTYET = int(Frame.Shot.notyet)
+
+
+def players():
+    """ Generate the players in the DB, by ID """
+    table = DB.get(Player)
+    # A copy of the IDs - players can be added as we go - in order, which the
+    # shared backend's aren't
+    for pid in sorted(table):
+        player = table.get(pid)
+        if player is not None:
+            yield player
+
+
+def games():
+    """ Generate the games in the DB, by ID - the order they were created
+    in, with a counter for IDs.  Walks the storage's own table, which under
+    the shared backend holds every worker's games, not only this one's. """
+    table = DB.get(Game)
+    # A copy of the IDs, in order, as for players
+    for gid in sorted(table):
+        game = table.get(gid)
+        if game is not None:
+            yield game
+
+
+def _chunks(items, batch):
+    """ Lists of up to `batch` items """
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == batch:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _frames(rolls):
+    """ A player's frames as the shots rolled in each, straight from their
+    PlayerRolls - three slots in the tenth frame, unrolled ones left out """
+    rolled = rolls.rolls.tolist()
+    last = Game.FRAMES - 1
+    return [[r for r in rolled[2 * i:2 * i + 2 if i < last else Game.ROLLS]
+             if r != NOTYET]
+            for i in range(rolls.nframes)]
+
+
+def game_record(game):
+    """ A game as an NDJSON record """
+    game = game.snapshot()
+    frames = []
+    totals = []
+    for player in game.players:
+        rolls = game.get_rolls(player.id)
+        frames.append([[MARKINGS[r] for r in frame]
+                       for frame in _frames(rolls)])
+        totals.append(rolls.total)
+    return {'type': 'game', 'id': game.id,
+            'players': [p.id for p in game.players], 'frames': frames,
+            'totals': totals}
+
+
+def game_rolls(game):
+    """ A game's rolls, in the order they were made: (player ID, frame, roll,
+    pins) """
+    strike, spare = Frame.Shot.strike, Frame.Shot.spare
+    game = game.snapshot()
+    seats = [(p.id, _frames(game.get_rolls(p.id))) for p in game.players]
+    rows = []
+    for i in range(max(len(frames) for _, frames in seats)):
+        for pid, frames in seats:
+            if i >= len(frames):
+                continue
+            roll, standing = 0, 10
+            for shot in frames[i]:
+                if shot == strike:
+                    pins = 10
+                elif shot == spare:
+                    pins = standing
+                elif shot < 0:
+                    continue
+                else:
+                    pins = shot
+                roll += 1
+                rows.append((pid, i + 1, roll, pins))
+                # The tenth frame racks up again once they're all down
+                standing = standing - pins or 10
+    return rows
+
+
+def export(format='ndjson', batch=BATCH):
+    """ Generate an export of the DB as bytes, a chunk of `batch` games at a
+    time - 'ndjson' for players and games, or 'rolls' for a CSV of rolls """
+    if format == 'rolls':
+        yield ROLLS_HEADER
+        for chunk in _chunks(games(), batch):
+            yield ''.join('%d,%d,%d,%d,%d\n' % ((game.id,) + row)
+                          for game in chunk
+                          for row in game_rolls(game)).encode('ascii')
+        return
+    exported = set()
+    for chunk in _chunks(players(), batch):
+        exported.update(p.id for p in chunk)
+        yield b''.join(dumps({'type': 'player', 'id': p.id, 'name': p.name})
+                       + b'\n' for p in chunk)
+    for chunk in _chunks(games(), batch):
+        lines = []
+        for game in chunk:
+            # Players added since they were exported
+            for p in game.players:
+                if p.id not in exported:
+                    exported.add(p.id)
+                    lines.append(dumps({'type': 'player', 'id': p.id,
+                                        'name': p.name}))
+            lines.append(dumps(game_record(game)))
+        lines.append(b'')
+        yield b'\n'.join(lines)
+
+
+def replay(players, frames):
+    """ Rebuild a game from its players and each one's frames, as exported.
+    Returns the game, and the (player, shots) posted to it.  Raises
+    ModelException or ValueError if the frames couldn't have been bowled. """
+    game = Game(players)
+    posts = []
+    for i in range(max(len(f) for f in frames) if frames else 0):
+        for player, theirs in zip(players, frames):
+            if i >= len(theirs):
+                continue
+            markings = theirs[i]
+            try:
+                shots = Frame.decode(markings)
+                game.post_frame(player, shots)
+            except (ValueError, ModelException):
+                # The frame in progress is short - post its shots one at a
+                # time
+                for marking in markings:
+                    if marking is not None:
+                        shot = game.post_shot(player, marking)
+                        posts.append((player, (shot,)))
+            else:
+                posts.append((player, shots))
+    return game, posts
+
+
+def load(lines, batch=BATCH):
+    """ Load an NDJSON export into the DB, `batch` records at a time.
+    Returns the number of players and games loaded.  Raises ValueError for a
+    record that can't be loaded, once everything before it is. """
+    # Exported player IDs -> Players loaded, and the IDs they were given
+    loaded = {}
+    taken = set()
+    players, played = [], []
+    counts = [0, 0]
+    # The highest player ID kept since IDs were last advanced past them
+    kept = [0]
+
+    def flush():
+        if not players and not played:
+            return
+        ids.advance(max(o.id for o in players + [g for g, _ in played]))
+        DB.add_batch(players, played)
+        for game, posts in played:
+            game_index.add(game)
+            if game.complete:
+                leaderboard.game_completed(game)
+                game_index.completed(game)
+        counts[0] += len(players)
+        counts[1] += len(played)
+        kept[0] = 0
+        del players[:], played[:]
+
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            record = loads(line)
+            if record['type'] == 'player':
+                name, pid = record['name'], record['id']
+                # Games refer to players by ID - a clashing one has to be
+                # replaced before any are built
+                if pid not in DB.get(Player) and pid not in taken:
+                    player = Player(name)
+                    player.id = pid
+                    kept[0] = max(kept[0], pid)
+                else:
+                    if kept[0]:
+                        # Its new ID mustn't be one kept in this batch
+                        ids.advance(kept[0])
+                        kept[0] = 0
+                    player = Player(name)
+                taken.add(player.id)
+                loaded[pid] = player
+                players.append(player)
+            elif record['type'] == 'game':
+                seats = []
+                for pid in record['players']:
+                    player = loaded.get(pid) or DB.get(Player).get(pid)
+                    if player is None:
+                        raise ValueError('Unknown player %s' % pid)
+                    seats.append(player)
+                game, posts = replay(seats, record['frames'])
+                if 'totals' in record and record['totals'] != [
+                        game.get_rolls(p.id).total for p in seats]:
+                    raise ValueError('Totals %s do not match the frames' %
+                                     record['totals'])
+                game.id = record['id']
+                played.append((game, posts))
+            else:
+                raise ValueError('Unknown record type %s' % record['type'])
+        except (ValueError, ModelException, TypeError) as e:
+            flush()
+            raise ValueError('Line %d: %s' % (number, e))
+        except KeyError as e:
+            flush()
+            raise ValueError('Line %d: Missing %s' % (number, e))
+        if len(players) + len(played) >= batch:
+            flush()
+    flush()
+    return tuple(counts)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Export the DB configured by BOWLING_SETTINGS, or load '
+                    'an export into it')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+    out = commands.add_parser('export', help='export the DB')
+    out.add_argument('--format', choices=FORMATS, default='ndjson')
+    out.add_argument('--output', help='file to write (default: stdout)')
+    into = commands.add_parser('import', help='load an NDJSON export')
+    into.add_argument('path', help="file to read ('-' for stdin)")
+    for command in (out, into):
+        command.add_argument('--batch', type=int, default=BATCH)
+    args = parser.parse_args(argv)
+
+    # Configures the DB
+    import app
+    if args.command == 'export':
+        f = open(args.output, 'wb') if args.output else sys.stdout.buffer
+        try:
+            for chunk in export(args.format, args.batch):
+                f.write(chunk)
+        finally:
+            if args.output:
+                f.close()
+        return
+    f = sys.stdin.buffer if args.path == '-' else open(args.path, 'rb')
+    try:
+        nplayers, ngames = load(f, args.batch)
+    except ValueError as e:
+        sys.exit('%s: %s' % (args.path, e))
+    finally:
+        if f is not sys.stdin.buffer:
+            f.close()
+        DB.storage.close()
+    print('Loaded %d players and %d games' % (nplayers, ngames))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,33 @@
+from contextlib import contextmanager
+
 from models import Player, Game, Frame, ModelException
 from persistence import DB
+from events import hub
+from indexes import game_index
+from leaderboard import leaderboard
+from metrics import steps
 
 from flask_restful import abort
 
+# Game.post_frame and Game.post_shot, timed
+post_frame = steps.timed('post_frame')(Game.post_frame)
+post_shot = steps.timed('post_shot')(Game.post_shot)
+
+
+@contextmanager
+def posting(gid):
+    """ Hold a game's lock while posting to it, and give the game - looked up
+    under the lock, as some storage hands out copies.  If the posts complete
+    it, it goes on the leaderboard and listings. """
+    with DB.lock(gid):
+        game = DB.get(Game)[gid]
+        complete = game.complete
+        yield game
+        if game.complete and not complete:
+            leaderboard.game_completed(game)
+            game_index.completed(game)
+
+
 # TODO: The controller is tightly coupled to the HTTP handlers.  It would be
 # nicer to have a shim inbetween that could translate errors (would decouple
 # the two)
@@ -34,10 +59,7 @@ class PlayerController(Controller):
     def create(name):
         """ Create a player.  Takes a player name.  Returns a valid flask_restful
         response. """
-        p = Player(name)
-        DB.players[p.id] = p
-        p = DB.players.get(p.id)
-        return p
+        return DB.add(Player(name))
 
 
 class GameController(Controller):
@@ -46,40 +68,104 @@ class GameController(Controller):
     klass = Game
 
     @staticmethod
+    @steps.timed('create_game')
     def create(players):
         """ Create a game.  Requires a list of player IDs.  Returns a valid flask_restful
         response """
         if not players:
             abort(422, message="Must provide a list of players to create a game")
-        players = [DB.players.get(id) or id for id in players[:]]
-        bad_players = filter(lambda p: type(p) == int, players)
+        players = [DB.get(Player).get(id) or id for id in players[:]]
+        bad_players = [p for p in players if type(p) == int]
         if len(bad_players) > 0:
             abort(422, message="Cannot create game with nonexistent player(s): %s" %
                   ", ".join(str(p) for p in bad_players))
-        g = Game(players)
-        DB.games[g.id] = g
-        return DB.games.get(g.id)
+        game = DB.add(Game(players))
+        game_index.add(game)
+        return game
 
     @staticmethod
+    @steps.timed('frame_for_player')
     def frame_for_player(gid, pid, shots):
         """ Add a frame to a player's frames in a game.  Takes the game ID, player
         ID, and a list of shots for the frame.  Returns a full copy of the game.
         """
-        game = DB.get(Game).get(gid)
-        if not game:
+        if gid not in DB.get(Game):
             abort(422, message="Unable to locate game %s" % gid)
         player = DB.get(Player).get(pid)
         if not player:
             abort(422, message="Unable to locate player %s" % pid)
-        if player not in game.players:
-            abort(400, message="Player %s is not participating in game %s" %
-                  (player.name, gid))
-        # convert to model shots
-        shots = [ Frame.Shot.convert(shot) for shot in shots[:] ]
-        try:
-            game.post_frame(player, shots)
-        except ModelException as e:
-            abort (500, e.message)
-        return DB.get(Game).get(gid)
+        with posting(gid) as game:
+            if player not in game.players:
+                abort(400, message="Player %s is not participating in game %s" %
+                      (player.name, gid))
+            try:
+                shots = Frame.decode(shots)
+            except ValueError as e:
+                abort(422, message=str(e))
+            try:
+                post_frame(game, player, shots)
+            except ModelException as e:
+                abort(422, message=str(e))
+            DB.frame_posted(game, player, shots)
+            hub.publish(game, player)
+        return game
 
+    @staticmethod
+    @steps.timed('shot_for_player')
+    def shot_for_player(gid, pid, shot):
+        """ Add a single shot to a player's current frame in a game.  Takes the
+        game ID, player ID, and the shot - a pin count, 'X' or '/'.  Returns
+        the game. """
+        if gid not in DB.get(Game):
+            abort(422, message="Unable to locate game %s" % gid)
+        player = DB.get(Player).get(pid)
+        if not player:
+            abort(422, message="Unable to locate player %s" % pid)
+        with posting(gid) as game:
+            if player not in game.players:
+                abort(400, message="Player %s is not participating in game %s" %
+                      (player.name, gid))
+            try:
+                Game.PlayerRolls.symbol(shot)
+            except ValueError as e:
+                abort(422, message=str(e))
+            try:
+                shot = post_shot(game, player, shot)
+            except ModelException as e:
+                abort(422, message=str(e))
+            DB.frame_posted(game, player, (shot,))
+            hub.publish(game, player)
+        return game
 
+    @staticmethod
+    @steps.timed('frames_for_game')
+    def frames_for_game(gid, frames):
+        """ Add several frames to a game in one go.  Takes the game ID, and a
+        list of (player ID, shots) in the order they were bowled.  Every frame
+        is checked before any are added - if one is bad, none are.  Returns
+        the game. """
+        if gid not in DB.get(Game):
+            abort(422, message="Unable to locate game %s" % gid)
+        with posting(gid) as game:
+            posts = []
+            for i, (pid, shots) in enumerate(frames):
+                player = DB.get(Player).get(pid)
+                if not player:
+                    abort(422, message="Frame %d: Unable to locate player %s" % (i, pid))
+                if player not in game.players:
+                    abort(400, message="Frame %d: Player %s is not participating in game %s" %
+                          (i, player.name, gid))
+                try:
+                    shots = Frame.decode(shots)
+                except ValueError:
+                    abort(422, message="Frame %d: Invalid shots %s" % (i, shots))
+                posts.append((player, shots))
+            try:
+                game.check_frames(posts)
+            except ModelException as e:
+                abort(422, message=str(e))
+            for player, shots in posts:
+                post_frame(game, player, shots)
+                DB.frame_posted(game, player, shots)
+                hub.publish(game, player)
+        return game
@@ -0,0 +1,152 @@
+""" Server-sent events for game updates.
+
+Controllers publish every change to a game to the `hub`.  Anyone interested in
+a game subscribes a callback to its channel, which is called (from the
+publishing thread) on every update - it should only wake its subscriber up,
+e.g. by setting an Event.  Subscribers don't need a thread of their own while
+they wait, so idle connections are cheap on an evented server.
+
+Each channel keeps a short history of recent updates, so a client reconnecting
+with the last version it saw only gets what it missed.  If it missed more than
+the history holds, it gets the full game instead.
+"""
+from collections import deque
+import json
+import threading
+
+from cache import LRUCache
+
+
+def update(game, player):
+    """ A compact update for `player`'s latest frame in a game: their last
+    three frames (the only ones the frame could have scored), their total, and
+    where the game is at. """
+    rolls = game.get_rolls(player.id)
+    first = max(0, rolls.nframes - 3)
+    return {
+        'version': game.version,
+        'pid': player.id,
+        'frames': [dict(frame=i + 1, score=f.score, shots=[int(s) for s in f.shots])
+                   for i, f in enumerate(rolls.frames(player)[first:], first)],
+        'total': rolls.total,
+        'current_frame': game.current_frame,
+        'current_player': game.current_player.id,
+        'complete': game.complete,
+    }
+
+
+def format_event(kind, version, data):
+    """ Format a server-sent event """
+    lines = ['id: %d' % version, 'event: %s' % kind]
+    lines.extend('data: ' + line for line in data.splitlines())
+    return '\n'.join(lines) + '\n\n'
+
+
+class Channel(object):
+    """ The updates to a single game """
+
+    def __init__(self, history):
+        self.events = deque(maxlen=history)
+        self.callbacks = set()
+        self._lock = threading.Lock()
+
+    def publish(self, version, event):
+        with self._lock:
+            self.events.append((version, event))
+            callbacks = list(self.callbacks)
+        for callback in callbacks:
+            callback()
+
+    def since(self, version):
+        """ Events after `version`, oldest first.  None if some of them are no
+        longer in the history. """
+        with self._lock:
+            if self.events and self.events[-1][0] <= version:
+                return []
+            if not self.events or self.events[0][0] > version + 1:
+                return None
+            return [e for e in self.events if e[0] > version]
+
+    def subscribe(self, callback):
+        with self._lock:
+            self.callbacks.add(callback)
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            self.callbacks.discard(callback)
+
+
+class Hub(object):
+    """ Publish/subscribe of updates, with a channel per game.  Channels are
+    only kept for the `maxgames` most recently used games. """
+
+    def __init__(self, history=32, maxgames=10000):
+        self.history = history
+        self.channels = LRUCache(maxgames)
+        self._lock = threading.Lock()
+
+    def channel(self, gid, create=True):
+        channel = self.channels.get(gid)
+        if channel is None and create:
+            with self._lock:
+                channel = self.channels.get(gid)
+                if channel is None:
+                    channel = Channel(self.history)
+                    self.channels.put(gid, channel)
+        return channel
+
+    def publish(self, game, player):
+        """ Publish `player`'s latest frame in a game.  Only games that have
+        had subscribers keep a channel. """
+        channel = self.channel(game.id, create=False)
+        if channel is not None:
+            data = json.dumps(update(game, player), separators=(',', ':'))
+            channel.publish(game.version, format_event('frame', game.version, data))
+
+
+hub = Hub()
+
+
+def stream(game, since, render, heartbeat=15.0, refresh=None):
+    """ Generate the event stream for a game.  Starts with the full game
+    (`render(game)` gives its JSON) unless the client has seen version `since`
+    and the history covers what it missed.  Sends a comment as a heartbeat
+    after `heartbeat` seconds without updates, and ends once the game is
+    complete.
+
+    `refresh(game)` should return the game's latest snapshot (or, if the
+    storage hands out copies of games, the latest copy).  Updates made by
+    other processes are picked up on the next heartbeat, as a full game. """
+    wakeup = threading.Event()
+    channel = None
+    try:
+        yield 'retry: 3000\n\n'
+        last = since
+        while True:
+            wakeup.clear()
+            if refresh is not None:
+                game = refresh(game)
+            if channel is not hub.channel(game.id):
+                # New, or evicted from the hub and recreated
+                if channel is not None:
+                    channel.unsubscribe(wakeup.set)
+                channel = hub.channel(game.id)
+                channel.subscribe(wakeup.set)
+            events = []
+            if last is not None and last < game.version:
+                events = channel.since(last)
+            if last is None or last > game.version or events is None:
+                version = game.version
+                yield format_event('game', version, render(game))
+                last = version
+            elif events:
+                for version, event in events:
+                    yield event
+                    last = version
+            elif game.complete and last == game.version:
+                return
+            elif not wakeup.wait(heartbeat):
+                yield ': heartbeat\n\n'
+    finally:
+        if channel is not None:
+            channel.unsubscribe(wakeup.set)
@@ -0,0 +1,202 @@
+""" ID allocation for models.
+
+`RestableMixin` takes its IDs from `next_id()`, which comes from the allocator
+picked by `use()` (or `configure()` with an app config's `ID_ALLOCATOR`):
+
+- `CounterAllocator`: 1, 2, 3...  The fastest, but only unique within one
+  process.
+- `BlockAllocator`: reserves blocks of IDs from a counter in a shared file,
+  under an fcntl lock, and hands them out one at a time.  Unique across every
+  process using the same file.
+- `SnowflakeAllocator`: 64 bit IDs made of a millisecond timestamp, a worker
+  number and a sequence number.  Unique across processes, with no shared
+  state, as long as each one has its own worker number.
+
+IDs only ever go up, so allocators can be moved past IDs already in use with
+`advance()` - e.g. after loading a DB.
+"""
+import itertools
+import os
+import struct
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not on Windows
+    fcntl = None
+
+
+class CounterAllocator(object):
+    """ Consecutive IDs from an in-process counter """
+
+    @classmethod
+    def from_config(cls, config):
+        return cls()
+
+    def __init__(self, start=1):
+        self._ids = itertools.count(start)
+        self._lock = threading.Lock()
+        self.allocate = self._allocator()
+
+    def _allocator(self):
+        # Calling the count's own next() makes allocating a single C call
+        return getattr(self._ids, '__next__', None) or self._ids.next
+
+    def advance(self, id):
+        """ Make sure every ID from now on is greater than `id` """
+        with self._lock:
+            current = next(self._ids)
+            self._ids = itertools.count(max(current, id + 1))
+            self.allocate = self._allocator()
+
+
+class BlockAllocator(object):
+    """ IDs in blocks of `block_size`, reserved from a counter kept in the file
+    at `path`.  Processes using the same file never get the same ID.  The rest
+    of a process's current block is lost when it exits, leaving a gap. """
+
+    COUNTER = struct.Struct('<q')
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config['ID_BLOCK_PATH'], config.get('ID_BLOCK_SIZE', 1000))
+
+    def __init__(self, path, block_size=1000):
+        if fcntl is None:
+            raise RuntimeError('Block allocation needs fcntl')
+        self.path = path
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._ids = iter(())
+        self._end = 0
+
+    def forked(self):
+        """ Called in a forked child - it mustn't hand out its parent's
+        block """
+        self._lock = threading.Lock()
+        self._ids = iter(())
+        self._end = 0
+
+    def _reserve(self, count, minimum=1):
+        """ Take `count` IDs from the shared counter, starting at `minimum` or
+        more.  Returns the first. """
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.lockf(fd, fcntl.LOCK_EX)
+            data = os.pread(fd, self.COUNTER.size, 0)
+            start = self.COUNTER.unpack(data)[0] if data else 1
+            start = max(start, minimum)
+            os.pwrite(fd, self.COUNTER.pack(start + count), 0)
+            return start
+        finally:
+            os.close(fd)  # Releases the lock
+
+    def allocate(self):
+        id = next(self._ids, None)
+        while id is None:
+            with self._lock:
+                # Someone else may have refilled it while we waited
+                id = next(self._ids, None)
+                if id is None:
+                    self._block(self._reserve(self.block_size))
+        return id
+
+    def _block(self, start):
+        self._ids = iter(range(start, start + self.block_size))
+        self._end = start + self.block_size
+
+    def advance(self, id):
+        """ Make sure every ID from now on is greater than `id` """
+        with self._lock:
+            current = next(self._ids, None)
+            if current is not None and id < self._end:
+                # Still in our block - skip to past it, without touching the
+                # file
+                self._ids = iter(range(max(current, id + 1), self._end))
+            else:
+                self._block(self._reserve(self.block_size, id + 1))
+
+
+class SnowflakeAllocator(object):
+    """ 64 bit IDs of 41 bits of milliseconds since `EPOCH`, 10 bits of
+    worker number and 12 bits of sequence, good for 4096 IDs per millisecond
+    per worker until 2089.  Every process needs a different `worker`. """
+
+    EPOCH = 1577836800000  # 2020-01-01, in milliseconds
+    WORKER_BITS = 10
+    SEQUENCE_BITS = 12
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config.get('ID_WORKER', 0))
+
+    def __init__(self, worker=0):
+        if not 0 <= worker < 1 << self.WORKER_BITS:
+            raise ValueError('Worker must be 0-%d' % ((1 << self.WORKER_BITS) - 1))
+        self.worker = worker
+        self._lock = threading.Lock()
+        self._ms = 0
+        self._seq = 0
+
+    def allocate(self):
+        ms = int(time.time() * 1000)
+        with self._lock:
+            if ms > self._ms:
+                self._ms, self._seq = ms, 0
+            else:
+                # Same millisecond, or the clock went back
+                self._seq += 1
+                if self._seq >> self.SEQUENCE_BITS:
+                    # Used up this millisecond - borrow the next one
+                    self._ms, self._seq = self._ms + 1, 0
+            return (((self._ms - self.EPOCH) << self.WORKER_BITS | self.worker)
+                    << self.SEQUENCE_BITS | self._seq)
+
+    def advance(self, id):
+        """ Make sure every ID from now on is greater than `id` """
+        ms = (id >> (self.WORKER_BITS + self.SEQUENCE_BITS)) + self.EPOCH
+        with self._lock:
+            if ms >= self._ms:
+                # Carry on from the millisecond after it
+                self._ms, self._seq = ms, (1 << self.SEQUENCE_BITS) - 1
+
+
+allocators = {
+    'counter': CounterAllocator,
+    'block': BlockAllocator,
+    'snowflake': SnowflakeAllocator,
+}
+
+allocator = None
+
+
+def next_id():
+    """ Allocate a new ID """
+    return allocator.allocate()
+
+
+def use(new):
+    """ Switch to another allocator """
+    global allocator
+    allocator = new
+
+
+def configure(config):
+    """ Switch to the allocator named by `ID_ALLOCATOR` in an app config """
+    use(allocators[config.get('ID_ALLOCATOR', 'counter')].from_config(config))
+
+
+def advance(id):
+    """ Make sure new IDs are greater than `id` """
+    allocator.advance(id)
+
+
+def _forked():
+    if hasattr(allocator, 'forked'):
+        allocator.forked()
+
+
+use(CounterAllocator())
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_forked)
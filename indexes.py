@@ -0,0 +1,94 @@
+""" Secondary indexes over the games in the DB, for listing them.
+
+Games are numbered in the order they were created, and each index keeps
+those positions in order: every game, each player's games, and the games
+still in progress.  Listings are keyset-paginated - a page starts after a
+given game - so every page costs the same however many games there are.
+"""
+import bisect
+import threading
+
+from skiplist import SkipList
+
+
+class GameIndex(object):
+    """ Game IDs by creation order, by player, and by whether they're still
+    in progress """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        # Game IDs in the order they were created, and each one's position
+        self.created = []
+        self.positions = {}
+        # Player ID -> positions of their games, in order
+        self.by_player = {}
+        # Positions of games that aren't complete, in order, and as a set
+        self.active = SkipList()
+        self._active = set()
+
+    def add(self, game):
+        """ Index a new game """
+        with self._lock:
+            self._add(game.id, [p.id for p in game.players], game.complete)
+
+    def _add(self, gid, pids, complete):
+        position = len(self.created)
+        self.created.append(gid)
+        self.positions[gid] = position
+        for pid in set(pids):
+            self.by_player.setdefault(pid, []).append(position)
+        if not complete:
+            self.active.insert(position)
+            self._active.add(position)
+
+    def completed(self, game):
+        """ Take a game that has just completed out of the active games """
+        with self._lock:
+            position = self.positions.get(game.id)
+            if position in self._active:
+                self.active.remove(position)
+                self._active.discard(position)
+
+    def page(self, after=None, limit=20, pid=None, active=False):
+        """ Up to `limit` game IDs in creation order, starting after game
+        `after`: from every game, or only player `pid`'s, and only active
+        ones if `active` is set.  Raises KeyError if there is no game
+        `after`. """
+        with self._lock:
+            start = -1 if after is None else self.positions[after]
+            if pid is not None:
+                mine = self.by_player.get(pid, [])
+                i = bisect.bisect_right(mine, start)
+                if active:
+                    # Worst case, this looks at all the player's games
+                    positions = []
+                    for position in mine[i:]:
+                        if position in self._active:
+                            positions.append(position)
+                            if len(positions) == limit:
+                                break
+                else:
+                    positions = mine[i:i + limit]
+            elif active:
+                positions = self.active.after(start, limit)
+            else:
+                positions = range(start + 1,
+                                  min(start + 1 + limit, len(self.created)))
+            return [self.created[p] for p in positions]
+
+    def rebuild(self, games):
+        """ Start over from a set of games, e.g. on loading the DB.  Their
+        IDs are taken as their creation order. """
+        # Only keep what's indexed - not every game at once
+        games = sorted((g.id, [p.id for p in g.players], g.complete)
+                       for g in games)
+        with self._lock:
+            self.clear()
+            for gid, pids, complete in games:
+                self._add(gid, pids, complete)
+
+
+game_index = GameIndex()
@@ -0,0 +1,66 @@
+""" Player statistics, and the house leaderboard.
+
+Statistics are only updated when a game completes, so they're kept per
+player as running aggregates (`PlayerStats`), and players are ranked by
+average in a skip list - updating a player's place, finding their rank and
+listing the top N are all O(log n), without looking at any games.
+"""
+import threading
+
+from models import PlayerStats
+from skiplist import SkipList
+
+
+class Leaderboard(object):
+    """ Statistics for every player who has completed a game, ranked by
+    average, then by high game """
+
+    def __init__(self):
+        self.stats = {}
+        self.ranking = SkipList()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(stats):
+        """ Sort key - best first, and unique per player """
+        return (-stats.average, -stats.high, stats.pid)
+
+    def game_completed(self, game):
+        """ Add a completed game to its players' statistics """
+        with self._lock:
+            for player in game.players:
+                stats = self.stats.get(player.id)
+                if stats is None:
+                    stats = self.stats[player.id] = PlayerStats(player.id)
+                else:
+                    self.ranking.remove(self.key(stats))
+                stats.add_game(game.get_rolls(player.id))
+                self.ranking.insert(self.key(stats))
+
+    def get(self, pid):
+        """ A player's statistics, or None if they haven't completed a game """
+        return self.stats.get(pid)
+
+    def rank(self, pid):
+        """ A player's place on the leaderboard, from 1.  None if they're not
+        on it. """
+        with self._lock:
+            stats = self.stats.get(pid)
+            return self.ranking.index(self.key(stats)) + 1 if stats else None
+
+    def top(self, n):
+        """ Statistics for the best `n` players, best first """
+        with self._lock:
+            return [self.stats[key[-1]] for key in self.ranking.first(n)]
+
+    def rebuild(self, games):
+        """ Start over from a set of games, e.g. on loading the DB """
+        with self._lock:
+            self.stats = {}
+            self.ranking = SkipList()
+        for game in games:
+            if game.complete:
+                self.game_completed(game)
+
+
+leaderboard = Leaderboard()
@@ -0,0 +1,238 @@
+""" Request metrics, served in Prometheus text format at /metrics.
+
+Latencies go into histograms with fixed buckets: every request by resource,
+method and status, and the steps inside one - parsing, controller work,
+Game.post_frame and marshaling - by step.  Gauges are read when /metrics is
+scraped.  Recording a timing only queues it - it's counted into its bucket
+later, in a batch - so metrics can stay on in production; set
+`METRICS = False` to turn them off.
+"""
+import bisect
+import os
+import threading
+from collections import deque
+from functools import wraps
+from time import perf_counter
+
+import flask
+
+# Upper bounds of histogram buckets, in seconds - 10us to 10s
+BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+           0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+           1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+enabled = True
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (name, _escape(value))
+                             for name, value in zip(names, values))
+
+
+def _escape(value):
+    return (str(value).replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram(object):
+    """ A histogram of observations, e.g. latencies in seconds, for each set
+    of label values.
+
+    Observations are appended to a queue - which is thread-safe without a
+    lock - and counted into buckets a batch at a time, when the queue gets
+    long or the histogram is read. """
+
+    # Observations to queue before counting them
+    BATCH = 1024
+
+    def __init__(self, name, help, labels=(), buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # Label values -> [count in each bucket..., count over the last
+        # bucket, sum of observations]
+        self.series = {}
+        self.pending = deque()
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        if enabled:
+            self.pending.append((labels, value))
+            if len(self.pending) > self.BATCH:
+                self.flush()
+
+    def flush(self):
+        """ Count queued observations into their buckets """
+        with self._lock:
+            pending = self.pending
+            buckets = self.buckets
+            for _ in range(len(pending)):
+                labels, value = pending.popleft()
+                series = self.series.get(labels)
+                if series is None:
+                    series = self.series[labels] = [0] * (len(buckets) + 2)
+                series[bisect.bisect_left(buckets, value)] += 1
+                series[-1] += value
+
+    def timed(self, *labels):
+        """ A decorator timing calls to a function """
+        def decorator(f):
+            pending, append = self.pending, self.pending.append
+
+            @wraps(f)
+            def wrapper(*args, **kwargs):
+                start = perf_counter()
+                try:
+                    return f(*args, **kwargs)
+                finally:
+                    # observe(), inlined
+                    if enabled:
+                        append((labels, perf_counter() - start))
+                        if len(pending) > self.BATCH:
+                            self.flush()
+            return wrapper
+        return decorator
+
+    def count(self, *labels):
+        """ How many observations there have been for the label values """
+        self.flush()
+        series = self.series.get(labels)
+        return sum(series[:-1]) if series else 0
+
+    def clear(self):
+        with self._lock:
+            self.pending.clear()
+            self.series = {}
+
+    def render(self):
+        lines = ['# HELP %s %s' % (self.name, self.help),
+                 '# TYPE %s histogram' % self.name]
+        self.flush()
+        with self._lock:
+            series = sorted((k, list(v)) for k, v in self.series.items())
+        for values, counts in series:
+            total = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                total += count
+                lines.append('%s_bucket%s %d' % (
+                    self.name,
+                    _labels(self.labels + ('le',), values + (_number(bound),)),
+                    total))
+            labels = _labels(self.labels, values)
+            lines.append('%s_sum%s %s' % (self.name, labels, _number(counts[-1])))
+            lines.append('%s_count%s %d' % (self.name, labels, total))
+        return lines
+
+
+class Gauge(object):
+    """ A value read when metrics are scraped, from a function of no
+    arguments """
+
+    def __init__(self, name, help, read):
+        self.name = name
+        self.help = help
+        self.read = read
+
+    def render(self):
+        return ['# HELP %s %s' % (self.name, self.help),
+                '# TYPE %s gauge' % self.name,
+                '%s %s' % (self.name, _number(self.read()))]
+
+
+class Registry(object):
+    """ Every metric served at /metrics """
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, *args, **kwargs):
+        return self.register(Histogram(*args, **kwargs))
+
+    def gauge(self, *args, **kwargs):
+        return self.register(Gauge(*args, **kwargs))
+
+    def render(self):
+        """ All metrics in Prometheus text format """
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+requests = registry.histogram(
+    'bowling_request_seconds', 'Time spent handling requests',
+    ('resource', 'method', 'status'))
+steps = registry.histogram(
+    'bowling_step_seconds', 'Time spent in steps of handling a request',
+    ('step',))
+
+
+def resident_memory():
+    """ The process's resident memory in bytes """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (IOError, OSError, ValueError):
+        # Peak rather than current, but better than nothing
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss if os.uname()[0] == 'Darwin' else rss * 1024
+
+
+def configure(config):
+    global enabled
+    enabled = config.get('METRICS', True)
+
+
+class Request(flask.Request):
+    """ Flask's request, which also notes the URL rule matched in the WSGI
+    environ, where `instrument` can read it after Flask is done """
+
+    @property
+    def url_rule(self):
+        return self.environ.get('bowling.url_rule')
+
+    @url_rule.setter
+    def url_rule(self, rule):
+        self.environ['bowling.url_rule'] = rule
+
+
+def instrument(app):
+    """ Time every request to a Flask app, by resource, method and status.
+    Streamed responses are timed until they start. """
+    wsgi_app = app.wsgi_app
+
+    def timed(environ, start_response):
+        start = perf_counter()
+        status = []
+
+        def starting(line, headers, exc_info=None):
+            status.append(line[:3])
+            return start_response(line, headers, exc_info)
+        try:
+            return wsgi_app(environ, starting)
+        finally:
+            rule = environ.get('bowling.url_rule')
+            requests.observe(perf_counter() - start,
+                             rule.endpoint if rule is not None else 'none',
+                             environ.get('REQUEST_METHOD'),
+                             status[0] if status else '500')
+    app.request_class = Request
+    app.wsgi_app = timed
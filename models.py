@@ -1,12 +1,14 @@
 import sys
-import random
+import struct
+from array import array
 from collections import OrderedDict
-from itertools import cycle
 
 from flask_restful import fields, marshal
 
 from enum import IntEnum
 
+import ids
+
 
 class ModelException(Exception):
     pass
@@ -27,7 +29,11 @@ class RestableMixin(object):
 
     def __init__(self):
         """ Generate an ID and add it to myself """
-        self.id = random.randint(1, 100000)
+        self.id = self.next_id()
+
+    def next_id(self):
+        """ Allocate a new ID """
+        return ids.next_id()
 
 
 class Frame(object): # Not a RestableMixin
@@ -59,13 +65,22 @@ class Frame(object): # Not a RestableMixin
             The allowable set of values for `marking` is:
                 (0-9, 'X', '/', None)
             """
-            theshot = {
-                'X': cls.strike,
-                '/': cls.spare,
-                None: cls.nil
-            }.get(marking)
-            if not theshot:
-                return cls(marking)
+            try:
+                if (isinstance(marking, cls.types) and
+                        not isinstance(marking, bool)):
+                    return cls.markings[marking]
+            except (KeyError, TypeError):
+                pass
+            raise ValueError('%r is not a valid marking' % (marking,))
+
+    # Map of int values to Shots - much faster than calling Shot()
+    Shot.values = dict((int(s), s) for s in Shot)
+    # ...and of scorecard markings
+    Shot.markings = dict(Shot.values, X=Shot.strike)
+    Shot.markings.update({'/': Shot.spare, None: Shot.nil})
+    # What a marking can be - True and 7.0 would be found as 1 and 7, so
+    # they're turned away before looking them up
+    Shot.types = (int, str, type(None))
 
     # Serializable attribtues
     serialize = {
@@ -76,6 +91,31 @@ class Frame(object): # Not a RestableMixin
         )
     }
 
+    __slots__ = ('player', 'score', 'shots', 'complete')
+
+    # Markings for every frame that could be bowled -> its shots.  Filled in
+    # below.
+    frames = {}
+
+    @classmethod
+    def decode(cls, markings):
+        """ Convert the markings for a frame, e.g. [7, '/'], to its shots,
+        checking that it could be bowled: a strike ('X', None), a spare, or
+        two balls knocking down 9 pins at most.  Two balls knocking down all
+        10 are a spare.  A tenth frame with a strike or spare has a third
+        ball, e.g. ['X', 7, '/'].  Raises ValueError if it isn't a frame. """
+        try:
+            key = tuple(markings)
+            types = cls.Shot.types
+            for marking in key:
+                if not isinstance(marking, types) or isinstance(marking, bool):
+                    break
+            else:
+                return cls.frames[key]
+        except (KeyError, TypeError):
+            pass
+        raise ValueError('Invalid frame %s' % (markings,))
+
     def __init__(self, player):
         """ Create a frame
             :param player: Person whose frame this is
@@ -102,6 +142,47 @@ class Frame(object): # Not a RestableMixin
         return self.shots[1] == Frame.Shot.spare
 
 
+Frame.frames[('X', None)] = (Frame.Shot.strike, Frame.Shot.nil)
+for _first in range(10):
+    _spare = (Frame.Shot.values[_first], Frame.Shot.spare)
+    Frame.frames[(_first, '/')] = Frame.frames[(_first, 10 - _first)] = _spare
+    for _second in range(10 - _first):
+        Frame.frames[(_first, _second)] = (Frame.Shot.values[_first],
+                                           Frame.Shot.values[_second])
+del _first, _second, _spare
+
+
+def _tenth_frames():
+    """ Tenth frames with a fill ball """
+    def mark(pins, standing, fresh):
+        if pins < standing:
+            return pins, Frame.Shot.values[pins]
+        if fresh:
+            return 'X', Frame.Shot.strike
+        return '/', Frame.Shot.spare
+    for first in range(11):
+        standing = 10 - first or 10
+        for second in range(standing + 1):
+            left = standing - second
+            if first < 10 and left:
+                continue
+            for third in range(left + 1 if left else 11):
+                balls = [mark(first, 10, True),
+                         mark(second, standing, first == 10),
+                         mark(third, left or 10, not left)]
+                markings = tuple(m for m, _ in balls)
+                shots = tuple(s for _, s in balls)
+                Frame.frames[markings] = shots
+                if '/' in markings:
+                    # A spare's pins, as a number
+                    pins = (second, third)[markings.index('/') - 1]
+                    Frame.frames[tuple(pins if m == '/' else m
+                                       for m in markings)] = shots
+
+
+_tenth_frames()
+
+
 class Player(RestableMixin):
     """ An object representing a player during a game """
 
@@ -126,13 +207,22 @@ class Game(RestableMixin):
     Each game consists of 10 frames.  Games are tightly coupled to frames in
     this implementation; frames are per player per round.  That is, to say, a
     frame represents one player's single frame.
+
+    Every change publishes a snapshot of the game: a copy that never changes,
+    which readers get from `snapshot()` with one attribute read, and can
+    serialize without taking the game's lock.  Snapshots share the players,
+    and every PlayerRolls, with the game - a change copies the PlayerRolls of
+    the player rolling before touching it, so the ones in published snapshots
+    are never written to.
     """
 
     class PlayerFrameMapItem(object):
         """ This class is a _terrible_ hack to get serilization working
         with flask_restful.  Forgive me, for I have sinned.
 
-        Store a player ID + frames together in an object
+        Store a player ID + frames together in an object.  These are only built
+        on demand (see `Game.frames`) - the game itself keeps its frames in
+        `PlayerRolls`.
         """
 
         serialize = {
@@ -142,9 +232,254 @@ class Game(RestableMixin):
             )
         }
 
+        def __init__(self, pid, frames=None):
+            self.pid = pid
+            self.frames = frames if frames is not None else []
+
+    class PlayerRolls(object):
+        """ Compact storage of a single player's rolls in a game, scored a
+        roll at a time.
+
+        Rolls are kept as `Frame.Shot` values in a fixed array of 21 slots - two
+        per frame, plus room for the fill ball in the tenth frame.  Frame scores
+        live in a parallel array, and `complete` is a bitmask of the frames
+        whose score is final.  `touched` holds the game version each frame last
+        changed in, so a client can be sent only the frames that changed since
+        a version it has.  `Frame` objects are only built when asked for.
+
+        Scoring is a state machine.  The player's `state` is a number standing
+        for where they are - the frame, the ball in the frame, the pins left
+        standing, and how many bonus balls the last two frames are still owed
+        - and a roll moves it on with one lookup in `TRANSITIONS`, which says
+        where the roll goes, which frames' scores it adds to, which frames it
+        finishes, and whether the player's turn is over.  The table is built
+        once, below the Game class, so every roll costs the same.
+        """
+
+        __slots__ = ('pid', 'rolls', 'scores', 'complete', 'state', 'total',
+                     'touched')
+
+        # Copied for every new player - see Game.ROLLS and Game.FRAMES
+        EMPTY_ROLLS = array('b', [Frame.Shot.notyet] * 21)
+        EMPTY_SCORES = array('h', [0] * 10)
+        EMPTY_TOUCHED = array('I', [0] * 10)
+
+        # What a roll can be: pins 0-10 are symbols 0-10, 'X' 11 and '/' 12.
+        # Markings and Shots -> symbols.
+        SYMBOLS = 13
+        symbols = dict((pins, pins) for pins in range(11))
+        symbols.update({'X': 11, '/': 12, Frame.Shot.strike: 11,
+                        Frame.Shot.spare: 12})
+        # Filled in below the Game class: for each state and symbol, the
+        # transition, or None if the roll can't be made - (next state, Shot
+        # recorded, its slot, slot to fill with `nil` or -1, pins, frames
+        # scoring the pins, frames finished, whether the turn is over).  For
+        # each state, the number of frames begun and the ball in the frame.
+        TRANSITIONS = []
+        FRAMES = []
+        BALLS = []
+        START = DONE = 0
+        # (state, shots) -> the transition for posting a whole frame, its
+        # rolls merged - (next state, (slot, Shot) to write, (frame, pins) to
+        # score, frames finished, their bitmask)
+        FRAME_TRANSITIONS = {}
+
         def __init__(self, pid):
             self.pid = pid
-            self.frames = []
+            self.rolls = Game.PlayerRolls.EMPTY_ROLLS[:]
+            self.scores = Game.PlayerRolls.EMPTY_SCORES[:]
+            self.complete = 0
+            self.state = Game.PlayerRolls.START
+            self.total = 0
+            self.touched = Game.PlayerRolls.EMPTY_TOUCHED[:]
+
+        def copy(self):
+            """ A copy to roll into, leaving this one as it is """
+            rolls = Game.PlayerRolls.__new__(Game.PlayerRolls)
+            rolls.pid = self.pid
+            rolls.rolls = self.rolls[:]
+            rolls.scores = self.scores[:]
+            rolls.complete = self.complete
+            rolls.state = self.state
+            rolls.total = self.total
+            rolls.touched = self.touched[:]
+            return rolls
+
+        @property
+        def nframes(self):
+            """ How many frames the player has begun """
+            return Game.PlayerRolls.FRAMES[self.state]
+
+        @classmethod
+        def symbol(cls, shot):
+            """ The symbol for a shot - a pin count, 'X', '/' or a Shot.
+            Raises ValueError if it isn't one. """
+            try:
+                if not isinstance(shot, bool):
+                    return cls.symbols[shot]
+            except (KeyError, TypeError):
+                pass
+            raise ValueError('%r is not a valid shot' % (shot,))
+
+        @classmethod
+        def transition(cls, state, shot):
+            """ The transition for rolling `shot` in `state`.  Raises
+            ModelException if it can't be rolled. """
+            try:
+                t = cls.TRANSITIONS[state * cls.SYMBOLS + cls.symbol(shot)]
+            except ValueError as e:
+                raise ModelException(str(e))
+            if t is None:
+                if state == cls.DONE:
+                    raise ModelException('No frames left to post')
+                raise ModelException('Shot %s is not possible in frame %d' %
+                                     (shot, cls.FRAMES[state] + (not cls.BALLS[state])))
+            return t
+
+        @classmethod
+        def frame_transition(cls, state, shots):
+            """ The transition for posting a whole frame in `state`.  A `nil`
+            shot can follow the end of the frame - as it does a strike.
+            Raises ModelException if the shots aren't a whole frame. """
+            t = cls.FRAME_TRANSITIONS.get((state, tuple(shots)))
+            if t is None:
+                # Not a whole frame - find out why
+                t = cls._merge(cls._frame_transitions(state, shots))
+            return t
+
+        @classmethod
+        def _frame_transitions(cls, state, shots):
+            if state == cls.DONE:
+                raise ModelException('No frames left to post')
+            if cls.BALLS[state]:
+                raise ModelException('Frame %d is in progress' % cls.FRAMES[state])
+            frame = cls.FRAMES[state] + 1
+            transitions = []
+            over = False
+            for shot in shots:
+                if over:
+                    if shot != Frame.Shot.nil:
+                        raise ModelException('Too many shots for frame %d' % frame)
+                    continue
+                t = cls.transition(state, shot)
+                transitions.append(t)
+                state, over = t[0], t[-1]
+            if not over:
+                raise ModelException('Too few shots for frame %d' % frame)
+            return transitions
+
+        @staticmethod
+        def _merge(transitions):
+            """ One transition doing the work of a frame's worth of rolls """
+            writes, adds, finishes = [], {}, []
+            for state, shot, slot, nil, pins, add, finish, _ in transitions:
+                writes.append((slot, shot))
+                if nil >= 0:
+                    writes.append((nil, Frame.Shot.nil))
+                for i in add:
+                    adds[i] = adds.get(i, 0) + pins
+                finishes.extend(finish)
+            return (state, tuple(writes), tuple(sorted(adds.items())),
+                    tuple(finishes), sum(1 << i for i in finishes))
+
+        def roll(self, t, version=0):
+            """ Record a roll, given its transition, as part of game version
+            `version`.  Returns whether the player's turn is over. """
+            state, shot, slot, nil, pins, adds, finishes, over = t
+            rolls = self.rolls
+            rolls[slot] = shot
+            if nil >= 0:
+                rolls[nil] = Frame.Shot.nil
+            scores = self.scores
+            touched = self.touched
+            for i in adds:
+                scores[i] += pins
+                touched[i] = version
+            for i in finishes:
+                self.complete |= 1 << i
+                self.total += scores[i]
+            self.state = state
+            return over
+
+        def roll_frame(self, t, version=0):
+            """ Record a whole frame, given its transition from
+            `frame_transition`, as part of game version `version`.  Finished
+            frames take every pin scored first, as no roll scores for a frame
+            after finishing it. """
+            state, writes, adds, finishes, mask = t
+            rolls = self.rolls
+            for slot, shot in writes:
+                rolls[slot] = shot
+            scores = self.scores
+            touched = self.touched
+            for i, pins in adds:
+                scores[i] += pins
+                touched[i] = version
+            for i in finishes:
+                self.total += scores[i]
+            self.complete |= mask
+            self.state = state
+
+        def shots(self, i):
+            """ The shots of frame `i` (0-based) - three in a tenth frame with
+            a fill ball """
+            shot = Frame.Shot.values
+            if i < Game.FRAMES - 1:
+                return [shot[r] for r in self.rolls[2 * i:2 * i + 2]]
+            rolls = self.rolls[18:21]
+            if (rolls[2] == Frame.Shot.notyet and rolls[0] != Frame.Shot.strike
+                    and rolls[1] != Frame.Shot.spare):
+                rolls = rolls[:2]
+            return [shot[r] for r in rolls]
+
+        def done(self, i):
+            """ Whether or not frame `i` has a final score """
+            return bool(self.complete & (1 << i))
+
+        def frame(self, i, player):
+            """ Build a `Frame` object for frame `i` """
+            frame = Frame.__new__(Frame)
+            frame.player = player
+            frame.shots = self.shots(i)
+            frame.complete = self.done(i)
+            # Scores add up as bonus balls are rolled - they only count once
+            # they're final
+            frame.score = self.scores[i] if frame.complete else 0
+            return frame
+
+        def frames(self, player):
+            return [self.frame(i, player) for i in range(self.nframes)]
+
+        def changed_since(self, version):
+            """ The frames (0-based) that changed after game version
+            `version` """
+            touched = self.touched
+            return [i for i in range(self.nframes) if touched[i] > version]
+
+        # Binary layout: pid, rolls, scores, complete, state, total, touched
+        PACKED = struct.Struct('<q21s10hHHh10I')
+
+        def pack_into(self, buf, offset):
+            Game.PlayerRolls.PACKED.pack_into(
+                buf, offset, self.pid, self.rolls.tobytes(), *(
+                    tuple(self.scores) +
+                    (self.complete, self.state, self.total) +
+                    tuple(self.touched)))
+
+        @classmethod
+        def unpack_from(cls, buf, offset):
+            values = cls.PACKED.unpack_from(buf, offset)
+            rolls = cls.__new__(cls)
+            rolls.pid = values[0]
+            rolls.rolls = array('b', values[1])
+            rolls.scores = array('h', values[2:12])
+            rolls.complete, rolls.state, rolls.total = values[12:15]
+            rolls.touched = array('I', values[15:25])
+            return rolls
+
+    # Frames in a game, and roll slots per player
+    FRAMES = 10
+    ROLLS = 21
 
     # Serializable attribtues
     serialize = dict({
@@ -164,6 +499,10 @@ class Game(RestableMixin):
         'totals': fields.Raw
     }, **RestableMixin.serialize)
 
+    # Attributes for game listings - everything but the frames
+    summary = dict((k, v) for k, v in serialize.items()
+                   if k not in ('frames', 'current_player'))
+
     def __init__(self, players):
         """ Create a new game
             :param players: iterable of Player(s) for the game - the iteration
@@ -171,89 +510,389 @@ class Game(RestableMixin):
         """
         super(Game, self).__init__()
         self.players = list(players) # make a predictable iteration order
-        self._players = cycle(self.players) # TODO - Check for dupes
+        # Index of the current player in `players`, which is also how many
+        # players have completed the current round
+        self._turn = 0 # TODO - Check for dupes
         self.current_frame = None
         self.started = False
         self.complete = False
         self.current_player = None
-        # map of playerID -> running scores
-        self.totals = OrderedDict()
-        # List of PlayerFrameMapItems to hold frames per player
-        self.frames = []
-        for p in self.players:
-            self.totals[p.id] = 0
-            self.frames.append(Game.PlayerFrameMapItem(p.id))
+        # Bumped every time the game changes
+        self.version = 0
+        # PlayerRolls per player, in turn order, and a map of playerID -> index
+        # into it
+        self._rolls = []
+        self._seats = {}
+        for seat, p in enumerate(self.players):
+            self._seats.setdefault(p.id, seat)
+            self._rolls.append(Game.PlayerRolls(p.id))
+        self._snapshot = None
+        self._publish()
+
+    @property
+    def id(self):
+        return self._id
+
+    @id.setter
+    def id(self, id):
+        # A game can be given a new ID once it's made, e.g. if it clashes -
+        # the snapshot has to have it too
+        self._id = id
+        if getattr(self, '_snapshot', None) is not None:
+            self._publish()
+
+    @property
+    def totals(self):
+        """ Map of playerID -> running score, in turn order """
+        return OrderedDict((p.id, self.get_rolls(p.id).total)
+                           for p in self.players)
+
+    def snapshot(self):
+        """ The game as of its last change, to read without its lock.  A
+        snapshot is its own snapshot. """
+        return self._snapshot or self
+
+    def _publish(self):
+        """ Publish the game as it is now as its snapshot """
+        # Attribute by attribute, in the order __init__ sets them, so the
+        # snapshot shares its attribute names with every other game - copying
+        # __dict__ costs twice as much
+        snapshot = Game.__new__(Game)
+        snapshot._id = self._id
+        snapshot.players = self.players
+        snapshot._turn = self._turn
+        snapshot.current_frame = self.current_frame
+        snapshot.started = self.started
+        snapshot.complete = self.complete
+        snapshot.current_player = self.current_player
+        snapshot.version = self.version
+        snapshot._rolls = tuple(self._rolls)
+        snapshot._seats = self._seats
+        snapshot._snapshot = None
+        # Readers get the old snapshot or the new one - nothing in between
+        self._snapshot = snapshot
+
+    @property
+    def frames(self):
+        """ List of PlayerFrameMapItems to hold frames per player """
+        return [ Game.PlayerFrameMapItem(r.pid, r.frames(p))
+                 for p, r in zip(self.players, self._rolls) ]
+
+    # Binary layout of a game's own state, followed by a PlayerRolls per player:
+    # id, version, player count, current frame (0 before the game starts),
+    # turn, started, complete
+    PACKED = struct.Struct('<qIHbH??')
+
+    def packed_size(self):
+        """ Size in bytes of `pack()` """
+        return (Game.PACKED.size +
+                len(self.players) * Game.PlayerRolls.PACKED.size)
+
+    def pack(self):
+        """ Pack the game's full state into bytes.  Players are referenced by
+        ID. """
+        buf = bytearray(self.packed_size())
+        self.pack_into(buf, 0)
+        return bytes(buf)
+
+    def pack_into(self, buf, offset):
+        """ Pack the game into a writable buffer at `offset` """
+        Game.PACKED.pack_into(buf, offset, self.id, self.version,
+                              len(self.players), self.current_frame or 0,
+                              self._turn, self.started, self.complete)
+        offset += Game.PACKED.size
+        for rolls in self._rolls:
+            rolls.pack_into(buf, offset)
+            offset += Game.PlayerRolls.PACKED.size
+
+    @classmethod
+    def unpack_from(cls, buf, offset, players):
+        """ Rebuild a game packed at `offset` in `buf`.  `players` maps player
+        IDs to Players.  Returns the game and the offset just past it. """
+        id, version, count, current_frame, turn, started, complete = \
+            cls.PACKED.unpack_from(buf, offset)
+        offset += cls.PACKED.size
+        rolls = []
+        for _ in range(count):
+            rolls.append(cls.PlayerRolls.unpack_from(buf, offset))
+            offset += cls.PlayerRolls.PACKED.size
+        # Skip __init__ - it would allocate an ID, and build rolls we'd throw
+        # away
+        game = cls.__new__(cls)
+        game.id = id
+        game.players = [players[r.pid] for r in rolls]
+        game.version = version
+        game._rolls = rolls
+        game._turn = turn
+        game.started = started
+        game.complete = complete
+        game.current_frame = current_frame if started else None
+        game.current_player = game.players[turn] if started else None
+        game._seats = {}
+        for seat, r in enumerate(rolls):
+            game._seats.setdefault(r.pid, seat)
+        game._snapshot = None
+        game._publish()
+        return game, offset
+
+    def get_rolls(self, pid):
+        """ Get the PlayerRolls for a given player ID """
+        return self._rolls[self._seats[pid]]
 
     def get_frames(self, pid):
         """ A helper to get played frames for a given player ID """
-        return [ f for f in self.frames if f.pid == pid ][0].frames
+        seat = self._seats[pid]
+        return self._rolls[seat].frames(self.players[seat])
+
+    def changed_since(self, version):
+        """ What changed after `version`: (player, their PlayerRolls, the
+        frames that changed) for each player with a frame that did """
+        changes = []
+        for player, rolls in zip(self.players, self._rolls):
+            frames = rolls.changed_since(version)
+            if frames:
+                changes.append((player, rolls, frames))
+        return changes
 
     def start(self):
         """ Start a game.  This will do any necesary initialization, and should
         only be called once """
         if self.started:
             raise ModelException('Unable to start already started game')
+        if self._snapshot is None:
+            raise ModelException('Unable to change a snapshot of a game')
         self.current_frame = 1
-        self.current_player = next(self._players)
+        self.current_player = self.players[self._turn]
         self.started = True
+        self._publish()
 
-    def post_frame(self, player, shots):
-        """ Post a frame for a player.  Player is the player, and shots is
-        an iterable of 2 shots to post. """
+    def _check_turn(self, player):
+        if self._snapshot is None:
+            raise ModelException('Unable to change a snapshot of a game')
         if self.complete:
             raise ModelException('Game is complete - cannot accpet new frames')
         if not self.started:
             self.start()
         if self.current_player.id != player.id:
             raise ModelException('Posting frame for incorrect player')
-        # Create the frame
-        frame = Frame(player)
-        frame.shots = shots
-        if frame.is_open():
-            frame.score = sum(frame.shots)
-            frame.complete = True
-        #player_frames = self.frames[player.id]
-        # Get the appropriate PlayerFrameMapItem
-        player_frames = self.get_frames(player.id)
-        player_frames.append(frame)
-        # Deal with any non-open frames, which appear to NOT be called
-        # closed frames, which apparently would make too much sense
-        if any(filter(lambda f: not f.complete, player_frames)):
-            # Deal with a strike 2 frames back
-            if len(player_frames) >= 3 and not player_frames[-3].complete:
-                if player_frames[-1].strike():
-                    player_frames[-3].score = 30
-                    player_frames[-3].complete = True
-            # Deal with a strike/spare 1 frame back
-            if len(player_frames) >= 2 and not player_frames[-2].complete:
-                if player_frames[-2].strike():
-                    if player_frames[-1].strike():
-                        pass
-                    elif player_frames[-1].spare():
-                        player_frames[-2].score = 20
-                        player_frames[-2].complete = True
-                    else:
-                        player_frames[-2].score = 10 + player_frames[-1].score
-                        player_frames[-2].complete = True
-                if player_frames[-2].spare():
-                    if player_frames[-1].strike():
-                        player_frames[-2].score = 20
-                        player_frames[-2].complete = True
-                    else:
-                        player_frames[-2].score = 10 + player_frames[-1].shots[0]
-                        player_frames[-2].complete = True
-
-        # Update total running score for player
-        total = sum(f.score for f in player_frames)
-        self.totals[player.id] = total
 
+    def _end_turn(self):
+        """ Pass the turn to the next player """
+        self._turn += 1
         # All players have completed a frame in the round
-        if len(set(map(len, [ f.frames for f in self.frames ]))) == 1:
-            if self.current_frame == 10:
+        if self._turn == len(self.players):
+            self._turn = 0
+            if self.current_frame == Game.FRAMES:
                 self.complete = True
             self.current_frame += 1
+        self.current_player = self.players[self._turn]
 
-        self.current_player = next(self._players)
-
+    def post_frame(self, player, shots):
+        """ Post a frame for a player.  Player is the player, and shots are
+        the frame's shots: 2 (a strike is followed by `nil`), or 3 for a tenth
+        frame with a fill ball.  Nothing is posted unless they're a whole
+        frame. """
+        self._check_turn(player)
+        seat = self._seats[player.id]
+        rolls = self._rolls[seat]
+        t = rolls.frame_transition(rolls.state, shots)
+        # Roll into a copy - the snapshot has the game's
+        self._rolls[seat] = rolls = rolls.copy()
+        rolls.roll_frame(t, self.version + 1)
+        self._end_turn()
+        self.version += 1
+        self._publish()
         return self
 
+    def post_shot(self, player, shot):
+        """ Post a single shot for a player - a pin count, 'X', '/' or a
+        Shot.  The player's turn lasts until their frame is over.  Returns the
+        Shot recorded. """
+        self._check_turn(player)
+        seat = self._seats[player.id]
+        rolls = self._rolls[seat]
+        t = rolls.transition(rolls.state, shot)
+        self._rolls[seat] = rolls = rolls.copy()
+        if rolls.roll(t, self.version + 1):
+            self._end_turn()
+        self.version += 1
+        self._publish()
+        return t[1]
+
+    def check_frames(self, frames):
+        """ Check that a sequence of (player, shots) frames could be posted in
+        order, without changing the game.  Raises a ModelException naming the
+        first frame that couldn't be. """
+        turn = self._turn
+        current_frame = self.current_frame or 1
+        complete = self.complete
+        # Seat -> state, for players with frames checked
+        states = {}
+        for i, (player, shots) in enumerate(frames):
+            error = None
+            if complete:
+                error = 'Game is complete - cannot accpet new frames'
+            elif self.players[turn].id != player.id:
+                error = 'Posting frame for incorrect player'
+            else:
+                seat = self._seats[player.id]
+                state = states.get(seat, self._rolls[seat].state)
+                try:
+                    states[seat] = self.PlayerRolls.frame_transition(
+                        state, shots)[0]
+                except ModelException as e:
+                    error = str(e)
+            if error:
+                raise ModelException('Frame %d: %s' % (i, error))
+            turn += 1
+            if turn == len(self.players):
+                turn = 0
+                if current_frame == Game.FRAMES:
+                    complete = True
+                current_frame += 1
+
+
+def _build_transitions():
+    """ Fill in `Game.PlayerRolls.TRANSITIONS`, by walking every state a
+    player can reach from the start of a game.
+
+    A state is (frame, ball, pins standing, whether they're a fresh rack,
+    bonus balls owed to the frame before last, bonus balls owed to the last
+    frame) - frames numbered from 0, and frame 10 once the game is over.
+    Frames 1-9 are a strike, or two balls.  A strike is owed the next two
+    balls, and a spare the next one - in the tenth frame they're rolled as
+    fill balls, and it's over after two balls, or three with a strike or
+    spare. """
+    rolls = Game.PlayerRolls
+    shot = Frame.Shot.values
+    last = Game.FRAMES - 1
+    start, done = (0, 0, 10, True, 0, 0), (Game.FRAMES, 0, 10, True, 0, 0)
+    states = [start, done]
+    numbers = {start: 0, done: 1}
+    transitions = {}
+    for key in states:
+        frame, ball, standing, fresh, before_last, last_owed = key
+        if key == done:
+            continue
+        for symbol in range(rolls.SYMBOLS):
+            if symbol == 11:
+                pins = 10
+                if not fresh:
+                    continue
+            elif symbol == 12:
+                pins = standing
+                if fresh:
+                    continue
+            else:
+                pins = symbol
+                if pins > standing:
+                    continue
+            if pins < standing:
+                recorded = shot[pins]
+            else:
+                recorded = Frame.Shot.strike if fresh else Frame.Shot.spare
+            # The roll scores for this frame, and for any frames owed a bonus
+            adds, finishes = [frame], []
+            if before_last:
+                adds.append(frame - 2)
+                finishes.append(frame - 2)
+            owed = last_owed
+            if last_owed:
+                adds.append(frame - 1)
+                owed -= 1
+                if not owed:
+                    finishes.append(frame - 1)
+            left = standing - pins
+            nil = -1
+            over = False
+            if frame < last:
+                slot = 2 * frame + ball
+                if ball == 0 and left == 0:
+                    nil = slot + 1
+                    after = (frame + 1, 0, 10, True, owed, 2)
+                    over = True
+                elif ball == 0:
+                    after = (frame, 1, left, False, 0, owed)
+                else:
+                    if left:
+                        finishes.append(frame)
+                    after = (frame + 1, 0, 10, True, owed, 0 if left else 1)
+                    over = True
+            else:
+                slot = 2 * frame + ball
+                # A strike or spare earns a third ball
+                if ball == 2 or (ball == 1 and not fresh and left):
+                    finishes.append(frame)
+                    after = done
+                    over = True
+                else:
+                    after = (frame, ball + 1, left or 10, not left, 0, owed)
+            if after not in numbers:
+                numbers[after] = len(states)
+                states.append(after)
+            transitions[numbers[key], symbol] = (
+                numbers[after], recorded, slot, nil, pins, tuple(adds),
+                tuple(finishes), over)
+    rolls.TRANSITIONS = [transitions.get((state, symbol))
+                         for state in range(len(states))
+                         for symbol in range(rolls.SYMBOLS)]
+    rolls.FRAMES = [min(state[0] + (state[1] > 0), Game.FRAMES)
+                    for state in states]
+    rolls.BALLS = [state[1] for state in states]
+    rolls.START, rolls.DONE = numbers[start], numbers[done]
+    # Every whole frame that can be posted from the start of a frame
+    for state in range(len(states)):
+        if rolls.BALLS[state] or state == rolls.DONE:
+            continue
+        pending = [((), ())]
+        while pending:
+            shots, made = pending.pop()
+            at = made[-1][0] if made else state
+            for pins in range(11):
+                t = rolls.TRANSITIONS[at * rolls.SYMBOLS + pins]
+                if t is None:
+                    continue
+                after = shots + (t[1],) + ((Frame.Shot.nil,) if t[3] >= 0 else ())
+                if t[-1]:
+                    rolls.FRAME_TRANSITIONS[state, after] = rolls._merge(made + (t,))
+                else:
+                    pending.append((after, made + (t,)))
+
+
+_build_transitions()
+
+
+class PlayerStats(object): # Not a RestableMixin
+    """ A player's aggregates over the games they've completed """
+
+    __slots__ = ('pid', 'games', 'pins', 'high', 'strikes', 'spares')
+
+    serialize = {
+        'pid': fields.Integer,
+        'games': fields.Integer,
+        'pins': fields.Integer,
+        'average': fields.Float,
+        'high': fields.Integer,
+        'strikes': fields.Integer,
+        'spares': fields.Integer,
+    }
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.games = 0
+        self.pins = 0
+        self.high = 0
+        self.strikes = 0
+        self.spares = 0
+
+    @property
+    def average(self):
+        return float(self.pins) / self.games if self.games else 0.0
+
+    def add_game(self, rolls):
+        """ Add a completed game, given the player's PlayerRolls """
+        self.games += 1
+        self.pins += rolls.total
+        self.high = max(self.high, rolls.total)
+        self.strikes += rolls.rolls.count(Frame.Shot.strike)
+        self.spares += rolls.rolls.count(Frame.Shot.spare)
@@ -1,23 +1,1082 @@
-import random
+import errno
+import itertools
+import mmap
+import os
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+import ids
+from cache import LRUCache
+from indexes import game_index
+from leaderboard import leaderboard
 from models import Player, Game, Frame
 
 
+class Storage(object):
+    """ Interface for where the DB keeps model objects.  Subclasses hand out
+    the ID -> object maps through `table`, and are told about every change so
+    they can persist it. """
+
+    # Whether looking an object up in a table can wait, on a lock or the disk
+    blocking_reads = False
+
+    @classmethod
+    def from_config(cls, config):
+        """ Create the storage from an app config """
+        return cls()
+
+    def table(self, klass):
+        """ Get the map of IDs to objects for a model class """
+        raise NotImplementedError
+
+    def add(self, obj):
+        """ Store a newly created Player or Game """
+        raise NotImplementedError
+
+    def frame_posted(self, game, player, shots):
+        """ Called after `shots` were posted as `player`'s latest frame - or
+        as a single shot, `(shot,)` """
+        raise NotImplementedError
+
+    def add_batch(self, players, games):
+        """ Store many new objects at once, e.g. loaded from an export:
+        Players, then Games that already have frames posted - a list of
+        (game, posts), where `posts` are the (player, shots) posted to the
+        game in order, as `frame_posted` would have been told them """
+        raise NotImplementedError
+
+    def lock(self, gid):
+        """ Get the lock for a game.  Hold it while changing a game, or reading
+        more than one thing from it. """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class MemoryStorage(Storage):
+    """ Keep everything in plain dicts.  Fast, but gone with the process.
+
+    Each game gets its own lock, so changes to different games don't wait on
+    each other.  Adding objects takes a lock of its own.
+    """
+
+    def __init__(self):
+        self.players = {}
+        self.games = {}
+        self.frames = {}
+        self._locks = {}
+        self._add_lock = threading.Lock()
+
+    def table(self, klass):
+        return {
+            Player: self.players,
+            Game: self.games,
+            Frame: self.frames
+        }[klass]
+
+    def add(self, obj):
+        table = self.table(type(obj))
+        with self._add_lock:
+            # Don't overwrite anything with a clashing ID
+            while obj.id in table:
+                obj.id = obj.next_id()
+            table[obj.id] = obj
+
+    def frame_posted(self, game, player, shots):
+        # Games are updated in place - nothing to do
+        pass
+
+    def add_batch(self, players, games):
+        for player in players:
+            self.add(player)
+        for game, posts in games:
+            self.add(game)
+
+    def lock(self, gid):
+        lock = self._locks.get(gid)
+        if lock is None:
+            lock = self._locks.setdefault(gid, threading.RLock())
+        return lock
+
+
+class SQLiteStorage(MemoryStorage):
+    """ Write every change through to a SQLite database, and load it back on
+    startup.  Reads are served from memory.
+
+    The database runs in WAL mode.  Connections are taken from a pool for
+    each write and put back after, with up to POOL_SIZE kept open, so
+    short-lived threads don't each leave one behind.  Statements are
+    constant strings, so sqlite3 prepares each one once per connection and
+    reuses it from its statement cache.  Each frame post is one transaction,
+    as is each `add_batch`.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS players (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS games (
+            id INTEGER PRIMARY KEY
+        );
+        CREATE TABLE IF NOT EXISTS game_players (
+            gid INTEGER NOT NULL REFERENCES games (id),
+            seat INTEGER NOT NULL,
+            pid INTEGER NOT NULL REFERENCES players (id),
+            PRIMARY KEY (gid, seat)
+        );
+        CREATE TABLE IF NOT EXISTS rolls (
+            gid INTEGER NOT NULL,
+            pid INTEGER NOT NULL,
+            frame INTEGER NOT NULL,
+            roll INTEGER NOT NULL,
+            shot INTEGER NOT NULL,
+            PRIMARY KEY (gid, pid, frame, roll)
+        ) WITHOUT ROWID;
+    """
+    INSERT_PLAYER = 'INSERT INTO players (id, name) VALUES (?, ?)'
+    INSERT_GAME = 'INSERT INTO games (id) VALUES (?)'
+    INSERT_GAME_PLAYER = 'INSERT INTO game_players (gid, seat, pid) VALUES (?, ?, ?)'
+    INSERT_ROLL = ('INSERT INTO rolls (gid, pid, frame, roll, shot) '
+                   'VALUES (?, ?, ?, ?, ?)')
+    SELECT_PLAYERS = 'SELECT id, name FROM players'
+    SELECT_GAME_PLAYERS = 'SELECT gid, pid FROM game_players ORDER BY gid, seat'
+    # Rolls in the order they were posted: round by round, in turn order
+    SELECT_ROLLS = """
+        SELECT r.gid, r.pid, r.frame, r.shot FROM rolls r
+        JOIN game_players gp ON gp.gid = r.gid AND gp.pid = r.pid
+        ORDER BY r.gid, r.frame, gp.seat, r.roll
+    """
+
+    # Most idle connections to keep open
+    POOL_SIZE = 8
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config['DB_PATH'], config.get('DB_SYNCHRONOUS', 'FULL'))
+
+    def __init__(self, path, synchronous='FULL'):
+        """ Open (or create) the database at `path`.  `synchronous` is the
+        SQLite synchronous pragma - 'FULL' survives power loss, 'NORMAL' may
+        lose the last few transactions but is faster. """
+        super(SQLiteStorage, self).__init__()
+        self.path = path
+        self.synchronous = synchronous
+        self._pool = []
+        self._pool_lock = threading.Lock()
+        with self._connection() as conn:
+            conn.executescript(self.SCHEMA)
+            self._load(conn)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=%s' % self.synchronous)
+        conn.execute('PRAGMA foreign_keys=ON')
+        return conn
+
+    @contextmanager
+    def _connection(self):
+        """ A connection of our own, from the pool if there's one idle, and
+        put back in it afterwards - or closed, if the pool's full """
+        with self._pool_lock:
+            conn = self._pool.pop() if self._pool else None
+        if conn is None:
+            conn = self._connect()
+        try:
+            yield conn
+        finally:
+            with self._pool_lock:
+                if len(self._pool) < self.POOL_SIZE:
+                    self._pool.append(conn)
+                    conn = None
+            if conn is not None:
+                conn.close()
+
+    def _load(self, conn):
+        """ Rebuild players and games from the database """
+        for id, name in conn.execute(self.SELECT_PLAYERS):
+            p = Player(name)
+            p.id = id
+            self.players[id] = p
+        seats = {}
+        for gid, pid in conn.execute(self.SELECT_GAME_PLAYERS):
+            seats.setdefault(gid, []).append(self.players[pid])
+        for gid, players in seats.items():
+            g = Game(players)
+            g.id = gid
+            self.games[gid] = g
+        # Replay rolls one at a time - older databases have a row for the
+        # nil after a strike
+        for gid, pid, frame, shot in conn.execute(self.SELECT_ROLLS):
+            if shot != Frame.Shot.nil:
+                self.games[gid].post_shot(self.players[pid], Frame.Shot.values[shot])
+
+    def add(self, obj):
+        super(SQLiteStorage, self).add(obj)
+        try:
+            with self._connection() as conn, conn:
+                if isinstance(obj, Player):
+                    conn.execute(self.INSERT_PLAYER, (obj.id, obj.name))
+                else:
+                    conn.execute(self.INSERT_GAME, (obj.id,))
+                    conn.executemany(self.INSERT_GAME_PLAYER,
+                                     [(obj.id, seat, p.id)
+                                      for seat, p in enumerate(obj.players)])
+        except sqlite3.Error:
+            del self.table(type(obj))[obj.id]
+            raise
+
+    def frame_posted(self, game, player, shots):
+        # The shots went into the last slots rolled into
+        rows = self._rolls(game, player)
+        rows = rows[len(rows) - sum(1 for s in shots if s != Frame.Shot.nil):]
+        with self._connection() as conn, conn:
+            conn.executemany(self.INSERT_ROLL, rows)
+
+    @staticmethod
+    def _rolls(game, player):
+        """ Rows for the rolls `player` has made in a game """
+        rolls = game.get_rolls(player.id).rolls
+        rows = []
+        for slot, shot in enumerate(rolls):
+            if shot >= Frame.Shot.spare:
+                frame = min(slot // 2, Game.FRAMES - 1)
+                rows.append((game.id, player.id, frame, slot - 2 * frame, shot))
+        return rows
+
+    def add_batch(self, players, games):
+        # All in one transaction
+        for player in players:
+            super(SQLiteStorage, self).add(player)
+        for game, posts in games:
+            super(SQLiteStorage, self).add(game)
+        try:
+            with self._connection() as conn, conn:
+                conn.executemany(self.INSERT_PLAYER,
+                                 [(p.id, p.name) for p in players])
+                conn.executemany(self.INSERT_GAME, [(g.id,) for g, _ in games])
+                conn.executemany(self.INSERT_GAME_PLAYER,
+                                 [(g.id, seat, p.id) for g, _ in games
+                                  for seat, p in enumerate(g.players)])
+                conn.executemany(self.INSERT_ROLL,
+                                 [row for g, _ in games for p in g.players
+                                  for row in self._rolls(g, p)])
+        except sqlite3.Error:
+            for player in players:
+                del self.players[player.id]
+            for game, posts in games:
+                del self.games[game.id]
+            raise
+
+    def close(self):
+        with self._pool_lock:
+            for conn in self._pool:
+                conn.close()
+            self._pool = []
+
+
+class JournalStorage(MemoryStorage):
+    """ Keep everything in memory, and append every change to a journal file
+    of fixed-size binary records.  On startup the journal is replayed to
+    rebuild the DB.
+
+    To keep startup time bounded, a snapshot of the whole DB is written every
+    `snapshot_every` records, along with the journal offset it covers.
+    Startup reads the snapshot through mmap, and only replays the journal
+    written after it.
+
+    The journal is fsync'd every `fsync_every` records - 1 makes every change
+    durable before it is acknowledged, larger values trade the last few
+    changes on power loss for throughput, and 0 leaves it to the OS.
+    """
+
+    # Every record is 32 bytes: kind, shot count, number of continuation
+    # records that follow, two IDs, and 12 bytes of inline data.
+    # Continuation records are raw 32 byte chunks (player names, game seats).
+    RECORD = struct.Struct('<BBHqq12s')
+    PLAYER, GAME, FRAME = 1, 2, 3
+    SEATS = struct.Struct('<4q')
+    # A frame's inline data: its shots, and the game version it made.  A
+    # snapshot taken while the frame was being posted may already include it.
+    FRAME_DATA = struct.Struct('<8sI')
+
+    SNAPSHOT_MAGIC = b'BOWLSNP4'
+    # magic, journal offset covered, player count, game count
+    SNAPSHOT_HEADER = struct.Struct('<8sqqq')
+    SNAPSHOT_PLAYER = struct.Struct('<qH')
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config['JOURNAL_PATH'],
+                   fsync_every=config.get('JOURNAL_FSYNC_EVERY', 1),
+                   snapshot_every=config.get('JOURNAL_SNAPSHOT_EVERY', 100000))
+
+    def __init__(self, path, fsync_every=1, snapshot_every=100000):
+        super(JournalStorage, self).__init__()
+        self.path = path
+        self.snapshot_path = path + '.snapshot'
+        self.fsync_every = fsync_every
+        self.snapshot_every = snapshot_every
+        self._lock = threading.Lock()
+        self._unsynced = 0
+        self._since_snapshot = 0
+        offset = self._load_snapshot()
+        offset = self._replay(offset)
+        self._journal = open(path, 'r+b' if os.path.exists(path) else 'w+b')
+        # Drop a torn record at the end, if we crashed mid-write
+        self._journal.truncate(offset)
+        self._journal.seek(offset)
+
+    # Writing
+
+    def _record(self, kind, a, b, data=b'', extra=b'', count=0):
+        """ Pack a record, and its continuation records """
+        nextra = (len(extra) + self.RECORD.size - 1) // self.RECORD.size
+        record = self.RECORD.pack(kind, count, nextra, a, b, data)
+        if extra:
+            record += extra.ljust(nextra * self.RECORD.size, b'\0')
+        return record
+
+    def _append(self, kind, a, b, data=b'', extra=b'', count=0):
+        """ Append a record, and its continuation records """
+        self._write([self._record(kind, a, b, data, extra, count)])
+
+    def _write(self, records):
+        """ Append packed records - synced, if need be, once they're all
+        written """
+        with self._lock:
+            self._journal.write(b''.join(records))
+            self._unsynced += len(records)
+            if self.fsync_every and self._unsynced >= self.fsync_every:
+                self._sync()
+            self._since_snapshot += len(records)
+            if self.snapshot_every and self._since_snapshot >= self.snapshot_every:
+                self._snapshot()
+
+    def _sync(self):
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+        self._unsynced = 0
+
+    def add(self, obj):
+        # Add first, so a snapshot taken by the append includes the object
+        super(JournalStorage, self).add(obj)
+        self._write([self._added(obj)])
+
+    def _added(self, obj):
+        """ The record for a new Player or Game """
+        if isinstance(obj, Player):
+            name = obj.name.encode('utf-8')
+            return self._record(self.PLAYER, obj.id, len(name), name[:12],
+                                name[12:])
+        pids = [p.id for p in obj.players]
+        pids += [0] * (-len(pids) % 4)
+        extra = b''.join(self.SEATS.pack(*pids[i:i + 4])
+                         for i in range(0, len(pids), 4))
+        return self._record(self.GAME, obj.id, len(obj.players), extra=extra)
+
+    def _posted(self, game, player, shots, version):
+        """ The record for a frame or shot that made game version `version` """
+        data = self.FRAME_DATA.pack(struct.pack('<%db' % len(shots), *shots),
+                                    version)
+        return self._record(self.FRAME, game.id, player.id, data,
+                            count=len(shots))
+
+    def frame_posted(self, game, player, shots):
+        self._write([self._posted(game, player, shots, game.version)])
+
+    def add_batch(self, players, games):
+        # Each post made the next version.  All the records are written, and
+        # synced, at once.
+        records = []
+        for player in players:
+            super(JournalStorage, self).add(player)
+            records.append(self._added(player))
+        for game, posts in games:
+            super(JournalStorage, self).add(game)
+            records.append(self._added(game))
+            for version, (player, shots) in enumerate(posts, 1):
+                records.append(self._posted(game, player, shots, version))
+        self._write(records)
+
+    def snapshot(self):
+        """ Write a snapshot now """
+        with self._lock:
+            self._snapshot()
+
+    def _snapshot(self):
+        self._sync()
+        offset = self._journal.tell()
+        # Others can be adding players and games as we go
+        with self._add_lock:
+            players = list(self.players.values())
+            games = list(self.games.values())
+        tmp = self.snapshot_path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(self.SNAPSHOT_HEADER.pack(self.SNAPSHOT_MAGIC, offset,
+                                              len(players), len(games)))
+            for p in players:
+                name = p.name.encode('utf-8')
+                f.write(self.SNAPSHOT_PLAYER.pack(p.id, len(name)) + name)
+            for g in games:
+                # The published copy - the game can be mid-post
+                f.write(g.snapshot().pack())
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(tmp, self.snapshot_path)
+        self._since_snapshot = 0
+
+    # Recovery
+
+    def _load_snapshot(self):
+        """ Load the snapshot, if any.  Returns the journal offset to replay
+        from. """
+        if not os.path.exists(self.snapshot_path):
+            return 0
+        with open(self.snapshot_path, 'rb') as f:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, offset, nplayers, ngames = \
+                self.SNAPSHOT_HEADER.unpack_from(buf, 0)
+            if magic != self.SNAPSHOT_MAGIC:
+                raise IOError('%s is not a snapshot' % self.snapshot_path)
+            pos = self.SNAPSHOT_HEADER.size
+            for _ in range(nplayers):
+                id, size = self.SNAPSHOT_PLAYER.unpack_from(buf, pos)
+                pos += self.SNAPSHOT_PLAYER.size
+                p = Player(buf[pos:pos + size].decode('utf-8'))
+                p.id = id
+                self.players[id] = p
+                pos += size
+            for _ in range(ngames):
+                g, pos = Game.unpack_from(buf, pos, self.players)
+                self.games[g.id] = g
+        finally:
+            buf.close()
+        return offset
+
+    def _replay(self, offset):
+        """ Apply journal records from `offset` on.  Returns the offset just
+        past the last whole record. """
+        if not os.path.exists(self.path):
+            return 0
+        size = self.RECORD.size
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            while True:
+                record = f.read(size)
+                if len(record) < size:
+                    break
+                kind, count, nextra, a, b, data = self.RECORD.unpack(record)
+                extra = f.read(nextra * size)
+                if len(extra) < nextra * size:
+                    break
+                if kind == self.PLAYER:
+                    p = Player((data + extra)[:b].decode('utf-8'))
+                    p.id = a
+                    self.players[a] = p
+                elif kind == self.GAME:
+                    pids = struct.unpack_from('<%dq' % b, extra)
+                    g = Game([self.players[pid] for pid in pids])
+                    g.id = a
+                    self.games[a] = g
+                elif kind == self.FRAME:
+                    game = self.games[a]
+                    version = self.FRAME_DATA.unpack(data)[1]
+                    # Older journals don't have versions
+                    if not version or version > game.version:
+                        shots = [Frame.Shot(s) for s in
+                                 struct.unpack_from('<%db' % count, data)]
+                        # A single shot, or a whole frame
+                        if count == 1:
+                            game.post_shot(self.players[b], shots[0])
+                        else:
+                            game.post_frame(self.players[b], shots)
+                else:
+                    raise IOError('Corrupt journal record at %d' % offset)
+                offset += size + len(extra)
+                self._since_snapshot += 1
+        return offset
+
+    def close(self):
+        with self._lock:
+            if not self._journal.closed:
+                self._sync()
+                self._journal.close()
+
+
+class SharedLock(object):
+    """ A re-entrant lock on one byte of a file: an RLock between threads, and
+    an fcntl record lock between processes """
+
+    def __init__(self, fd, offset):
+        self.fd = fd
+        self.offset = offset
+        self._lock = threading.RLock()
+        self._depth = 0
+
+    def __enter__(self):
+        self._lock.acquire()
+        if not self._depth:
+            try:
+                self._lock_file()
+            except BaseException:
+                self._lock.release()
+                raise
+        self._depth += 1
+        return self
+
+    def _lock_file(self):
+        while True:
+            try:
+                fcntl.lockf(self.fd, fcntl.LOCK_EX, 1, self.offset)
+                return
+            except (IOError, OSError) as e:
+                # The kernel tracks deadlocks by process, not thread - two
+                # processes each with threads waiting on the other's locks
+                # look like one, but the locks are only ever held one at a
+                # time, so just try again
+                if e.errno != errno.EDEADLK:
+                    raise
+                time.sleep(0.001)
+
+    def __exit__(self, *exc_info):
+        self._depth -= 1
+        if not self._depth:
+            fcntl.lockf(self.fd, fcntl.LOCK_UN, 1, self.offset)
+        self._lock.release()
+
+
+class SharedTable(Mapping):
+    """ A read-only map of IDs to the objects in one of SharedMemoryStorage's
+    tables.  Objects are rebuilt from their records on every lookup. """
+
+    def __init__(self, storage, kind):
+        self.storage = storage
+        self.kind = kind
+
+    def __getitem__(self, id):
+        obj = self.storage.load(self.kind, id)
+        if obj is None:
+            raise KeyError(id)
+        return obj
+
+    def __contains__(self, id):
+        return self.storage.find(self.kind, id)[1] == id
+
+    def __iter__(self):
+        return self.storage.ids(self.kind)
+
+    def __len__(self):
+        return self.storage.count(self.kind)
+
+
+class SharedMemoryStorage(Storage):
+    """ Keep players and games in fixed-size records in a memory-mapped file,
+    so several worker processes can serve the same data.  Put the file on a
+    tmpfs (like /dev/shm) to keep it in memory - it outlives the workers, but
+    not a reboot.
+
+    Each table is a fixed number of slots, found by open addressing on the
+    ID.  A game's slot holds `Game.pack()`, with room for up to `max_players`
+    players.  Changing or reading a game takes an fcntl lock on the first byte
+    of its slot, so workers only wait on each other for the same game.
+
+    Objects are rebuilt from their records on every lookup, so a game must be
+    looked up while holding its lock to change it.  IDs must be unique across
+    workers - use the 'block' or 'snowflake' ID allocators.
+    """
+
+    # Lookups take the fcntl lock
+    blocking_reads = True
+    MAGIC = b'BOWLSHM3'
+    # magic, player slots, game slots, most players per game, player count,
+    # game count
+    HEADER = struct.Struct('<8sqqqqq')
+    # ID (0 for an empty slot), name length, UTF-8 name
+    PLAYER = struct.Struct('<qH118s')
+    ID = struct.Struct('<q')
+    # Where the header keeps the number of objects in each table
+    COUNT = struct.Struct('<q')
+    COUNT_OFFSET = {Player: 32, Game: 40}
+    # Bytes of the file locked while creating it, and while adding to each
+    # table
+    CREATE_LOCK, ADD_LOCK = 0, {Player: 1, Game: 2}
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config['SHARED_PATH'],
+                   players=config.get('SHARED_PLAYERS', 100000),
+                   games=config.get('SHARED_GAMES', 100000),
+                   max_players=config.get('SHARED_MAX_PLAYERS', 8))
+
+    def __init__(self, path, players=100000, games=100000, max_players=8):
+        if fcntl is None:
+            raise RuntimeError('Shared memory storage needs fcntl')
+        self.path = path
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        with SharedLock(self._fd, self.CREATE_LOCK):
+            if os.fstat(self._fd).st_size == 0:
+                # First one here - lay out the file
+                size = self.layout(players, games, max_players)
+                os.ftruncate(self._fd, size)
+                os.pwrite(self._fd, self.HEADER.pack(
+                    self.MAGIC, players, games, max_players, 0, 0), 0)
+            header = os.pread(self._fd, self.HEADER.size, 0)
+        magic, players, games, max_players, _, _ = self.HEADER.unpack(header)
+        if magic != self.MAGIC:
+            raise IOError('%s is not a shared DB' % path)
+        size = self.layout(players, games, max_players)
+        self._buf = mmap.mmap(self._fd, size)
+        self._add_locks = dict((kind, SharedLock(self._fd, offset))
+                               for kind, offset in self.ADD_LOCK.items())
+        self._locks = {}
+        self._players = {}
+        self.players = SharedTable(self, Player)
+        self.games = SharedTable(self, Game)
+
+    def layout(self, players, games, max_players):
+        """ Work out where the tables go.  Returns the file size. """
+        self.max_players = max_players
+        game_size = Game.PACKED.size + max_players * Game.PlayerRolls.PACKED.size
+        game_size += -game_size % 8
+        # (offset, slot size, slots) per table
+        self._tables = {
+            Player: (self.HEADER.size, self.PLAYER.size, players),
+            Game: (self.HEADER.size + players * self.PLAYER.size,
+                   game_size, games),
+        }
+        return self.HEADER.size + players * self.PLAYER.size + games * game_size
+
+    def table(self, klass):
+        if klass is Player:
+            return self.players
+        if klass is Game:
+            return self.games
+        return {}
+
+    # Records
+
+    def find(self, kind, id):
+        """ Find the slot for `id` in a table.  Returns the slot's offset, and
+        the ID in it: `id`, or 0 if it's free for `id`.  Returns (None, None)
+        if the table is full. """
+        start, size, slots = self._tables[kind]
+        slot = id % slots
+        for _ in range(slots):
+            offset = start + slot * size
+            found = self.ID.unpack_from(self._buf, offset)[0]
+            if found == id or found == 0:
+                return offset, found
+            slot = (slot + 1) % slots
+        return None, None
+
+    def ids(self, kind):
+        """ Generate the IDs in a table """
+        start, size, slots = self._tables[kind]
+        for offset in range(start, start + slots * size, size):
+            id = self.ID.unpack_from(self._buf, offset)[0]
+            if id:
+                yield id
+
+    def count(self, kind):
+        """ The number of objects in a table """
+        return self.COUNT.unpack_from(self._buf, self.COUNT_OFFSET[kind])[0]
+
+    def load(self, kind, id):
+        """ Rebuild an object from its record.  None if there isn't one. """
+        if kind is Player:
+            player = self._players.get(id)
+            if player is None:
+                offset, found = self.find(Player, id)
+                if found != id:
+                    return None
+                _, length, name = self.PLAYER.unpack_from(self._buf, offset)
+                # Players never change, so keep the same object for each
+                player = Player.__new__(Player)
+                player.id = id
+                player.name = name[:length].decode('utf-8')
+                player = self._players.setdefault(id, player)
+            return player
+        offset, found = self.find(Game, id)
+        if found != id:
+            return None
+        # Records never move, but can be changing
+        with self.lock(id):
+            return Game.unpack_from(self._buf, offset, self.players)[0]
+
+    def add(self, obj):
+        kind = type(obj)
+        if kind is Player:
+            record = bytearray(self.PLAYER.size)
+            name = obj.name.encode('utf-8')
+            if len(name) > self.PLAYER.size - 10:
+                raise ValueError('Player name is too long')
+            self.PLAYER.pack_into(record, 0, 0, len(name), name)
+        elif len(obj.players) > self.max_players:
+            raise ValueError('Games can have at most %d players' %
+                             self.max_players)
+        with self._add_locks[kind]:
+            offset, found = self.find(kind, obj.id)
+            while found:
+                # Don't overwrite anything with a clashing ID
+                obj.id = obj.next_id()
+                offset, found = self.find(kind, obj.id)
+            if offset is None:
+                raise IOError('The shared %s table is full' % kind.__name__)
+            if kind is Game:
+                record = bytearray(self._tables[Game][1])
+                obj.pack_into(record, 0)
+            # The ID goes in last, so no-one sees a half written record
+            self._buf[offset + 8:offset + len(record)] = record[8:]
+            self.ID.pack_into(self._buf, offset, obj.id)
+            self.COUNT.pack_into(self._buf, self.COUNT_OFFSET[kind],
+                                 self.count(kind) + 1)
+
+    def frame_posted(self, game, player, shots):
+        with self.lock(game.id):
+            game.pack_into(self._buf, self.find(Game, game.id)[0])
+
+    def add_batch(self, players, games):
+        # Games are packed whole - their posts are already in them
+        for player in players:
+            self.add(player)
+        for game, posts in games:
+            self.add(game)
+
+    def lock(self, gid):
+        lock = self._locks.get(gid)
+        if lock is None:
+            offset, found = self.find(Game, gid)
+            if found != gid:
+                raise KeyError(gid)
+            lock = self._locks.setdefault(gid, SharedLock(self._fd, offset))
+        return lock
+
+    def close(self):
+        if not self._buf.closed:
+            self._buf.close()
+            os.close(self._fd)
+
+
+class TieredGames(Mapping):
+    """ The games table of a `TieredStorage` - games in memory, then recently
+    read archived games, then the archive """
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    def __getitem__(self, gid):
+        storage = self.storage
+        game = storage.games.get(gid)
+        if game is not None:
+            idle = storage._idle
+            if gid in idle:
+                # Reading a completed game keeps it in memory for longer
+                idle[gid] = time.time()
+                try:
+                    idle.move_to_end(gid)
+                except KeyError:
+                    pass
+            return game
+        game = storage.cache.get(gid)
+        if game is None:
+            game = storage.load(gid)
+            if game is None:
+                raise KeyError(gid)
+            storage.cache.put(gid, game)
+        return game
+
+    def __contains__(self, gid):
+        storage = self.storage
+        return (gid in storage.games or gid in storage.cache or
+                storage.archived(gid))
+
+    def __iter__(self):
+        hot = list(self.storage.games)
+        for gid in hot:
+            yield gid
+        hot = set(hot)
+        for gid in self.storage.archived_ids():
+            if gid not in hot:
+                yield gid
+
+    def __len__(self):
+        return len(self.storage.games) + self.storage.narchived
+
+
+class TieredStorage(MemoryStorage):
+    """ Keep games in memory while they're being played, and move completed
+    games to a compressed archive on disk once they've gone `idle` seconds
+    without being read - or sooner, oldest first, when more than `max_hot`
+    games are in memory.  Archived games are read back on demand, and the
+    last `cache_size` read are kept in memory.
+
+    The archive is a SQLite table of `Game.pack()` records, each deflated
+    with a preset dictionary trained on the first games archived, which
+    roughly halves them.  Like the memory backend, everything is gone with
+    the process - the archive is started afresh each time, and only there to
+    bound memory.  Players stay in memory.
+
+    Games are archived a batch at a time, as frames are posted and games
+    added, at most once a second unless memory is over the cap.
+    """
+
+    # Archived games are read back from disk
+    blocking_reads = True
+    SCHEMA = """
+        CREATE TABLE meta (key TEXT PRIMARY KEY, value BLOB NOT NULL);
+        CREATE TABLE games (id INTEGER PRIMARY KEY, data BLOB NOT NULL);
+    """
+    # Most games archived in one transaction
+    BATCH = 512
+    # Bytes of preset dictionary to train from the first batch archived
+    ZDICT_SIZE = 4096
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config['TIERED_PATH'],
+                   idle=config.get('TIERED_IDLE', 300),
+                   max_hot=config.get('TIERED_MAX_HOT', 100000),
+                   cache_size=config.get('TIERED_CACHE_SIZE', 1024))
+
+    def __init__(self, path, idle=300, max_hot=100000, cache_size=1024):
+        super(TieredStorage, self).__init__()
+        self.path = path
+        self.idle = idle
+        self.max_hot = max_hot
+        self.cache = LRUCache(cache_size)
+        self.narchived = 0
+        # IDs of completed games in memory -> when they were last used,
+        # least recently used first
+        self._idle = OrderedDict()
+        self._next_check = 0
+        self._archive_lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        # Archived games don't change - they can share a lock
+        self._archived_lock = threading.RLock()
+        self._zdict = None
+        for suffix in ('', '-journal'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=OFF')
+        self._db.execute('PRAGMA synchronous=OFF')
+        self._db.executescript(self.SCHEMA)
+
+    def table(self, klass):
+        if klass is Game:
+            return TieredGames(self)
+        return super(TieredStorage, self).table(klass)
+
+    def add(self, obj):
+        if isinstance(obj, Game):
+            games = self.table(Game)
+            with self._add_lock:
+                # Don't clash with archived games either
+                while obj.id in games:
+                    obj.id = obj.next_id()
+                self.games[obj.id] = obj
+        else:
+            super(TieredStorage, self).add(obj)
+        self.archive_idle()
+
+    def frame_posted(self, game, player, shots):
+        if game.complete:
+            self._idle[game.id] = time.time()
+        self.archive_idle()
+
+    def add_batch(self, players, games):
+        super(TieredStorage, self).add_batch(players, games)
+        now = time.time()
+        for game, posts in games:
+            if game.complete:
+                self._idle[game.id] = now
+        self.archive_idle()
+
+    def lock(self, gid):
+        if gid in self.games:
+            return super(TieredStorage, self).lock(gid)
+        return self._archived_lock
+
+    # Archiving
+
+    def archive_idle(self, now=None):
+        """ Archive completed games that have been idle too long, or the
+        least recently used ones if there are too many games in memory """
+        idle = self._idle
+        if not idle:
+            return
+        now = time.time() if now is None else now
+        over = len(self.games) - self.max_hot
+        if over <= 0 and now < self._next_check:
+            return
+        # One thread archives at a time - the others get on with their work
+        if not self._archive_lock.acquire(False):
+            return
+        try:
+            self._next_check = now + min(1, self.idle)
+            deadline = now - self.idle
+            # Once over the cap, get some way under it
+            need = over + self.BATCH // 2 if over > 0 else 0
+            while idle:
+                batch = []
+                while idle and len(batch) < self.BATCH:
+                    gid = next(iter(idle))
+                    if idle[gid] > deadline and len(batch) >= need:
+                        break
+                    del idle[gid]
+                    game = self.games.get(gid)
+                    if game is not None:
+                        batch.append(game)
+                if not batch:
+                    break
+                self._archive(batch)
+                need -= len(batch)
+        finally:
+            self._archive_lock.release()
+
+    def _archive(self, games):
+        """ Write games to the archive, then drop them from memory """
+        packed = [game.pack() for game in games]
+        with self._db_lock:
+            if self._zdict is None:
+                self._zdict = b''.join(packed)[-self.ZDICT_SIZE:]
+                self._db.execute('INSERT INTO meta VALUES (?, ?)',
+                                 ('zdict', self._zdict))
+            rows = [(game.id, self._compress(data))
+                    for game, data in zip(games, packed)]
+            with self._db:
+                self._db.executemany('INSERT INTO games VALUES (?, ?)', rows)
+        self.narchived += len(games)
+        for game in games:
+            del self.games[game.id]
+            self._locks.pop(game.id, None)
+
+    def _compress(self, data):
+        deflate = zlib.compressobj(9, zlib.DEFLATED, -15, zdict=self._zdict)
+        return deflate.compress(data) + deflate.flush()
+
+    # Reading the archive
+
+    def load(self, gid):
+        """ Read a game from the archive, or None if it isn't there """
+        with self._db_lock:
+            row = self._db.execute('SELECT data FROM games WHERE id = ?',
+                                   (gid,)).fetchone()
+        if row is None:
+            return None
+        inflate = zlib.decompressobj(-15, zdict=self._zdict)
+        data = inflate.decompress(row[0]) + inflate.flush()
+        return Game.unpack_from(data, 0, self.players)[0]
+
+    def archived(self, gid):
+        with self._db_lock:
+            return self._db.execute('SELECT 1 FROM games WHERE id = ?',
+                                    (gid,)).fetchone() is not None
+
+    def archived_ids(self):
+        """ IDs of archived games, a page at a time """
+        after = -1
+        while True:
+            with self._db_lock:
+                page = [gid for gid, in self._db.execute(
+                    'SELECT id FROM games WHERE id > ? ORDER BY id LIMIT 1000',
+                    (after,))]
+            for gid in page:
+                yield gid
+            if len(page) < 1000:
+                return
+            after = page[-1]
+
+    def close(self):
+        with self._db_lock:
+            self._db.close()
+
+
 class DB(object):
-    """ Our fake DB.  Meant to be a singleton.  Do not instantiate.  """
+    """ Our fake DB.  Meant to be a singleton.  Do not instantiate.  Objects
+    live in a `Storage` backend, in memory unless configured otherwise. """
+
+    # Backends by `DB_BACKEND` config name
+    backends = {
+        'memory': MemoryStorage,
+        'sqlite': SQLiteStorage,
+        'journal': JournalStorage,
+        'shared': SharedMemoryStorage,
+        'tiered': TieredStorage,
+    }
+
+    storage = None
     # Maps of IDs to respective objects
     players = {}
     games = {}
     frames = {}
 
+    @staticmethod
+    def use(storage):
+        """ Switch to a storage backend """
+        if DB.storage is not None:
+            DB.storage.close()
+        DB.storage = storage
+        DB.players = storage.table(Player)
+        DB.games = storage.table(Game)
+        DB.frames = storage.table(Frame)
+        # Don't hand out IDs that were loaded
+        ids.advance(max(itertools.chain([0], DB.players, DB.games)))
+        leaderboard.rebuild(DB.games.values())
+        game_index.rebuild(DB.games.values())
+
+    @staticmethod
+    def configure(config):
+        """ Switch to the storage backend named by `DB_BACKEND` in an app
+        config """
+        klass = DB.backends[config.get('DB_BACKEND', 'memory')]
+        DB.use(klass.from_config(config))
+
     @staticmethod
     def get(klass):
         """ Get the appropriate db 'table' for the class """
-        return {
-            Player: DB.players,
-            Game: DB.games,
-            Frame: DB.frames
-        }[klass]
+        return DB.storage.table(klass)
+
+    @staticmethod
+    def add(obj):
+        """ Store a new Player or Game """
+        DB.storage.add(obj)
+        return obj
+
+    @staticmethod
+    def frame_posted(game, player, shots):
+        """ Persist a frame, or a shot, that was just posted to a game """
+        DB.storage.frame_posted(game, player, shots)
+
+    @staticmethod
+    def add_batch(players, games):
+        """ Store many new Players, and Games with their frames already
+        posted - a list of (game, the (player, shots) posted to it) """
+        DB.storage.add_batch(players, games)
+
+    @staticmethod
+    def lock(gid):
+        """ Get the lock for a game - hold it while changing the game, or
+        reading it as a whole """
+        return DB.storage.lock(gid)
 
 
-random.seed()
+DB.use(MemoryStorage())
@@ -0,0 +1,223 @@
+""" Profiling requests with cProfile, on demand.
+
+`instrument()` wraps a Flask app so a request is profiled when it has the
+profiling header set, or when it's picked at random, at a configured
+sampling rate.  Each profile's stats are written to a file of their own in a
+directory, which keeps the latest few - named for when the request came,
+the process, the resource, the method, and for requests to a game its ID
+and how many players it has.  Requests that aren't profiled only cost a
+header lookup, and a random number when sampling; with `PROFILE_DIR` unset
+the app isn't wrapped at all.
+
+`python -m profiling` shows the functions that took the most time across
+the profiles collected, or some of them:
+
+    python -m profiling profiles --route restframerecorder --players 6
+"""
+import argparse
+import cProfile
+import logging
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+
+from metrics import Request
+from models import Game
+from persistence import DB
+
+log = logging.getLogger(__name__)
+
+SUFFIX = '.prof'
+SORTS = ('cumulative', 'tottime', 'calls')
+
+_GAME = re.compile(r'^/game/(\d+)')
+
+
+class Tags(object):
+    """ What a profile was of, as in its file name """
+
+    __slots__ = ('time', 'process', 'route', 'method', 'gid', 'players')
+
+    def __init__(self, time, process, route, method, gid=0, players=0):
+        self.time = time
+        self.process = process
+        self.route = route
+        self.method = method
+        self.gid = gid
+        self.players = players
+
+    def name(self):
+        return '%016d-%d-%s-%s-%d-%d%s' % (
+            round(self.time * 1000000), self.process, self.route, self.method,
+            self.gid, self.players, SUFFIX)
+
+    @classmethod
+    def parse(cls, name):
+        """ The tags in a file name.  None if it isn't a profile's. """
+        if not name.endswith(SUFFIX):
+            return None
+        try:
+            us, process, route, method, gid, players = \
+                name[:-len(SUFFIX)].split('-')
+            return cls(int(us) / 1000000.0, int(process), route, method,
+                       int(gid), int(players))
+        except ValueError:
+            return None
+
+
+class Profiler(object):
+    """ Writes request profiles to a directory, keeping the latest `keep` """
+
+    def __init__(self, directory, keep=1000):
+        self.directory = directory
+        self.keep = keep
+        self._lock = threading.Lock()
+        self._last = 0
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def dump(self, profile, tags):
+        """ Write a profile's stats.  Returns the file's path. """
+        with self._lock:
+            # A name of its own, even in the same microsecond as the last
+            tags.time = max(tags.time, self._last + 0.000001)
+            self._last = tags.time
+        path = os.path.join(self.directory, tags.name())
+        # Whole files only, for anyone reading the directory
+        profile.dump_stats(path + '.tmp')
+        os.replace(path + '.tmp', path)
+        with self._lock:
+            names = sorted(n for n in os.listdir(self.directory)
+                           if n.endswith(SUFFIX))
+            for name in names[:-self.keep]:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    # Another worker's got it
+                    pass
+        return path
+
+
+def players_in(path):
+    """ The ID of the game a request was to, if any, and how many players
+    it has """
+    match = _GAME.match(path)
+    if not match:
+        return 0, 0
+    gid = int(match.group(1))
+    game = DB.get(Game).get(gid)
+    return gid, len(game.players) if game is not None else 0
+
+
+def instrument(app, directory, header='X-Profile', sample=0.0, keep=1000):
+    """ Profile requests to a Flask app that have `header` set (if it isn't
+    None), and a `sample` of the others, writing their stats to
+    `directory`.  Streamed responses are profiled until they start.  Returns
+    the `Profiler`. """
+    profiler = Profiler(directory, keep)
+    wsgi_app = app.wsgi_app
+    key = 'HTTP_' + header.upper().replace('-', '_') if header else None
+
+    def profiling(environ, start_response):
+        if not ((key and environ.get(key)) or
+                (sample and random.random() < sample)):
+            return wsgi_app(environ, start_response)
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler's running (one at a time from Python 3.12)
+            return wsgi_app(environ, start_response)
+        try:
+            response = wsgi_app(environ, start_response)
+        finally:
+            profile.disable()
+        rule = environ.get('bowling.url_rule')
+        gid, players = players_in(environ.get('PATH_INFO', ''))
+        try:
+            profiler.dump(profile, Tags(
+                time.time(), os.getpid(),
+                rule.endpoint if rule is not None else 'none',
+                environ.get('REQUEST_METHOD'), gid, players))
+        except (IOError, OSError):
+            log.exception('Unable to write profile to %s', directory)
+        return response
+    app.request_class = Request
+    app.wsgi_app = profiling
+    return profiler
+
+
+def collect(directory, route=None, method=None, gid=None, players=None):
+    """ The paths of the profiles in a directory, oldest first, and their
+    tags - those for a route, method, game, or with at least `players`
+    players, if given """
+    profiles = []
+    for name in sorted(os.listdir(directory)):
+        tags = Tags.parse(name)
+        if tags is None:
+            continue
+        if ((route is not None and tags.route != route) or
+                (method is not None and tags.method != method.upper()) or
+                (gid is not None and tags.gid != gid) or
+                (players is not None and tags.players < players)):
+            continue
+        profiles.append((os.path.join(directory, name), tags))
+    return profiles
+
+
+def report(profiles, sort='cumulative', top=25, stream=None):
+    """ Print how many of each kind of request were profiled, then the `top`
+    functions across all their profiles - all of them if it's None """
+    stream = stream or sys.stdout
+    kinds = {}
+    for _, tags in profiles:
+        kind = (tags.route, tags.method)
+        kinds[kind] = kinds.get(kind, 0) + 1
+    stream.write('%d profiles\n' % len(profiles))
+    for (route, method), count in sorted(kinds.items()):
+        stream.write('  %6d  %s %s\n' % (count, method, route))
+    stats = None
+    for path, _ in profiles:
+        try:
+            if stats is None:
+                stats = pstats.Stats(path, stream=stream)
+            else:
+                stats.add(path)
+        except (IOError, OSError):
+            # Rotated away since
+            pass
+    if stats is not None:
+        stats.sort_stats(sort).print_stats(top)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Show where the time went in profiled requests')
+    parser.add_argument('directory', nargs='?',
+                        help='profiles directory (default: PROFILE_DIR from '
+                             'BOWLING_SETTINGS)')
+    parser.add_argument('--route', help='e.g. restframerecorder')
+    parser.add_argument('--method', help='e.g. POST')
+    parser.add_argument('--game', type=int, help='a game ID')
+    parser.add_argument('--players', type=int,
+                        help='games with at least this many players')
+    parser.add_argument('--sort', choices=SORTS, default='cumulative')
+    parser.add_argument('--top', type=int, default=25,
+                        help='functions to show (default 25)')
+    args = parser.parse_args(argv)
+    directory = args.directory
+    if directory is None:
+        from app import app
+        directory = app.config['PROFILE_DIR']
+        if directory is None:
+            sys.exit('No directory given, and PROFILE_DIR is not set')
+    report(collect(directory, args.route, args.method, args.game,
+                   args.players), args.sort, args.top)
+
+
+if __name__ == '__main__':
+    main()
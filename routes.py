@@ -1,12 +1,136 @@
-from flask_restful import Resource, marshal_with, reqparse, abort
+import gzip
 
-from models import Player, Game
+from flask import current_app, request, stream_with_context
+from flask_restful import Resource, abort
+from flask_restful.representations.json import output_json
+from werkzeug.http import quote_etag
+
+from models import Player, Game, PlayerStats
 from controllers import PlayerController as pc
 from controllers import GameController as gc
+from schemas import Schema, Argument
+from serializers import serialize_with
+from cache import LRUCache
+from indexes import game_index
+from leaderboard import leaderboard
+import bulk
+import events
+import metrics
+
+
+serialize_game = serialize_with(Game.serialize)
+# ?since=<version>, for only what changed in a game after that version
+since_schema = Schema('args', Argument('since', int))
+
+
+def render_game(game):
+    """ Render a full game to JSON, from its latest snapshot - without
+    waiting on anyone posting to it.  Returns the version rendered, and the
+    JSON.  Rendered bodies are cached by game ID and version, so an unchanged
+    game is only serialized once. """
+    game = game.snapshot()
+    version = game.version
+    body = RestGame.rendered.get((game.id, version))
+    if body is None:
+        body = output_json(serialize_game.serialize(game), 200).get_data()
+        RestGame.rendered.put((game.id, version), body)
+    return version, body
+
+
+def render_delta(game, since):
+    """ Render what changed in a game after version `since` to JSON: the
+    frames that changed, their players' totals, and where the game is at -
+    from its latest snapshot, like `render_game`.  Returns the version
+    rendered, and the JSON. """
+    game = game.snapshot()
+    frames = []
+    totals = {}
+    for player, rolls, changed in game.changed_since(since):
+        changes = []
+        for i in changed:
+            f = rolls.frame(i, player)
+            changes.append(dict(frame=i + 1, score=f.score,
+                                shots=[int(s) for s in f.shots]))
+        frames.append({'pid': player.id, 'frames': changes})
+        totals[str(player.id)] = rolls.total
+    data = {
+        'id': game.id,
+        'version': game.version,
+        'since': since,
+        'started': game.started,
+        'complete': game.complete,
+        'current_frame': game.current_frame,
+        'current_player': (game.current_player.id
+                           if game.current_player else None),
+        'frames': frames,
+        'totals': totals,
+    }
+    return data['version'], output_json(data, 200).get_data()
+
+
+def compress_game(gid, version, body):
+    """ A rendered game, gzipped.  Cached by game ID and version, like the
+    rendered bodies. """
+    data = RestGame.compressed.get((gid, version))
+    if data is None:
+        data = gzip.compress(body, current_app.config['GZIP_LEVEL'], mtime=0)
+        RestGame.compressed.put((gid, version), data)
+    return data
+
+
+def since_version(req=None):
+    """ The version the client asked for changes since, if any """
+    since = since_schema.parse(req)['since']
+    if since is not None and since < 0:
+        abort(400, message="since must not be negative")
+    return since
+
+
+def game_tag(game, since=None):
+    """ The ETag for a game's version - or with `since`, for the changes since
+    that version, which are a different body """
+    if since is not None and since <= game.version:
+        return '%d-%d-%d' % (game.id, since, game.version)
+    return '%d-%d' % (game.id, game.version)
+
+
+def game_body(game, since=None, gzipped=False):
+    """ The body of a response with the game, and its headers - an ETag for
+    its version (see `game_tag`).  With `since`, only what changed after that version -
+    otherwise the full game, gzipped if the client accepts it (`gzipped`) and
+    it's at least GZIP_MIN_SIZE bytes.  A client asking for changes since a
+    version the game hasn't reached gets the full game.  Returns the body and
+    a list of headers. """
+    game = game.snapshot()
+    if since is not None and since <= game.version:
+        body = render_delta(game, since)[1]
+        return body, [('ETag', quote_etag(game_tag(game, since)))]
+    version, body = render_game(game)
+    headers = []
+    minimum = current_app.config['GZIP_MIN_SIZE']
+    if minimum is not None:
+        headers.append(('Vary', 'Accept-Encoding'))
+        if len(body) >= minimum and gzipped:
+            # The same game, differently encoded
+            headers.append(('Content-Encoding', 'gzip'))
+            headers.append(('ETag', quote_etag(game_tag(game), weak=True)))
+            return compress_game(game.id, version, body), headers
+    headers.append(('ETag', quote_etag(game_tag(game))))
+    return body, headers
+
+
+def game_response(game, since=None):
+    """ A response with the game, as `game_body` renders it """
+    body, headers = game_body(game, since,
+                              bool(request.accept_encodings['gzip']))
+    return current_app.response_class(body, mimetype='application/json',
+                                      headers=headers)
 
 
 class RestPlayer(Resource):
-    @marshal_with(Player.serialize)
+    schema = Schema('json', Argument('name', str, required=True))
+
+    @serialize_with(Player.serialize)
     def get(self, id):
         """ Get a player - example
         {
@@ -16,20 +140,72 @@ class RestPlayer(Resource):
         """
         return pc.get(id) or abort(404)
 
-    @marshal_with(Player.serialize)
+    @serialize_with(Player.serialize)
     def post(self):
         """ Create a player, POST format:
         {
             'name': 'mario mario'
         }
         """
-        parser = reqparse.RequestParser()
-        parser.add_argument('name', type=str, location='json', required=True)
-        args = parser.parse_args()
+        args = self.schema.parse()
         return pc.create(args['name'])
 
+class RestPlayerStats(Resource):
+    serialize = serialize_with(PlayerStats.serialize)
+
+    def get(self, id):
+        """ Get a player's statistics over their completed games, and their
+        place on the leaderboard - example
+        {
+            'pid': 123,
+            'games': 12,
+            'pins': 1893,
+            'average': 157.75,
+            'high': 211,
+            'strikes': 31,
+            'spares': 48,
+            'rank': 4
+        }
+        """
+        player = pc.get(id) or abort(404)
+        stats = leaderboard.get(player.id) or PlayerStats(player.id)
+        data = self.serialize.serialize(stats)
+        data['rank'] = leaderboard.rank(player.id)
+        return data
+
+class RestLeaderboard(Resource):
+    serialize = serialize_with(PlayerStats.serialize)
+    schema = Schema('args', Argument('top', int, default=10))
+
+    def get(self):
+        """ Get the best players by average, best first - ?top=N for how many
+        (10 by default) - example
+        {
+            'players': [
+                {'rank': 1, 'name': 'mario', 'pid': 123, 'average': 201.5, ...},
+                ...
+            ]
+        }
+        """
+        args = self.schema.parse()
+        if args['top'] < 0:
+            abort(400, message="top must not be negative")
+        players = []
+        for rank, stats in enumerate(leaderboard.top(args['top']), 1):
+            data = self.serialize.serialize(stats)
+            player = pc.get(stats.pid)
+            data['name'] = player.name if player else None
+            data['rank'] = rank
+            players.append(data)
+        return {'players': players}
+
 class RestGame(Resource):
-    @marshal_with(Game.serialize)
+    # Rendered game bodies by (game ID, version), and gzipped ones - sized by
+    # the RENDER_CACHE_SIZE config
+    rendered = LRUCache()
+    compressed = LRUCache()
+    schema = Schema('json', Argument('players', list, required=True))
+
     def get(self, id):
         """ Get a game - example
         {
@@ -49,30 +225,204 @@ class RestGame(Resource):
             u'started': True,
             u'totals': {u'61617': 9, u'62621': 0}
         }
+
+        Responses carry an ETag for the game's version - send it back in
+        If-None-Match to get a 304 if the game hasn't changed.  Or pass the
+        version as ?since=<version> to get only what changed after it:
+        {
+            'id': 73360,
+            'version': 9,
+            'since': 7,
+            'started': True,
+            'complete': False,
+            'current_frame': 4,
+            'current_player': 62621,
+            'frames': [
+                {'pid': 61617, 'frames': [
+                    {'frame': 2, 'score': 20, 'shots': [-1, -3]},
+                    {'frame': 3, 'score': 0, 'shots': [7, -2]}]}
+            ],
+            'totals': {'61617': 49}
+        }
         """
-        return gc.get(id) or abort(404)
+        game = (gc.get(id) or abort(404)).snapshot()
+        since = since_version()
+        tag = game_tag(game, since)
+        if request.if_none_match.contains_weak(tag):
+            resp = current_app.response_class(status=304)
+            resp.set_etag(tag)
+            return resp
+        return game_response(game, since)
 
-    @marshal_with(Game.serialize)
+    @serialize_game
     def post(self):
         """ Create a game, POSTdata format:
         {
             'players': [123, 456, 789]
         }
         """
-        parser = reqparse.RequestParser()
-        parser.add_argument('players', type=list, location='json', required=True)
-        args = parser.parse_args()
-        return gc.create(args['players'])
+        args = self.schema.parse()
+        return gc.create(args['players']).snapshot()
+
+class RestGameList(Resource):
+    serialize = serialize_with(Game.summary)
+    schema = Schema('args',
+                    Argument('after', int),
+                    Argument('limit', int, default=20),
+                    Argument('status', default='all', choices=('all', 'active')))
+
+    def get(self, pid=None):
+        """ List games in the order they were created, all of them or a
+        player's.  ?status=active for only games in progress, ?limit=N for
+        the page size (20 by default, up to 100), and ?after=<game ID> for the
+        page after that game - pass `next` from the previous page.
+        {
+            'games': [
+                {'id': 73360, 'players': [...], 'current_frame': 4,
+                 'started': True, 'complete': False, 'totals': {...}},
+                ...
+            ],
+            'next': 73360
+        }
+        """
+        args = self.schema.parse()
+        if not 0 < args['limit'] <= 100:
+            abort(400, message="limit must be 1-100")
+        if pid is not None and not pc.get(pid):
+            abort(404)
+        try:
+            gids = game_index.page(args['after'], args['limit'], pid,
+                                   args['status'] == 'active')
+        except KeyError:
+            abort(400, message="Unable to locate game %s" % args['after'])
+        games = [self.serialize.serialize(game.snapshot())
+                 for game in (gc.get(gid) for gid in gids) if game]
+        return {
+            'games': games,
+            'next': gids[-1] if len(gids) == args['limit'] else None
+        }
+
+class RestGameEvents(Resource):
+    """ A stream of server-sent events with updates to a game.  The first
+    event is the full game (`event: game`), followed by an `event: frame` with
+    a compact update for every frame posted:
+    {
+        "version": 7,
+        "pid": 61617,
+        "frames": [{"frame": 3, "score": 20, "shots": [-1, -3]}, ...],
+        "total": 49,
+        "current_frame": 4,
+        "current_player": 62621,
+        "complete": false
+    }
+    Event IDs are game versions.  Reconnecting with Last-Event-ID (or
+    ?since=<version>) resumes from that version.
+    """
+    def get(self, id):
+        game = (gc.get(id) or abort(404)).snapshot()
+        since = request.headers.get('Last-Event-ID', request.args.get('since'))
+        try:
+            since = int(since) if since is not None else None
+        except ValueError:
+            abort(400, message="Invalid version %s" % since)
+        body = events.stream(game, since,
+                             lambda g: render_game(g)[1].decode('utf-8'),
+                             current_app.config['SSE_HEARTBEAT'],
+                             lambda g: (gc.get(g.id) or g).snapshot())
+        resp = current_app.response_class(stream_with_context(body),
+                                          mimetype='text/event-stream')
+        resp.headers['Cache-Control'] = 'no-cache'
+        resp.headers['X-Accel-Buffering'] = 'no'
+        return resp
 
 class RestFrameRecorder(Resource):
-    """ This REST resource is purpouse-built for recording frames.
+    """ This REST resource is purpouse-built for recording frames.  A tenth
+    frame with a strike or spare has three shots, e.g. ["X", 7, "/"].
     {
         "shots": [7, "/"]
     }
+    Responds with the game - or with ?since=<version>, only what changed
+    after that version, as `RestGame.get` does.
+    """
+    schema = Schema('json', Argument('shots', list, required=True))
+
+    def post(self, gid, pid):
+        args = self.schema.parse()
+        since = since_version()
+        return game_response(gc.frame_for_player(gid, pid, args['shots']), since)
+
+class RestShotRecorder(Resource):
+    """ Record a single shot as it's thrown - a pin count, "X" or "/".  The
+    player's turn lasts until their frame is over, including the fill balls
+    of a tenth frame strike or spare.
+    {
+        "shot": 7
+    }
     """
-    @marshal_with(Game.serialize)
+    schema = Schema('json', Argument('shot', required=True))
+
     def post(self, gid, pid):
-        parser = reqparse.RequestParser()
-        parser.add_argument('shots', type=list, location='json', required=True)
-        args = parser.parse_args()
-        return gc.frame_for_player(gid, pid, args['shots'])
+        args = self.schema.parse()
+        since = since_version()
+        return game_response(gc.shot_for_player(gid, pid, args['shot']), since)
+
+class RestFrameBatch(Resource):
+    """ Record many frames for a game at once, in the order they were bowled.
+    Nothing is recorded unless every frame is valid.
+    {
+        "frames": [
+            {"pid": 123, "shots": ["X", null]},
+            {"pid": 456, "shots": [7, "/"]}
+        ]
+    }
+    """
+    schema = Schema('json', Argument('frames', list, required=True))
+
+    def post(self, gid):
+        args = self.schema.parse()
+        frames = []
+        for i, frame in enumerate(args['frames']):
+            if (not isinstance(frame, dict) or not isinstance(frame.get('pid'), int)
+                    or not isinstance(frame.get('shots'), list)):
+                abort(400, message="Frame %d: expected a pid and a list of shots" % i)
+            frames.append((frame['pid'], frame['shots']))
+        since = since_version()
+        return game_response(gc.frames_for_game(gid, frames), since)
+
+class RestExport(Resource):
+    """ Stream the whole DB - `?format=ndjson` (the default) for players and
+    games, or `?format=rolls` for a CSV with a row per roll (see bulk.py) """
+    schema = Schema('args', Argument('format', choices=bulk.FORMATS,
+                                     default='ndjson'))
+
+    def get(self):
+        format = self.schema.parse()['format']
+        return current_app.response_class(
+            stream_with_context(bulk.export(format)),
+            mimetype=bulk.MIMETYPES[format])
+
+class RestImport(Resource):
+    """ Load an NDJSON export, sent as application/x-ndjson.  Responds with
+    how many players and games were loaded.
+    {
+        "players": 2,
+        "games": 1
+    }
+    """
+    def post(self):
+        mimetype = request.mimetype
+        if mimetype != bulk.MIMETYPES['ndjson']:
+            abort(415, message="Expected %s, not '%s'" %
+                  (bulk.MIMETYPES['ndjson'], mimetype))
+        try:
+            players, games = bulk.load(request.stream)
+        except ValueError as e:
+            abort(422, message=str(e))
+        return {'players': players, 'games': games}
+
+class RestMetrics(Resource):
+    """ Request latencies, DB sizes and memory use, in Prometheus text format
+    """
+    def get(self):
+        return current_app.response_class(metrics.registry.render(),
+                                          content_type=metrics.CONTENT_TYPE)
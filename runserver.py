@@ -1,3 +1,35 @@
-from app import app
+import os
+import runpy
 
-app.run(debug=True)
+
+def server():
+    """ SERVER from the BOWLING_SETTINGS file, as app.py would load it - read
+    without importing the app, so gevent can patch the standard library
+    before anything else imports it """
+    path = os.environ.get('BOWLING_SETTINGS')
+    if not path:
+        return 'flask'
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), path)
+    return runpy.run_path(path).get('SERVER', 'flask')
+
+
+if server() == 'gevent':
+    # Greenlets instead of threads per connection, so idle event streams are
+    # cheap.  Patch first - the app's modules make locks as they're imported.
+    from gevent import monkey
+    monkey.patch_all()
+    from gevent.pywsgi import WSGIServer
+    from app import app
+    WSGIServer((app.config['HOST'], app.config['PORT']), app).serve_forever()
+else:
+    from app import app
+    if app.config['SERVER'] == 'asgi':
+        # An event loop for the players, games and frames routes, and the
+        # Flask app on threads for the rest (see asgi.py)
+        import uvicorn
+        from asgi import application
+        uvicorn.run(application, host=app.config['HOST'],
+                    port=app.config['PORT'])
+    else:
+        app.run(host=app.config['HOST'], port=app.config['PORT'], debug=True,
+                threaded=True)
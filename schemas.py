@@ -0,0 +1,110 @@
+""" Request schemas - the arguments a resource takes, declared once.
+
+`reqparse.RequestParser` is built again on every request, and reads the body
+through Flask's `request.json`.  A `Schema` is built with its resource, and
+parses the raw body itself, with orjson if it's installed.  Errors come back
+as they would from reqparse: 415 for a body that isn't JSON, and 400 for one
+that doesn't parse, or for a missing or invalid argument.
+"""
+try:
+    from orjson import loads
+except ImportError:
+    from json import loads
+
+from flask import request
+from flask_restful import abort
+from werkzeug.exceptions import BadRequest
+
+from metrics import steps
+
+
+NOT_JSON = ("Did not attempt to load JSON data because the request "
+            "Content-Type was not 'application/json'.")
+
+_LOCATIONS = {
+    'json': 'the JSON body',
+    'args': 'the query string',
+}
+
+
+class Argument(object):
+    """ An argument to a resource.  `type` converts the value, and `list`
+    only accepts lists.  Missing arguments are `default`, and null ones
+    None. """
+
+    __slots__ = ('name', 'type', 'required', 'default', 'choices')
+
+    def __init__(self, name, type=None, required=False, default=None,
+                 choices=None):
+        self.name = name
+        self.type = type
+        self.required = required
+        self.default = default
+        self.choices = choices
+
+    def convert(self, value):
+        """ The argument's value, converted.  Raises ValueError if it's
+        invalid. """
+        if value is None:
+            return None
+        if self.type is list:
+            if not isinstance(value, list):
+                raise ValueError('%s must be a list' % self.name)
+        elif self.type is not None:
+            try:
+                value = self.type(value)
+            except TypeError as e:
+                raise ValueError(str(e))
+        if self.choices is not None and value not in self.choices:
+            raise ValueError('%s is not a valid choice' % value)
+        return value
+
+
+class Schema(object):
+    """ The arguments a resource takes, from the JSON body or the query
+    string """
+
+    def __init__(self, location, *arguments):
+        self.location = location
+        self.arguments = arguments
+        self.missing = 'Missing required parameter in %s' % _LOCATIONS[location]
+
+    @steps.timed('parse')
+    def parse(self, req=None):
+        """ Parse a request's arguments to a dict - the current request's by
+        default """
+        if req is None:
+            req = request._get_current_object()
+        if self.location == 'json':
+            values = json_body(req)
+            if not isinstance(values, dict):
+                values = {}
+        else:
+            values = req.args
+        args = {}
+        for argument in self.arguments:
+            value = values.get(argument.name, argument)
+            if value is argument:
+                if argument.required:
+                    abort(400, message={argument.name: self.missing})
+                value = argument.default
+            else:
+                try:
+                    value = argument.convert(value)
+                except ValueError as e:
+                    abort(400, message={argument.name: str(e)})
+            args[argument.name] = value
+        return args
+
+
+def json_body(req):
+    """ A request's JSON body """
+    # req.is_json, without parsing the whole header
+    mimetype = req.environ.get('CONTENT_TYPE', '').partition(';')[0].strip().lower()
+    if mimetype != 'application/json' and not (
+            mimetype.startswith('application/') and mimetype.endswith('+json')):
+        abort(415, message=NOT_JSON)
+    try:
+        return loads(req.get_data(cache=True))
+    except ValueError:
+        abort(400, message=BadRequest.description)
@@ -0,0 +1,99 @@
+""" Batch scoring of many games at once with NumPy.
+
+Games are given as an (N x 21) integer matrix - one row per player per game -
+holding `Frame.Shot` values laid out the same way as `Game.PlayerRolls.rolls`:
+frames 1-9 use two slots each (a strike is followed by `nil`), and the tenth
+frame uses the last three, the third being the fill ball.  Rolls that haven't
+been thrown yet are `notyet`.
+
+Scoring follows the full rules, including bonuses that reach into the tenth
+frame and its fill ball.  A frame whose score isn't final yet (it is waiting on
+a ball that hasn't been thrown) scores 0, the same way `Game` reports it.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+from models import Frame, Game
+
+
+STRIKE = int(Frame.Shot.strike)
+SPARE = int(Frame.Shot.spare)
+NIL = int(Frame.Shot.nil)
+
+# Slots of the first and second ball of frames 1-9, and of the first ball of
+# the following frame
+_FIRST = np.arange(0, 18, 2)
+_SECOND = _FIRST + 1
+_NEXT = _FIRST + 2
+# Whether the following frame is one of frames 1-9, where a strike is followed
+# by a `nil` slot
+_NEXT_IN_BODY = np.arange(1, 10) < 9
+
+Scores = namedtuple('Scores', ['frames', 'totals', 'complete'])
+
+
+def export(games):
+    """ Export `Game` objects to the matrix form.  Returns the (N x 21) int8
+    matrix, and a list of (game ID, player ID) for each row. """
+    keys = []
+    buf = []
+    for game in games:
+        for player in game.players:
+            keys.append((game.id, player.id))
+            buf.append(game.get_rolls(player.id).rolls.tobytes())
+    rolls = np.frombuffer(b''.join(buf), dtype=np.int8)
+    return rolls.reshape(len(keys), Game.ROLLS), keys
+
+
+def pins(rolls):
+    """ Convert a matrix of Shots to pins knocked down by each roll - 0 for
+    rolls not thrown """
+    rolls = np.asarray(rolls, dtype=np.int16)
+    prev = np.zeros_like(rolls)
+    prev[:, 1:] = np.maximum(rolls[:, :-1], 0)
+    return np.where(rolls >= 0, rolls,
+                    np.where(rolls == STRIKE, 10,
+                             np.where(rolls == SPARE, 10 - prev, 0)))
+
+
+def score(rolls):
+    """ Score an (N x 21) matrix of Shots.  Returns `Scores` of (N x 10)
+    matrices: per-frame scores, running totals, and whether each frame's score
+    is final. """
+    rolls = np.asarray(rolls, dtype=np.int16)
+    if rolls.ndim != 2 or rolls.shape[1] != Game.ROLLS:
+        raise ValueError('Expected an (N x %d) matrix of shots' % Game.ROLLS)
+    n = rolls.shape[0]
+    p = pins(rolls)
+    thrown = rolls >= SPARE
+
+    frames = np.empty((n, Game.FRAMES), dtype=np.int16)
+    complete = np.empty((n, Game.FRAMES), dtype=bool)
+
+    # Frames 1-9
+    strike = rolls[:, _FIRST] == STRIKE
+    spare = rolls[:, _SECOND] == SPARE
+    # The second bonus ball of a strike comes from the frame after next if the
+    # next frame is also a strike (outside of the tenth)
+    second = np.where((rolls[:, _NEXT] == STRIKE) & _NEXT_IN_BODY,
+                      _NEXT + 2, _NEXT + 1)
+    bonus1 = p[:, _NEXT]
+    bonus2 = np.take_along_axis(p, second, axis=1)
+    frames[:, :9] = (p[:, _FIRST] + p[:, _SECOND] +
+                     np.where(strike, bonus1 + bonus2,
+                              np.where(spare, bonus1, 0)))
+    complete[:, :9] = (thrown[:, _FIRST] & (strike | thrown[:, _SECOND]) &
+                       np.where(strike,
+                                thrown[:, _NEXT] &
+                                np.take_along_axis(thrown, second, axis=1),
+                                ~spare | thrown[:, _NEXT]))
+
+    # The tenth frame - a strike or spare earns the fill ball
+    frames[:, 9] = p[:, 18] + p[:, 19] + p[:, 20]
+    complete[:, 9] = (thrown[:, 18] & thrown[:, 19] &
+                      (((rolls[:, 18] != STRIKE) & (rolls[:, 19] != SPARE)) |
+                       thrown[:, 20]))
+
+    frames[~complete] = 0
+    return Scores(frames, np.cumsum(frames, axis=1, dtype=np.int16), complete)
@@ -0,0 +1,110 @@
+""" A sorted container for the in-memory indexes (see leaderboard.py and
+indexes.py). """
+from math import log
+import random
+
+
+class SkipList(object):
+    """ A sorted list of unique keys, with O(log n) insert, remove, and
+    position lookups.  Each link records how many places it skips, so
+    positions can be counted on the way down. """
+
+    # Good for about 2 ** MAX_LEVELS keys
+    MAX_LEVELS = 24
+
+    class Node(object):
+        __slots__ = ('key', 'next', 'width')
+
+        def __init__(self, key, levels):
+            self.key = key
+            self.next = [None] * levels
+            self.width = [1] * levels
+
+    def __init__(self):
+        self._head = SkipList.Node(None, self.MAX_LEVELS)
+        self._random = random.Random()
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        node = self._head.next[0]
+        while node is not None:
+            yield node.key
+            node = node.next[0]
+
+    def _path(self, key):
+        """ The last node before `key` on each level, and the position of
+        each """
+        path = [None] * self.MAX_LEVELS
+        positions = [0] * self.MAX_LEVELS
+        node = self._head
+        position = 0
+        for level in reversed(range(self.MAX_LEVELS)):
+            after = node.next[level]
+            while after is not None and after.key < key:
+                position += node.width[level]
+                node, after = after, after.next[level]
+            path[level] = node
+            positions[level] = position
+        return path, positions
+
+    def insert(self, key):
+        path, positions = self._path(key)
+        after = path[0].next[0]
+        if after is not None and after.key == key:
+            raise KeyError(key)
+        levels = min(self.MAX_LEVELS, 1 - int(log(1.0 - self._random.random(), 2)))
+        node = SkipList.Node(key, levels)
+        # Position of the new node, counting the head as 0
+        position = positions[0] + 1
+        for level in range(levels):
+            prev = path[level]
+            node.next[level] = prev.next[level]
+            prev.next[level] = node
+            skipped = position - positions[level]
+            node.width[level] = prev.width[level] - skipped + 1
+            prev.width[level] = skipped
+        for level in range(levels, self.MAX_LEVELS):
+            path[level].width[level] += 1
+        self._size += 1
+
+    def remove(self, key):
+        path, _ = self._path(key)
+        node = path[0].next[0]
+        if node is None or node.key != key:
+            raise KeyError(key)
+        for level in range(len(node.next)):
+            prev = path[level]
+            prev.width[level] += node.width[level] - 1
+            prev.next[level] = node.next[level]
+        for level in range(len(node.next), self.MAX_LEVELS):
+            path[level].width[level] -= 1
+        self._size -= 1
+
+    def index(self, key):
+        """ The position of `key`, from 0 """
+        path, positions = self._path(key)
+        node = path[0].next[0]
+        if node is None or node.key != key:
+            raise KeyError(key)
+        return positions[0]
+
+    def first(self, n):
+        """ The first `n` keys """
+        return self._take(self._head.next[0], n)
+
+    def after(self, key, n):
+        """ The first `n` keys greater than `key` """
+        node = self._path(key)[0][0].next[0]
+        if node is not None and node.key == key:
+            node = node.next[0]
+        return self._take(node, n)
+
+    def _take(self, node, n):
+        keys = []
+        while node is not None and len(keys) < n:
+            keys.append(node.key)
+            node = node.next[0]
+        return keys
@@ -1,6 +1,8 @@
 import app
+from models import Game
 
 import pytest
+import gzip
 import json
 from pprint import pprint
 
@@ -53,3 +55,303 @@ def test_game(client):
 
     # And so on and so forth
 
+
+def test_game_etag(client):
+    resp = client.post('/player',
+                      data=json.dumps(dict(name='wario')),
+                      content_type='application/json')
+    wario = json.loads(resp.data)
+    resp = client.post('/game',
+                      data=json.dumps(dict(players=[wario['id']])),
+                      content_type='application/json')
+    game = json.loads(resp.data)
+    resp = client.get('/game/%s' % game['id'])
+    etag = resp.headers['ETag']
+    assert resp.status_code == 200
+    resp = client.get('/game/%s' % game['id'], headers={'If-None-Match': etag})
+    assert resp.status_code == 304
+    assert resp.data == b''
+    # Posting a frame changes the version
+    resp = client.post('/game/%s/player/%s/frame' % (game['id'], wario['id']),
+                       data=json.dumps(dict(shots=['X', None])),
+                       content_type='application/json')
+    assert resp.headers['ETag'] != etag
+    posted = resp.data
+    resp = client.get('/game/%s' % game['id'], headers={'If-None-Match': etag})
+    assert resp.status_code == 200
+    assert resp.data == posted
+    assert resp.content_type == 'application/json'
+    assert json.loads(resp.data)['totals'] == {str(wario['id']): 0}
+
+def test_game_delta(client):
+    pids = [json.loads(client.post('/player', data=json.dumps(dict(name=name)),
+                                   content_type='application/json').data)['id']
+            for name in ('daisy', 'rosalina')]
+    resp = client.post('/game', data=json.dumps(dict(players=pids)),
+                       content_type='application/json')
+    gid = json.loads(resp.data)['id']
+    for pid, shots in zip(pids, (['X', None], [3, 4])):
+        client.post('/game/%s/player/%s/frame' % (gid, pid),
+                    data=json.dumps(dict(shots=shots)),
+                    content_type='application/json')
+    delta = json.loads(client.get('/game/%s?since=0' % gid).data)
+    assert delta['version'] == 2
+    assert delta['frames'] == [
+        dict(pid=pids[0], frames=[dict(frame=1, score=0, shots=[-1, -3])]),
+        dict(pid=pids[1], frames=[dict(frame=1, score=7, shots=[3, 4])])]
+    assert delta['totals'] == {str(pids[0]): 0, str(pids[1]): 7}
+    # The strike is scored by the spare after it
+    resp = client.post('/game/%s/player/%s/frame?since=2' % (gid, pids[0]),
+                       data=json.dumps(dict(shots=[5, '/'])),
+                       content_type='application/json')
+    delta = json.loads(resp.data)
+    assert (delta['version'], delta['since']) == (3, 2)
+    assert delta['frames'] == [dict(pid=pids[0], frames=[
+        dict(frame=1, score=20, shots=[-1, -3]),
+        dict(frame=2, score=0, shots=[5, -2])])]
+    assert delta['totals'] == {str(pids[0]): 20}
+    assert (delta['current_frame'], delta['current_player']) == (2, pids[1])
+    resp = client.post('/game/%s/player/%s/shot?since=3' % (gid, pids[1]),
+                       data=json.dumps(dict(shot=6)),
+                       content_type='application/json')
+    delta = json.loads(resp.data)
+    assert delta['frames'] == [dict(pid=pids[1], frames=[
+        dict(frame=2, score=0, shots=[6, -4])])]
+    resp = client.get('/game/%s?since=4' % gid)
+    assert json.loads(resp.data)['frames'] == []
+    assert resp.headers['ETag'] == '"%s-4-4"' % gid
+    assert client.get('/game/%s?since=4' % gid, headers={
+        'If-None-Match': resp.headers['ETag']}).status_code == 304
+    # A delta's ETag isn't the full game's, nor another delta's
+    for url in ('/game/%s', '/game/%s?since=3'):
+        assert client.get(url % gid, headers={
+            'If-None-Match': resp.headers['ETag']}).status_code == 200
+    assert client.get('/game/%s?since=4' % gid, headers={
+        'If-None-Match': client.get('/game/%s' % gid).headers['ETag']
+    }).status_code == 200
+    # A version the game hasn't reached gets the full game
+    assert 'players' in json.loads(client.get('/game/%s?since=9' % gid).data)
+    for since in ('-1', 'two'):
+        assert client.get('/game/%s?since=%s' % (gid, since)).status_code == 400
+
+
+def test_game_gzip(client):
+    pids = [json.loads(client.post('/player', data=json.dumps(dict(name='koopa %d' % i)),
+                                   content_type='application/json').data)['id']
+            for i in range(6)]
+    resp = client.post('/game', data=json.dumps(dict(players=pids)),
+                       content_type='application/json')
+    gid = json.loads(resp.data)['id']
+    for _ in range(3):
+        for pid in pids:
+            resp = client.post('/game/%s/player/%s/frame' % (gid, pid),
+                               data=json.dumps(dict(shots=[7, '/'])),
+                               content_type='application/json')
+    plain = client.get('/game/%s' % gid)
+    assert len(plain.data) >= app.app.config['GZIP_MIN_SIZE']
+    assert 'Content-Encoding' not in plain.headers
+    assert 'Accept-Encoding' in plain.headers['Vary']
+    resp = client.get('/game/%s' % gid, headers={'Accept-Encoding': 'gzip, deflate'})
+    assert resp.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(resp.data) == plain.data
+    assert len(resp.data) < len(plain.data) / 3
+    assert resp.headers['ETag'] == 'W/' + plain.headers['ETag']
+    assert app.RestGame.compressed.get((gid, 18)) == resp.data
+    resp = client.get('/game/%s' % gid, headers={
+        'Accept-Encoding': 'gzip', 'If-None-Match': resp.headers['ETag']})
+    assert resp.status_code == 304
+    resp = client.get('/game/%s' % gid, headers={'Accept-Encoding': 'gzip;q=0'})
+    assert 'Content-Encoding' not in resp.headers
+    # Small responses aren't worth it
+    resp = client.get('/game/%s?since=17' % gid, headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in resp.headers
+
+
+def test_bad_frames(client):
+    resp = client.post('/player', data=json.dumps(dict(name='toad')),
+                       content_type='application/json')
+    pid = json.loads(resp.data)['id']
+    resp = client.post('/game', data=json.dumps(dict(players=[pid])),
+                       content_type='application/json')
+    url = '/game/%s/player/%s/frame' % (json.loads(resp.data)['id'], pid)
+    for shots in ([7, 5], ['/', 3], [1, 2, 3], ['Q', 1]):
+        resp = client.post(url, data=json.dumps(dict(shots=shots)),
+                           content_type='application/json')
+        assert resp.status_code == 422
+    resp = client.post(url, data=json.dumps(dict(shots='X')),
+                       content_type='application/json')
+    assert resp.status_code == 400
+    resp = client.post(url, data=json.dumps(dict(shots=[3, 7])))
+    assert resp.status_code == 415
+    resp = client.post(url, data=json.dumps(dict(shots=[3, 7])),
+                       content_type='application/json')
+    assert resp.status_code == 200
+    # 3 then 7 is a spare
+    assert json.loads(resp.data)['frames'][0]['frames'][0]['shots'] == [3, -2]
+    # Frames the game can't take are the client's mistake too
+    for _ in range(Game.FRAMES - 2):
+        resp = client.post(url, data=json.dumps(dict(shots=[1, 2])),
+                           content_type='application/json')
+        assert resp.status_code == 200
+    # A strike in the tenth is owed its fill balls
+    resp = client.post(url, data=json.dumps(dict(shots=['X', None])),
+                       content_type='application/json')
+    assert resp.status_code == 422
+    resp = client.post(url, data=json.dumps(dict(shots=['X', 'X', 'X'])),
+                       content_type='application/json')
+    assert json.loads(resp.data)['complete']
+    resp = client.post(url, data=json.dumps(dict(shots=[1, 2])),
+                       content_type='application/json')
+    assert resp.status_code == 422
+
+def test_shots(client):
+    resp = client.post('/player', data=json.dumps(dict(name='bowser')),
+                       content_type='application/json')
+    pid = json.loads(resp.data)['id']
+    resp = client.post('/game', data=json.dumps(dict(players=[pid])),
+                       content_type='application/json')
+    gid = json.loads(resp.data)['id']
+    url = '/game/%s/player/%s/shot' % (gid, pid)
+    for shot in ('Q', None, True, 11, [1]):
+        resp = client.post(url, data=json.dumps(dict(shot=shot)),
+                           content_type='application/json')
+        assert resp.status_code == 422
+    # A spare on the first ball
+    resp = client.post(url, data=json.dumps(dict(shot='/')),
+                       content_type='application/json')
+    assert resp.status_code == 422
+    for _ in range(Game.FRAMES - 1):
+        resp = client.post('/game/%s/player/%s/frame' % (gid, pid),
+                           data=json.dumps(dict(shots=['X', None])),
+                           content_type='application/json')
+        assert resp.status_code == 200
+    for shot in ('X', 6, '/'):
+        resp = client.post(url, data=json.dumps(dict(shot=shot)),
+                           content_type='application/json')
+        assert resp.status_code == 200
+    game = json.loads(resp.data)
+    assert game['complete']
+    assert game['totals'] == {str(pid): 286}
+    assert game['frames'][0]['frames'][9]['shots'] == [-1, 6, -2]
+    resp = client.post(url, data=json.dumps(dict(shot=0)),
+                       content_type='application/json')
+    assert resp.status_code == 422
+
+
+def test_frame_batch(client):
+    ids = []
+    for name in ('peach', 'daisy'):
+        resp = client.post('/player',
+                          data=json.dumps(dict(name=name)),
+                          content_type='application/json')
+        ids.append(json.loads(resp.data)['id'])
+    resp = client.post('/game',
+                      data=json.dumps(dict(players=ids)),
+                      content_type='application/json')
+    game = json.loads(resp.data)
+    url = '/game/%s/frames' % game['id']
+    frames = [dict(pid=ids[0], shots=['X', None]),
+              dict(pid=ids[1], shots=[7, '/']),
+              dict(pid=ids[0], shots=[3, 4])]
+    # Out of turn at the end - nothing gets posted
+    resp = client.post(url, data=json.dumps(dict(frames=frames + frames[:1])),
+                       content_type='application/json')
+    assert resp.status_code == 422
+    assert json.loads(resp.data)['message'].startswith('Frame 3:')
+    resp = client.post(url, data=json.dumps(dict(frames=[frames[0], dict(pid=ids[1], shots=['Q', 1])])),
+                       content_type='application/json')
+    assert resp.status_code == 422
+    resp = client.post(url, data=json.dumps(dict(frames=[dict(shots=[1, 2])])),
+                       content_type='application/json')
+    assert resp.status_code == 400
+    assert json.loads(client.get('/game/%s' % game['id']).data)['started'] == False
+    resp = client.post(url, data=json.dumps(dict(frames=frames)),
+                       content_type='application/json')
+    game = json.loads(resp.data)
+    assert resp.status_code == 200
+    assert game['totals'] == {str(ids[0]): 24, str(ids[1]): 0}
+    assert game['current_player']['id'] == ids[1]
+    assert game['current_frame'] == 2
+
+def test_stats_and_leaderboard(client):
+    ids = []
+    for name in ('bowser', 'koopa'):
+        resp = client.post('/player',
+                          data=json.dumps(dict(name=name)),
+                          content_type='application/json')
+        ids.append(json.loads(resp.data)['id'])
+    stats = json.loads(client.get('/player/%s/stats' % ids[0]).data)
+    assert (stats['games'], stats['rank']) == (0, None)
+    resp = client.post('/game',
+                      data=json.dumps(dict(players=ids)),
+                      content_type='application/json')
+    game = json.loads(resp.data)
+    frames = [dict(pid=ids[0], shots=[9, 0]), dict(pid=ids[1], shots=[1, 1])] * 10
+    resp = client.post('/game/%s/frames' % game['id'],
+                       data=json.dumps(dict(frames=frames)),
+                       content_type='application/json')
+    assert json.loads(resp.data)['complete'] == True
+    stats = json.loads(client.get('/player/%s/stats' % ids[0]).data)
+    assert stats['games'] == 1
+    assert stats['average'] == stats['high'] == stats['pins'] == 90
+    assert stats['strikes'] == stats['spares'] == 0
+    board = json.loads(client.get('/leaderboard?top=1000').data)['players']
+    ranked = [p for p in board if p['pid'] in ids]
+    assert [(p['name'], p['average']) for p in ranked] == [('bowser', 90), ('koopa', 20)]
+    assert ranked[0]['rank'] == stats['rank']
+    assert [p['rank'] for p in board] == list(range(1, len(board) + 1))
+    assert len(json.loads(client.get('/leaderboard').data)['players']) <= 10
+    assert client.get('/leaderboard?top=-1').status_code == 400
+    assert client.get('/leaderboard?top=many').status_code == 400
+    assert client.get('/player/0/stats').status_code == 404
+
+def test_game_listing(client):
+    ids = []
+    for name in ('yoshi', 'birdo'):
+        resp = client.post('/player',
+                          data=json.dumps(dict(name=name)),
+                          content_type='application/json')
+        ids.append(json.loads(resp.data)['id'])
+    games = []
+    for players in ([ids[0]], ids, [ids[1]], [ids[0]]):
+        resp = client.post('/game',
+                          data=json.dumps(dict(players=players)),
+                          content_type='application/json')
+        games.append(json.loads(resp.data)['id'])
+    client.post('/game/%s/frames' % games[0],
+                data=json.dumps(dict(frames=[dict(pid=ids[0], shots=[1, 2])] * 10)),
+                content_type='application/json')
+    listing = json.loads(client.get('/player/%s/games?limit=2' % ids[0]).data)
+    assert [g['id'] for g in listing['games']] == games[:2]
+    assert listing['next'] == games[1]
+    assert 'frames' not in listing['games'][0]
+    assert listing['games'][0]['complete'] == True
+    listing = json.loads(client.get('/player/%s/games?limit=2&after=%s' %
+                                    (ids[0], listing['next'])).data)
+    assert [g['id'] for g in listing['games']] == games[3:]
+    assert listing['next'] is None
+    listing = json.loads(client.get('/player/%s/games?status=active' % ids[0]).data)
+    assert [g['id'] for g in listing['games']] == [games[1], games[3]]
+    listing = json.loads(client.get('/games?limit=100&after=%s' % games[0]).data)
+    assert [g['id'] for g in listing['games']][:3] == games[1:]
+    assert client.get('/games?limit=0').status_code == 400
+    assert client.get('/games?status=done').status_code == 400
+    assert client.get('/games?after=0').status_code == 400
+    assert client.get('/player/0/games').status_code == 404
+
+def test_metrics(client):
+    client.post('/player', data=json.dumps(dict(name='yoshi')),
+                content_type='application/json')
+    client.get('/player/0')
+    resp = client.get('/metrics')
+    assert resp.status_code == 200
+    assert resp.content_type.startswith('text/plain; version=0.0.4')
+    text = resp.data.decode('utf-8')
+    assert ('bowling_request_seconds_count{resource="restplayer",method="POST",'
+            'status="200"}') in text
+    assert ('bowling_request_seconds_count{resource="restplayer",method="GET",'
+            'status="404"}') in text
+    assert 'bowling_step_seconds_count{step="parse"}' in text
+    assert 'bowling_step_seconds_count{step="marshal"}' in text
+    assert '\nbowling_players ' in text
+    assert '\nprocess_resident_memory_bytes ' in text
@@ -0,0 +1,171 @@
+import app
+import asgi
+import bulk
+from persistence import DB
+
+import asyncio
+import gzip
+import json
+import threading
+
+import pytest
+
+
+class Response(object):
+    def __init__(self, status, headers, data):
+        self.status_code = status
+        self.headers = dict((k.decode('latin-1'), v.decode('latin-1'))
+                            for k, v in headers)
+        self.data = data
+
+
+def call(method, path, body=None, headers=(), chunks=None):
+    """ Send a request straight to the ASGI app.  The body is JSON, or
+    `chunks` of bytes. """
+    if '?' in path:
+        path, query = path.split('?', 1)
+    else:
+        query = ''
+    headers = [(k.lower().encode('latin-1'), v.encode('latin-1'))
+               for k, v in headers]
+    if body is not None:
+        chunks = [json.dumps(body).encode('utf-8')]
+        headers.append((b'content-type', b'application/json'))
+    messages = [{'type': 'http.request', 'body': c, 'more_body': True}
+                for c in chunks or []]
+    messages.append({'type': 'http.request', 'body': b''})
+    sent = []
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await asyncio.sleep(3600)
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {'type': 'http', 'method': method, 'path': path,
+             'query_string': query.encode('latin-1'), 'headers': headers,
+             'http_version': '1.1', 'scheme': 'http',
+             'server': ('localhost', 80), 'client': ('127.0.0.1', 1234)}
+    asyncio.run(asgi.application(scope, receive, send))
+    assert sent[0]['type'] == 'http.response.start'
+    return Response(sent[0]['status'], sent[0]['headers'],
+                    b''.join(m.get('body', b'') for m in sent[1:]))
+
+
+@pytest.fixture(scope='module')
+def client():
+    return app.app.test_client()
+
+
+def test_players(client):
+    resp = call('POST', '/player', dict(name='andy'))
+    assert resp.status_code == 200
+    assert resp.headers['content-type'] == 'application/json'
+    andy = json.loads(resp.data)
+    assert andy['name'] == 'andy'
+    resp = call('GET', '/player/%d' % andy['id'])
+    assert resp.data == client.get('/player/%d' % andy['id']).data
+    for flask, resp in [(client.get('/player/999999'), call('GET', '/player/999999')),
+                        (client.post('/player', data='andy', content_type='text/plain'),
+                         call('POST', '/player', chunks=[b'andy'],
+                              headers=[('Content-Type', 'text/plain')])),
+                        (client.post('/player', json={}), call('POST', '/player', {}))]:
+        assert resp.status_code == flask.status_code
+        assert resp.data == flask.data
+
+
+def test_game(client):
+    mario = json.loads(call('POST', '/player', dict(name='mario')).data)
+    luigi = json.loads(call('POST', '/player', dict(name='luigi')).data)
+    resp = call('POST', '/game', dict(players=[mario['id'], luigi['id']]))
+    game = json.loads(resp.data)
+    assert game['players'] == [mario, luigi]
+    assert game['started'] is False
+    gid = game['id']
+    resp = call('GET', '/game/%d' % gid)
+    flask = client.get('/game/%d' % gid)
+    assert resp.data == flask.data
+    assert resp.headers['etag'] == flask.headers['ETag']
+
+    frame = '/game/%d/player/%%d/frame' % gid
+    resp = call('POST', frame % mario['id'], dict(shots=[4, 5]))
+    assert resp.status_code == 200
+    game = json.loads(resp.data)
+    assert game['current_player']['id'] == luigi['id']
+    assert game['totals'] == {str(mario['id']): 9, str(luigi['id']): 0}
+    assert resp.data == client.get('/game/%d' % gid).data
+    # Controller errors come back as they do from Flask
+    for shots, status in [([7, 7], 422), ([7, 1], 422)]:
+        resp = call('POST', frame % mario['id'], dict(shots=shots))
+        flask = client.post(frame % mario['id'], json=dict(shots=shots))
+        assert resp.status_code == flask.status_code == status
+        assert resp.data == flask.data
+    resp = call('POST', '/game/999999/player/%d/frame' % mario['id'],
+                dict(shots=[1, 2]))
+    assert resp.status_code == 422
+
+    # ETags, deltas and gzip
+    etag = call('GET', '/game/%d' % gid).headers['etag']
+    resp = call('GET', '/game/%d' % gid, headers=[('If-None-Match', etag)])
+    assert resp.status_code == 304
+    assert resp.data == b''
+    resp = call('POST', (frame % luigi['id']) + '?since=1', dict(shots=[7, '/']))
+    assert resp.data == client.get('/game/%d?since=1' % gid).data
+    assert json.loads(resp.data)['since'] == 1
+    resp = call('GET', '/game/%d?since=1' % gid)
+    assert resp.headers['etag'] == client.get('/game/%d?since=1' % gid).headers['ETag']
+    assert resp.headers['etag'] != etag
+    assert call('GET', '/game/%d?since=1' % gid,
+                headers=[('If-None-Match', resp.headers['etag'])]).status_code == 304
+    assert call('GET', '/game/%d' % gid,
+                headers=[('If-None-Match', resp.headers['etag'])]).status_code == 200
+    assert call('GET', '/game/%d?since=-1' % gid).status_code == 400
+
+
+def test_blocking_reads(monkeypatch):
+    """ Lookups run on a writer thread when the storage's reads can wait """
+    mario = json.loads(call('POST', '/player', dict(name='mario')).data)
+    gid = json.loads(call('POST', '/game', dict(players=[mario['id']])).data)['id']
+    threads = []
+    for controller in (asgi.pc, asgi.gc):
+        monkeypatch.setattr(controller, 'get', lambda id, get=controller.get: (
+            threads.append(threading.current_thread().name) or get(id)))
+    for blocking in (False, True):
+        monkeypatch.setattr(DB.storage, 'blocking_reads', blocking)
+        del threads[:]
+        assert call('GET', '/player/%d' % mario['id']).status_code == 200
+        assert call('GET', '/game/%d' % gid).status_code == 200
+        assert [t.startswith('asgi-writer') for t in threads] == [blocking] * 2
+
+
+def test_gzip(client):
+    players = [json.loads(call('POST', '/player', dict(name='toad %d' % i)).data)['id']
+               for i in range(6)]
+    gid = json.loads(call('POST', '/game', dict(players=players)).data)['id']
+    for pid in players * 5:
+        call('POST', '/game/%d/player/%d/frame' % (gid, pid), dict(shots=[7, '/']))
+    resp = call('GET', '/game/%d' % gid, headers=[('Accept-Encoding', 'gzip')])
+    flask = client.get('/game/%d' % gid, headers={'Accept-Encoding': 'gzip'})
+    assert resp.headers['content-encoding'] == 'gzip'
+    assert resp.headers['etag'] == flask.headers['ETag']
+    assert resp.data == flask.data
+    assert gzip.decompress(resp.data) == call('GET', '/game/%d' % gid).data
+
+
+def test_passed_on(client):
+    """ Routes the ASGI app doesn't serve itself go to the Flask app """
+    for path in ('/leaderboard', '/games?limit=5', '/games?limit=0',
+                 '/nowhere'):
+        resp = call('GET', path)
+        flask = client.get(path)
+        assert resp.status_code == flask.status_code
+        assert resp.data == flask.data
+    # Streamed both ways
+    assert call('GET', '/export').data == client.get('/export').data
+    export = client.get('/export').data.splitlines(True)
+    resp = call('POST', '/import', chunks=export,
+                headers=[('Content-Type', bulk.MIMETYPES['ndjson'])])
+    assert resp.status_code == 200
+    assert json.loads(resp.data)['games'] == sum(b'"game"' in l for l in export)
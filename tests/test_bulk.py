@@ -0,0 +1,226 @@
+import app
+import bulk
+import ids
+from indexes import game_index
+from leaderboard import leaderboard
+from models import Player, Game, Frame
+from persistence import (DB, MemoryStorage, SQLiteStorage, JournalStorage,
+                         SharedMemoryStorage, TieredStorage)
+
+import json
+
+import pytest
+
+
+STRIKE = [Frame.Shot.strike, Frame.Shot.nil]
+SPARE = [Frame.Shot.five, Frame.Shot.spare]
+OPEN = [Frame.Shot.four, Frame.Shot.three]
+
+
+def make(backend, tmpdir):
+    if backend == 'sqlite':
+        return SQLiteStorage(str(tmpdir.join('bowling.db')))
+    if backend == 'journal':
+        return JournalStorage(str(tmpdir.join('bowling.journal')))
+    if backend == 'shared':
+        return SharedMemoryStorage(str(tmpdir.join('bowling.shm')), players=16,
+                                   games=16)
+    if backend == 'tiered':
+        return TieredStorage(str(tmpdir.join('bowling.archive')), max_hot=1)
+    return MemoryStorage()
+
+
+@pytest.fixture
+def db():
+    """ A DB of its own to fill, with the app's put back afterwards """
+    old = DB.storage
+    DB.storage = None
+    DB.use(MemoryStorage())
+    yield DB
+    DB.storage.close()
+    DB.storage = None
+    DB.use(old)
+
+
+def fill():
+    """ Players, and games complete, in progress, mid-frame and not started """
+    mario, luigi, peach = [DB.add(Player(name))
+                           for name in ('mario', 'luigi', 'peach')]
+    done = DB.add(Game([mario, luigi]))
+    for i in range(Game.FRAMES - 1):
+        done.post_frame(mario, STRIKE)
+        done.post_frame(luigi, SPARE)
+    done.post_frame(mario, [Frame.Shot.strike] * 3)
+    done.post_frame(luigi, SPARE + [Frame.Shot.five])
+    playing = DB.add(Game([mario, luigi]))
+    for player, shots in ((mario, OPEN), (luigi, SPARE), (mario, STRIKE),
+                          (luigi, OPEN), (mario, OPEN)):
+        playing.post_frame(player, shots)
+    playing.post_shot(luigi, 7)
+    shots = DB.add(Game([peach]))
+    for shot in [7, '/'] * 9 + ['X', 7, '/']:
+        shots.post_shot(peach, shot)
+    DB.add(Game([luigi, peach]))
+    # Posted straight to the games - catch the listings and leaderboard up
+    game_index.rebuild(DB.get(Game).values())
+    leaderboard.rebuild(DB.get(Game).values())
+    return [done, playing, shots]
+
+
+def state(game):
+    """ What a game should look like after a round trip """
+    return ([p.id for p in game.players], game.complete, game.current_frame,
+            game.current_player and game.current_player.id,
+            [(r.rolls.tobytes(), list(r.scores), r.complete, r.total)
+             for r in (game.get_rolls(p.id) for p in game.players)])
+
+
+@pytest.mark.parametrize('backend', ['memory', 'sqlite', 'journal', 'shared',
+                                     'tiered'])
+def test_round_trip(db, tmpdir, backend):
+    fill()
+    players = dict((p.id, p.name) for p in DB.get(Player).values())
+    games = [state(g) for g in DB.get(Game).values()]
+    export = b''.join(bulk.export(batch=2))
+    assert len(export.splitlines()) == 3 + 4
+    assert b''.join(bulk.export(batch=1000)) == export
+
+    DB.use(make(backend, tmpdir))
+    assert bulk.load(export.splitlines(True), batch=3) == (3, 4)
+    assert dict((p.id, p.name) for p in DB.get(Player).values()) == players
+    assert sorted(state(g) for g in DB.get(Game).values()) == sorted(games)
+    assert b''.join(bulk.export()) == export
+    # Leaderboard and listings are up to date
+    assert leaderboard.get(min(players)).games == 1
+    assert len(game_index.page(limit=10, active=True)) == 2
+    if backend in ('sqlite', 'journal', 'shared'):
+        DB.use(make(backend, tmpdir))
+        assert sorted(state(g) for g in DB.get(Game).values()) == sorted(games)
+
+
+def test_players_in_order(db, tmpdir):
+    """ Players are exported by ID, whatever order the backend keeps them in
+    """
+    DB.use(make('shared', tmpdir))
+    lines = [json.dumps(dict(type='player', id=pid, name='p%d' % pid))
+             for pid in (3, 17)]
+    bulk.load(lines)
+    assert [p.id for p in bulk.players()] == [3, 17]
+
+
+def test_export_shared(db, tmpdir):
+    """ An export has the games other workers added since this one started
+    """
+    path = str(tmpdir.join('bowling.shm'))
+    DB.use(SharedMemoryStorage(path, players=16, games=16))
+    mine = DB.add(Game([DB.add(Player('mario'))]))
+    # Another worker's, not in this one's listings
+    other = SharedMemoryStorage(path, players=16, games=16)
+    luigi = Player('luigi')
+    other.add(luigi)
+    theirs = Game([luigi])
+    other.add(theirs)
+    other.close()
+    records = [json.loads(line) for line in b''.join(bulk.export()).splitlines()]
+    assert [(r['type'], r['id']) for r in records] == [
+        ('player', mine.players[0].id), ('player', luigi.id),
+        ('game', mine.id), ('game', theirs.id)]
+
+
+def test_rolls(db):
+    done, playing, shots = fill()
+    lines = b''.join(bulk.export('rolls', batch=1)).decode('ascii').splitlines()
+    assert lines[0] == 'gid,pid,frame,roll,pins'
+    rows = [tuple(int(v) for v in line.split(',')) for line in lines[1:]]
+    mario, luigi = [p.id for p in done.players]
+    peach = shots.players[0].id
+    # Rolls in the order they were made
+    assert [r for r in rows if r[0] == done.id][:4] == [
+        (done.id, mario, 1, 1, 10), (done.id, luigi, 1, 1, 5),
+        (done.id, luigi, 1, 2, 5), (done.id, mario, 2, 1, 10)]
+    assert [r[2:] for r in rows if r[0] == done.id][-6:] == [
+        (10, 1, 10), (10, 2, 10), (10, 3, 10), (10, 1, 5), (10, 2, 5),
+        (10, 3, 5)]
+    assert [r[1:] for r in rows if r[0] == playing.id][-3:] == [
+        (mario, 3, 1, 4), (mario, 3, 2, 3), (luigi, 3, 1, 7)]
+    assert [r[1:] for r in rows if r[0] == shots.id][-3:] == [
+        (peach, 10, 1, 10), (peach, 10, 2, 7), (peach, 10, 3, 3)]
+
+
+def test_load_errors(db):
+    lines = [
+        json.dumps(dict(type='player', id=1, name='mario')),
+        json.dumps(dict(type='game', id=2, players=[1], frames=[[['X', None]]])),
+        '',
+        json.dumps(dict(type='game', id=3, players=[1], frames=[[[7, 7]]])),
+        json.dumps(dict(type='player', id=4, name='luigi')),
+    ]
+    with pytest.raises(ValueError) as e:
+        bulk.load(lines)
+    assert str(e.value).startswith('Line 4: ')
+    # Everything before the bad line is loaded
+    assert list(DB.get(Player)) == [1]
+    assert DB.get(Game)[2].totals[1] == 0
+
+    for record, error in [
+            ('{"type": "game", "id": 5, "players": [99], "frames": []}',
+             'Unknown player 99'),
+            ('{"type": "game", "id": 5, "players": [1], "frames": [[["X", null]]],'
+             ' "totals": [10]}', 'Totals [10] do not match the frames'),
+            ('{"type": "frame"}', 'Unknown record type frame'),
+            ('{"type": "player"}', "Missing 'name'"),
+            ('{"type": ', None)]:
+        with pytest.raises(ValueError) as e:
+            bulk.load([record])
+        assert str(e.value).startswith('Line 1: ')
+        if error:
+            assert str(e.value) == 'Line 1: ' + error
+
+
+def test_load_advances(db, monkeypatch):
+    """ IDs are advanced once a batch - and before a clashing player is given
+    a new ID, so it can't be one kept in the batch """
+    advanced = []
+    advance = ids.advance
+    monkeypatch.setattr(ids, 'advance', lambda id: advanced.append(id) or
+                        advance(id))
+    mario = DB.add(Player('mario'))
+    top = mario.id + 1000
+    lines = [json.dumps(dict(type='player', id=top + i, name='p%d' % i))
+             for i in range(5)]
+    assert bulk.load(lines, batch=10) == (5, 0)
+    assert advanced == [top + 4]
+    del advanced[:]
+    lines = [json.dumps(dict(type='player', id=top + 10, name='toad')),
+             json.dumps(dict(type='player', id=mario.id, name='peach'))]
+    assert bulk.load(lines, batch=10) == (2, 0)
+    peach = [p for p in DB.get(Player).values() if p.name == 'peach'][0]
+    assert peach.id > top + 10
+    assert advanced == [top + 10, peach.id]
+
+
+def test_routes(db):
+    fill()
+    client = app.app.test_client()
+    resp = client.get('/export')
+    assert resp.mimetype == 'application/x-ndjson'
+    export = resp.data
+    assert export == b''.join(bulk.export())
+    resp = client.get('/export?format=rolls')
+    assert resp.mimetype == 'text/csv'
+    assert resp.data.startswith(b'gid,pid,frame,roll,pins\n')
+    assert client.get('/export?format=xml').status_code == 400
+
+    # Clashing IDs are renumbered
+    resp = client.post('/import', data=export,
+                       content_type='application/x-ndjson')
+    assert resp.status_code == 200
+    assert json.loads(resp.data) == dict(players=3, games=4)
+    assert len(DB.get(Player)) == 6
+    assert len(DB.get(Game)) == 8
+    resp = client.post('/import', data=export, content_type='application/json')
+    assert resp.status_code == 415
+    resp = client.post('/import', data=b'{"type": "game"}\n',
+                       content_type='application/x-ndjson')
+    assert resp.status_code == 422
+    assert json.loads(resp.data)['message'] == "Line 1: Missing 'players'"
@@ -0,0 +1,18 @@
+from cache import LRUCache
+
+
+def test_lru():
+    c = LRUCache(2)
+    c.put('a', 1)
+    c.put('b', 2)
+    assert c.get('a') == 1
+    c.put('c', 3)
+    # 'b' was the least recently used
+    assert 'b' not in c
+    assert c.get('b') is None
+    assert c.get('c') == 3
+    assert len(c) == 2
+    assert (c.hits, c.misses) == (2, 1)
+    assert c.hit_rate() == 2.0 / 3
+    c.clear()
+    assert len(c) == 0 and c.hits == 0
@@ -0,0 +1,154 @@
+import app
+from models import Game, Frame, Player
+from persistence import DB, SharedMemoryStorage
+from benchmarks.frames import tenth
+
+import json
+import multiprocessing
+import os
+import random
+import sys
+import threading
+
+import pytest
+
+
+FRAMES = [[3, 4], ['X', None], [5, '/'], [9, 0], [0, 0], ['X', None]]
+
+
+def post(client, url, data):
+    return client.post(url, data=json.dumps(data),
+                       content_type='application/json')
+
+
+def roll(client, gid, pid, shots, errors):
+    """ Keep posting the same frame for a player until they've had all ten.
+    Posting out of turn is refused, so just try again. """
+    posted = 0
+    while posted < Game.FRAMES:
+        resp = post(client, '/game/%d/player/%d/frame' % (gid, pid),
+                    dict(shots=shots if posted < Game.FRAMES - 1 else tenth(shots)))
+        if resp.status_code == 200:
+            posted += 1
+        elif resp.status_code != 422:
+            errors.append(resp.data)
+            return
+
+
+def watch(client, gids, done, errors):
+    """ Check that every game read is consistent: each player's total is the
+    sum of their frames """
+    while not done.is_set():
+        for gid in gids:
+            game = json.loads(client.get('/game/%d' % gid).data)
+            for frames in game['frames']:
+                total = sum(f['score'] for f in frames['frames'])
+                if total != game['totals'][str(frames['pid'])]:
+                    errors.append(game)
+
+
+@pytest.fixture
+def switchy():
+    """ Switch threads as often as possible, to shake out races """
+    if not hasattr(sys, 'setswitchinterval'):
+        yield
+        return
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(interval)
+
+
+def make_games(client, count, seed):
+    """ Make games of 2-4 players, each of whom always rolls the same frame.
+    Returns a list of (game ID, [(player ID, shots)]). """
+    rng = random.Random(seed)
+    games = []
+    for i in range(count):
+        pids = [json.loads(post(client, '/player', dict(name='t%d' % j)).data)['id']
+                for j in range(rng.randint(2, 4))]
+        gid = json.loads(post(client, '/game', dict(players=pids)).data)['id']
+        games.append((gid, [(pid, rng.choice(FRAMES)) for pid in pids]))
+    return games
+
+
+def check_games(client, games):
+    """ Check games came out the same as playing them on a single thread """
+    for gid, players in games:
+        game = json.loads(client.get('/game/%d' % gid).data)
+        assert game['complete']
+        refs = [Player('r') for _ in players]
+        for i, player in enumerate(refs):
+            player.id = i
+        reference = Game(refs)
+        for i in range(Game.FRAMES):
+            for player, (_, shots) in zip(reference.players, players):
+                if i == Game.FRAMES - 1:
+                    shots = tenth(shots)
+                reference.post_frame(player, Frame.decode(shots))
+        for player, (pid, _) in zip(reference.players, players):
+            assert game['totals'][str(pid)] == reference.totals[player.id]
+
+
+def test_concurrent_posts(switchy):
+    client = app.app.test_client()
+    games = make_games(client, 8, 7)
+    errors = []
+    done = threading.Event()
+    gids = [gid for gid, _ in games]
+    watchers = [threading.Thread(target=watch, args=(app.app.test_client(),
+                                                     gids, done, errors))
+                for _ in range(2)]
+    rollers = [threading.Thread(target=roll, args=(app.app.test_client(),
+                                                   gid, pid, shots, errors))
+               for gid, players in games for pid, shots in players]
+    for t in watchers + rollers:
+        t.start()
+    for t in rollers:
+        t.join()
+    done.set()
+    for t in watchers:
+        t.join()
+    assert errors == []
+    check_games(client, games)
+
+
+def worker(games, seat):
+    """ Roll for the player in `seat` of every game, and watch the games, from
+    a process of its own """
+    errors = []
+    done = threading.Event()
+    watcher = threading.Thread(target=watch, args=(
+        app.app.test_client(), [gid for gid, _ in games], done, errors))
+    rollers = [threading.Thread(target=roll, args=(app.app.test_client(), gid,
+                                                   players[seat][0],
+                                                   players[seat][1], errors))
+               for gid, players in games if seat < len(players)]
+    for t in rollers + [watcher]:
+        t.start()
+    for t in rollers:
+        t.join()
+    done.set()
+    watcher.join()
+    sys.exit(1 if errors else 0)
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs fork')
+def test_worker_processes(tmpdir):
+    old = DB.storage
+    DB.use(SharedMemoryStorage(str(tmpdir.join('bowling.shm')), players=100,
+                               games=20, max_players=4))
+    try:
+        client = app.app.test_client()
+        games = make_games(client, 8, 11)
+        ctx = multiprocessing.get_context('fork')
+        workers = [ctx.Process(target=worker, args=(games, seat))
+                   for seat in range(4)]
+        for p in workers:
+            p.start()
+        for p in workers:
+            p.join()
+        assert [p.exitcode for p in workers] == [0] * 4
+        check_games(client, games)
+    finally:
+        DB.use(old)
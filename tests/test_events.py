@@ -0,0 +1,78 @@
+from controllers import PlayerController, GameController
+from events import Channel, hub, stream
+import app
+
+import json
+import pytest
+
+
+def make_game(players=2):
+    pids = [PlayerController.create('player %d' % i).id for i in range(players)]
+    return GameController.create(pids), pids
+
+
+def render(game):
+    return json.dumps({'id': game.id, 'version': game.version})
+
+
+def parse(event):
+    fields = dict(line.split(': ', 1) for line in event.strip().split('\n'))
+    return fields['event'], int(fields['id']), json.loads(fields['data'])
+
+
+def test_channel_history():
+    c = Channel(history=2)
+    assert c.since(0) is None
+    c.publish(1, 'one')
+    c.publish(2, 'two')
+    assert c.since(0) == [(1, 'one'), (2, 'two')]
+    assert c.since(2) == []
+    c.publish(3, 'three')
+    # Version 1 has fallen out of the history
+    assert c.since(0) is None
+    assert c.since(1) == [(2, 'two'), (3, 'three')]
+
+
+def test_stream():
+    game, pids = make_game()
+    events = stream(game, None, render, heartbeat=0.01)
+    assert next(events).startswith('retry:')
+    assert parse(next(events)) == ('game', 0, {'id': game.id, 'version': 0})
+    assert next(events) == ': heartbeat\n\n'
+    GameController.frame_for_player(game.id, pids[0], ['X', None])
+    GameController.frame_for_player(game.id, pids[1], [4, 5])
+    kind, version, update = parse(next(events))
+    assert (kind, version) == ('frame', 1)
+    assert update['pid'] == pids[0]
+    assert update['frames'] == [{'frame': 1, 'score': 0, 'shots': [-1, -3]}]
+    assert update['current_player'] == pids[1]
+    kind, version, update = parse(next(events))
+    assert (version, update['total']) == (2, 9)
+
+    # Resume from version 1
+    GameController.frame_for_player(game.id, pids[0], [3, 4])
+    resumed = stream(game, 1, render)
+    next(resumed)
+    kind, version, update = parse(next(resumed))
+    assert (kind, version) == ('frame', 2)
+    kind, version, update = parse(next(resumed))
+    assert (kind, version, update['total']) == ('frame', 3, 24)
+    assert update['frames'][0] == {'frame': 1, 'score': 17, 'shots': [-1, -3]}
+    resumed.close()
+    events.close()
+    assert not hub.channel(game.id).callbacks
+
+
+def test_stream_endpoint():
+    client = app.app.test_client()
+    game, pids = make_game(1)
+    GameController.frames_for_game(game.id, [(pids[0], [1, 1])] * 10)
+    resp = client.get('/game/%d/events' % game.id)
+    assert resp.content_type.startswith('text/event-stream')
+    # The game is complete, so the stream ends after the full game
+    body = resp.get_data(as_text=True).split('\n\n')
+    kind, version, data = parse(body[1])
+    assert (kind, version, data['totals']) == ('game', 10, {str(pids[0]): 20})
+    resp = client.get('/game/%d/events' % game.id, headers={'Last-Event-ID': '10'})
+    assert 'event:' not in resp.get_data(as_text=True)
+    assert client.get('/game/%d/events?since=x' % game.id).status_code == 400
@@ -0,0 +1,118 @@
+import ids
+from models import Player, Game
+
+import multiprocessing
+import os
+import threading
+from array import array
+
+import pytest
+
+
+PROCESSES = 4
+PER_PROCESS = 500000
+
+
+def allocate(args):
+    kind, arg, count = args
+    if kind == 'block':
+        allocator = ids.BlockAllocator(arg, block_size=1000)
+    else:
+        allocator = ids.SnowflakeAllocator(worker=arg)
+    return array('q', [allocator.allocate() for _ in range(count)]).tobytes()
+
+
+def allocate_in_processes(jobs):
+    ctx = multiprocessing.get_context('fork')
+    pool = ctx.Pool(len(jobs))
+    try:
+        results = pool.map(allocate, jobs)
+    finally:
+        pool.close()
+        pool.join()
+    allocated = array('q')
+    for result in results:
+        got = array('q')
+        got.frombytes(result)
+        # Every allocator only counts up
+        assert list(got) == sorted(got)
+        allocated.extend(got)
+    return allocated
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs fork')
+def test_block_processes(tmpdir):
+    path = str(tmpdir.join('bowling.ids'))
+    allocated = allocate_in_processes([('block', path, PER_PROCESS)] * PROCESSES)
+    assert len(set(allocated)) == PROCESSES * PER_PROCESS
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs fork')
+def test_snowflake_processes():
+    allocated = allocate_in_processes([('snowflake', worker, PER_PROCESS)
+                                       for worker in range(PROCESSES)])
+    assert len(set(allocated)) == PROCESSES * PER_PROCESS
+    assert all(0 < id < 2 ** 63 for id in allocated)
+
+
+@pytest.mark.parametrize('kind', ['counter', 'block', 'snowflake'])
+def test_threads(kind, tmpdir):
+    allocator = ids.allocators[kind].from_config(
+        {'ID_BLOCK_PATH': str(tmpdir.join('bowling.ids')), 'ID_BLOCK_SIZE': 7})
+    results = [[] for _ in range(8)]
+    threads = [threading.Thread(target=lambda r: r.extend(
+                   allocator.allocate() for _ in range(20000)), args=(r,))
+               for r in results]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    allocated = [id for r in results for id in r]
+    assert len(set(allocated)) == len(allocated)
+
+
+@pytest.mark.parametrize('kind', ['counter', 'block', 'snowflake'])
+def test_advance(kind, tmpdir):
+    allocator = ids.allocators[kind].from_config(
+        {'ID_BLOCK_PATH': str(tmpdir.join('bowling.ids'))})
+    first = allocator.allocate()
+    allocator.advance(first + 10 ** 6)
+    assert allocator.allocate() > first + 10 ** 6
+    # Advancing backwards does nothing
+    last = allocator.allocate()
+    allocator.advance(first)
+    assert allocator.allocate() > last
+
+
+def test_block_shared(tmpdir):
+    path = str(tmpdir.join('bowling.ids'))
+    a = ids.BlockAllocator(path, block_size=10)
+    b = ids.BlockAllocator(path, block_size=10)
+    assert [a.allocate(), b.allocate(), a.allocate()] == [1, 11, 2]
+
+
+def test_block_advance_within(tmpdir):
+    """ Advancing to an ID in the current block skips ahead in it, without
+    reserving another """
+    path = str(tmpdir.join('bowling.ids'))
+    a = ids.BlockAllocator(path, block_size=10)
+    b = ids.BlockAllocator(path, block_size=10)
+    assert a.allocate() == 1
+    a.advance(5)
+    a.advance(2)
+    assert a.allocate() == 6
+    assert b.allocate() == 11
+    # Past the end, it does
+    a.advance(15)
+    assert a.allocate() == 21
+
+
+def test_models_use_allocator():
+    old = ids.allocator
+    try:
+        ids.use(ids.CounterAllocator(500))
+        p = Player('mario')
+        g = Game([p])
+        assert (p.id, g.id) == (500, 501)
+    finally:
+        ids.use(old)
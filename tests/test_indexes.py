@@ -0,0 +1,67 @@
+from models import Player, Game, Frame
+from indexes import GameIndex
+
+import pytest
+
+
+def make_games(players, count):
+    games = []
+    for i in range(count):
+        g = Game([players[i % len(players)], players[(i + 1) % len(players)]])
+        g.id = 1000 - i # Not in creation order
+        games.append(g)
+    return games
+
+
+def complete(game):
+    for _ in range(Game.FRAMES):
+        for player in game.players:
+            game.post_frame(player, [Frame.Shot.one, Frame.Shot.two])
+
+
+def pages(index, **kwargs):
+    """ Page through an index, 3 at a time """
+    gids = []
+    after = None
+    while True:
+        page = index.page(after, 3, **kwargs)
+        gids.extend(page)
+        if len(page) < 3:
+            return gids
+        after = page[-1]
+
+
+def test_index():
+    players = [Player('p%d' % i) for i in range(3)]
+    games = make_games(players, 10)
+    index = GameIndex()
+    for g in games:
+        index.add(g)
+    gids = [g.id for g in games]
+    assert pages(index) == gids
+    assert index.page(gids[4], 2) == gids[5:7]
+    assert pages(index, pid=players[0].id) == [g.id for g in games
+                                               if players[0] in g.players]
+    assert pages(index, active=True) == gids
+    for g in games[::3]:
+        complete(g)
+        index.completed(g)
+    active = [g.id for g in games if not g.complete]
+    assert pages(index, active=True) == active
+    assert index.page(gids[0], 2, active=True) == active[:2]
+    assert pages(index, pid=players[1].id, active=True) == [
+        g.id for g in games if players[1] in g.players and not g.complete]
+    assert index.page(pid=Player('nobody').id) == []
+    with pytest.raises(KeyError):
+        index.page(after=12345)
+
+
+def test_rebuild():
+    players = [Player('p%d' % i) for i in range(3)]
+    games = make_games(players, 10)
+    complete(games[0])
+    index = GameIndex()
+    index.add(games[0])
+    index.rebuild(games)
+    assert index.page(limit=100) == sorted(g.id for g in games)
+    assert games[0].id not in index.page(limit=100, active=True)
@@ -0,0 +1,53 @@
+from models import Player, Game, Frame
+from leaderboard import Leaderboard
+from benchmarks.frames import tenth
+
+
+def play(players, frames):
+    """ Play a complete game where each player bowls the same frame every
+    time """
+    g = Game(players)
+    for i in range(Game.FRAMES):
+        for player, shots in zip(players, frames):
+            g.post_frame(player, shots if i < Game.FRAMES - 1 else tenth(shots))
+    return g
+
+
+STRIKE = [Frame.Shot.strike, Frame.Shot.nil]
+SPARE = [Frame.Shot.five, Frame.Shot.spare]
+OPEN = [Frame.Shot.four, Frame.Shot.three]
+
+
+def test_leaderboard():
+    mario, luigi, peach = Player('mario'), Player('luigi'), Player('peach')
+    board = Leaderboard()
+    board.game_completed(play([mario, luigi], [OPEN, SPARE]))
+    board.game_completed(play([mario, peach], [STRIKE, OPEN]))
+
+    stats = board.get(mario.id)
+    assert (stats.games, stats.pins, stats.high) == (2, 70 + 300, 300)
+    assert (stats.strikes, stats.spares, stats.average) == (12, 0, 185.0)
+    assert board.get(luigi.id).spares == 10
+    assert board.get(Player('toad').id) is None
+
+    assert [s.pid for s in board.top(10)] == [mario.id, luigi.id, peach.id]
+    assert [s.pid for s in board.top(1)] == [mario.id]
+    assert board.rank(peach.id) == 3
+
+    # Peach's average goes past Mario's
+    board.game_completed(play([peach], [STRIKE]))
+    board.game_completed(play([peach], [STRIKE]))
+    assert [s.pid for s in board.top(10)] == [peach.id, mario.id, luigi.id]
+    assert board.rank(mario.id) == 2
+
+
+def test_leaderboard_rebuild():
+    mario, luigi = Player('mario'), Player('luigi')
+    finished = play([mario, luigi], [OPEN, SPARE])
+    unfinished = Game([mario, luigi])
+    unfinished.post_frame(mario, STRIKE)
+    board = Leaderboard()
+    board.game_completed(play([mario], [STRIKE]))
+    board.rebuild([finished, unfinished])
+    assert board.get(mario.id).games == 1
+    assert [s.pid for s in board.top(10)] == [luigi.id, mario.id]
@@ -0,0 +1,70 @@
+import metrics
+from metrics import Histogram, Registry
+
+
+def test_histogram():
+    h = Histogram('latency_seconds', 'Latency', ('step',), buckets=(0.1, 1.0))
+    h.observe(0.05, 'parse')
+    h.observe(0.1, 'parse')
+    h.observe(0.5, 'parse')
+    h.observe(5, 'parse')
+    h.observe(0.2, 'marshal')
+    assert h.count('parse') == 4
+    assert h.render() == [
+        '# HELP latency_seconds Latency',
+        '# TYPE latency_seconds histogram',
+        'latency_seconds_bucket{step="marshal",le="0.1"} 0',
+        'latency_seconds_bucket{step="marshal",le="1.0"} 1',
+        'latency_seconds_bucket{step="marshal",le="+Inf"} 1',
+        'latency_seconds_sum{step="marshal"} 0.2',
+        'latency_seconds_count{step="marshal"} 1',
+        'latency_seconds_bucket{step="parse",le="0.1"} 2',
+        'latency_seconds_bucket{step="parse",le="1.0"} 3',
+        'latency_seconds_bucket{step="parse",le="+Inf"} 4',
+        'latency_seconds_sum{step="parse"} 5.65',
+        'latency_seconds_count{step="parse"} 4',
+    ]
+    h.clear()
+    assert h.count('parse') == 0
+
+
+def test_histogram_batches():
+    h = Histogram('h', 'h')
+    h.BATCH = 10
+    for _ in range(25):
+        h.observe(0.001)
+    # Counted a batch at a time, all of them once read
+    assert len(h.pending) < 10
+    assert h.count() == 25
+
+
+def test_timed():
+    h = Histogram('h', 'h', ('step',))
+
+    @h.timed('f')
+    def f(x):
+        if x is None:
+            raise ValueError()
+        return x + 1
+    assert f(1) == 2
+    try:
+        f(None)
+    except ValueError:
+        pass
+    assert h.count('f') == 2
+
+    metrics.enabled = False
+    try:
+        f(1)
+    finally:
+        metrics.enabled = True
+    assert h.count('f') == 2
+
+
+def test_registry():
+    r = Registry()
+    r.gauge('games', 'Games in the DB', lambda: 3)
+    r.histogram('h', 'h').observe(1)
+    text = r.render()
+    assert text.startswith('# HELP games Games in the DB\n# TYPE games gauge\ngames 3\n')
+    assert 'h_count 1\n' in text
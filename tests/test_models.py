@@ -1,9 +1,172 @@
 from models import Player, Game, Frame, ModelException
+from benchmarks.frames import random_frame
 
 import pytest
+import random
 from pprint import pprint
 
 
+class ReferenceGame(object):
+    """ The original, non-incremental `Game.post_frame` bookkeeping: rescan the
+    player's frames and re-sum the totals on every post, and compare frame
+    counts across all players to detect the end of a round.
+
+    The one deviation is a strike followed by a strike and then a non-strike,
+    which the original never scored (it is worth 20 + the next ball).
+    """
+
+    def __init__(self, players):
+        self.players = players
+        self.frames = dict((p.id, []) for p in players)
+        self.totals = dict((p.id, 0) for p in players)
+        self.current_frame = 1
+        self.complete = False
+        self.turns = 0
+
+    def post_frame(self, player, shots):
+        frame = Frame(player)
+        frame.shots = shots
+        if frame.is_open():
+            frame.score = sum(frame.shots)
+            frame.complete = True
+        player_frames = self.frames[player.id]
+        player_frames.append(frame)
+        if any(filter(lambda f: not f.complete, player_frames)):
+            if len(player_frames) >= 3 and not player_frames[-3].complete:
+                if player_frames[-1].strike():
+                    player_frames[-3].score = 30
+                else:
+                    player_frames[-3].score = 20 + player_frames[-1].shots[0]
+                player_frames[-3].complete = True
+            if len(player_frames) >= 2 and not player_frames[-2].complete:
+                if player_frames[-2].strike():
+                    if player_frames[-1].strike():
+                        pass
+                    elif player_frames[-1].spare():
+                        player_frames[-2].score = 20
+                        player_frames[-2].complete = True
+                    else:
+                        player_frames[-2].score = 10 + player_frames[-1].score
+                        player_frames[-2].complete = True
+                if player_frames[-2].spare():
+                    if player_frames[-1].strike():
+                        player_frames[-2].score = 20
+                    else:
+                        player_frames[-2].score = 10 + player_frames[-1].shots[0]
+                    player_frames[-2].complete = True
+        self.totals[player.id] = sum(f.score for f in player_frames)
+        self.turns += 1
+        if len(set(map(len, self.frames.values()))) == 1:
+            if self.current_frame == 10:
+                self.complete = True
+            self.current_frame += 1
+
+
+def pins(shots):
+    """ The pins knocked down by each ball of a run of shots """
+    balls = []
+    for shot in shots:
+        if shot == Frame.Shot.strike:
+            balls.append(10)
+        elif shot == Frame.Shot.spare:
+            balls.append(10 - balls[-1])
+        elif shot >= 0:
+            balls.append(int(shot))
+    return balls
+
+
+def rack(balls):
+    """ Where a player is after bowling `balls`, by the rulebook: (frame,
+    pins standing, whether they're a fresh rack) - frame 10 once the game is
+    over """
+    i = 0
+    for frame in range(Game.FRAMES - 1):
+        if i == len(balls):
+            return frame, 10, True
+        if balls[i] == 10:
+            i += 1
+        elif i + 1 == len(balls):
+            return frame, 10 - balls[i], False
+        else:
+            i += 2
+    tenth = balls[i:]
+    if not tenth:
+        return Game.FRAMES - 1, 10, True
+    if len(tenth) == 1:
+        if tenth[0] == 10:
+            return Game.FRAMES - 1, 10, True
+        return Game.FRAMES - 1, 10 - tenth[0], False
+    if len(tenth) == 2 and tenth[0] == 10:
+        if tenth[1] == 10:
+            return Game.FRAMES - 1, 10, True
+        return Game.FRAMES - 1, 10 - tenth[1], False
+    if len(tenth) == 2 and sum(tenth) == 10:
+        return Game.FRAMES - 1, 10, True
+    return Game.FRAMES, 0, False
+
+
+def score_pins(balls):
+    """ Score `balls` by the rulebook: (score, complete) for each frame
+    begun, the score 0 until it's final """
+    frames = []
+    i = 0
+    while i < len(balls) and len(frames) < Game.FRAMES:
+        if len(frames) == Game.FRAMES - 1:
+            tenth = balls[i:]
+            marked = tenth[0] == 10 or sum(tenth[:2]) == 10
+            done = len(tenth) == (3 if marked else 2)
+            frames.append((sum(tenth) if done else 0, done))
+            break
+        if balls[i] == 10:
+            n, bonus = 1, 2
+        elif i + 1 < len(balls):
+            n, bonus = 2, int(balls[i] + balls[i + 1] == 10)
+        else:
+            frames.append((0, False))
+            break
+        counted = balls[i:i + n + bonus]
+        done = len(counted) == n + bonus
+        frames.append((sum(counted) if done else 0, done))
+        i += n
+    return frames
+
+
+def endings(balls):
+    """ Every way the frame `balls` leave off in could be finished """
+    frame = rack(balls)[0]
+    if frame == Game.FRAMES:
+        yield []
+        return
+    pending = [[]]
+    while pending:
+        more = pending.pop()
+        _, standing, _ = rack(balls + more)
+        for knocked in range(standing + 1):
+            after = more + [knocked]
+            if rack(balls + after)[0] != frame:
+                yield after
+            else:
+                pending.append(after)
+
+
+def bowl(balls):
+    """ A player's rolls after bowling `balls`, a pin count at a time """
+    rolls = Game.PlayerRolls(1)
+    for knocked in balls:
+        rolls.roll(Game.PlayerRolls.transition(rolls.state, knocked))
+    return rolls
+
+
+def check_rolls(rolls, balls):
+    """ Check a player's rolls score `balls` by the rulebook """
+    frames = score_pins(balls)
+    player = Player('ref')
+    assert [(f.score, f.complete) for f in rolls.frames(player)] == frames
+    assert rolls.total == sum(score for score, _ in frames)
+    assert pins(sum((rolls.shots(i) for i in range(rolls.nframes)), [])) == balls
+    assert (rolls.state == Game.PlayerRolls.DONE) == (rack(balls)[0] == Game.FRAMES)
+
+
 class TestPlayer(object):
     def test_create_player(self):
         p = Player('Mario Mario')
@@ -116,6 +279,220 @@ class TestGame(object):
 
         assert g.current_frame == 3
 
+        # Frames are built on demand from the compact roll storage
+        items = g.frames
+        assert [i.pid for i in items] == [p1.id, p2.id, p3.id]
+        assert items[2].frames[0].shots == [Frame.Shot.strike, Frame.Shot.nil]
+        assert items[2].frames[0].player == p3
+        assert g.get_rolls(p3.id).nframes == 2
+
+    def test_post_shots(self):
+        g, p1, p2, p3 = self._make_game()
+        assert g.post_shot(p1, 7) == Frame.Shot.seven
+        assert g.current_player == p1
+        with pytest.raises(ModelException):
+            # p1 is still bowling
+            g.post_shot(p2, 'X')
+        with pytest.raises(ModelException):
+            g.post_shot(p1, 4)
+        with pytest.raises(ModelException):
+            # the frame is in progress
+            g.post_frame(p1, [Frame.Shot.one, Frame.Shot.two])
+        assert g.post_shot(p1, 3) == Frame.Shot.spare
+        assert g.current_player == p2
+        assert g.post_shot(p2, 'X') == Frame.Shot.strike
+        assert g.get_frames(p2.id)[0].shots == [Frame.Shot.strike, Frame.Shot.nil]
+        g.post_frame(p3, [Frame.Shot.one, Frame.Shot.two])
+        g.post_shot(p1, 10)
+        assert g.totals[p1.id] == 20
+        assert g.get_frames(p1.id)[1].shots == [Frame.Shot.strike, Frame.Shot.nil]
+        assert g.version == 5
+
+    def test_tenth_frame(self):
+        p1 = Player('Mario Mario')
+        g = Game([p1])
+        for _ in range(Game.FRAMES - 1):
+            g.post_frame(p1, [Frame.Shot.strike, Frame.Shot.nil])
+        with pytest.raises(ModelException):
+            # a strike in the tenth earns two fill balls
+            g.post_frame(p1, [Frame.Shot.strike, Frame.Shot.nil])
+        g.post_frame(p1, [Frame.Shot.strike, Frame.Shot.strike, Frame.Shot.seven])
+        assert g.complete
+        assert g.totals[p1.id] == 297
+        assert g.get_frames(p1.id)[9].shots == [
+            Frame.Shot.strike, Frame.Shot.strike, Frame.Shot.seven]
+        with pytest.raises(ModelException):
+            g.post_shot(p1, 1)
+
+    def test_changed_since(self):
+        g, p1, p2, p3 = self._make_game()
+        g.post_frame(p1, [Frame.Shot.strike, Frame.Shot.nil])
+        g.post_frame(p2, [Frame.Shot.three, Frame.Shot.four])
+        g.post_frame(p3, [Frame.Shot.one, Frame.Shot.two])
+        g.post_shot(p1, 4)
+        assert [(p, f) for p, _, f in g.changed_since(0)] == [
+            (p1, [0, 1]), (p2, [0]), (p3, [0])]
+        assert [(p, f) for p, _, f in g.changed_since(3)] == [(p1, [0, 1])]
+        g.post_shot(p1, 2)
+        assert [(p, f) for p, _, f in g.changed_since(4)] == [(p1, [0, 1])]
+        assert g.changed_since(5) == []
+        # Kept through packing
+        players = dict((p.id, p) for p in (p1, p2, p3))
+        copy = Game.unpack_from(g.pack(), 0, players)[0]
+        assert [(p, f) for p, _, f in copy.changed_since(2)] == [
+            (p1, [0, 1]), (p3, [0])]
+
+    def test_snapshots(self):
+        g, p1, p2, p3 = self._make_game()
+        before = g.snapshot()
+        assert before is not g and before.snapshot() is before
+        g.post_frame(p1, [Frame.Shot.strike, Frame.Shot.nil])
+        g.post_shot(p2, 7)
+        after = g.snapshot()
+        # Earlier snapshots don't change
+        assert (before.version, before.started, before.current_player) == (
+            0, False, None)
+        assert before.get_rolls(p1.id).state == Game.PlayerRolls.START
+        assert before.totals == dict((p.id, 0) for p in (p1, p2, p3))
+        assert (after.version, after.current_player) == (2, p2)
+        assert after.get_frames(p2.id)[0].shots == [Frame.Shot.seven,
+                                                    Frame.Shot.notyet]
+        # Players who haven't rolled share their PlayerRolls
+        assert after.get_rolls(p3.id) is before.get_rolls(p3.id)
+        assert after.get_rolls(p1.id) is not before.get_rolls(p1.id)
+        g.post_shot(p2, 1)
+        assert g.snapshot().get_rolls(p1.id) is after.get_rolls(p1.id)
+        assert after.get_frames(p2.id)[0].shots[1] == Frame.Shot.notyet
+        # Snapshots can't be posted to, and follow the game's ID
+        with pytest.raises(ModelException):
+            after.post_frame(p3, [Frame.Shot.one, Frame.Shot.two])
+        g.id = 12345
+        assert g.snapshot().id == 12345 and after.id != 12345
+
+    def test_post_bad_frame(self):
+        g, p1, p2, p3 = self._make_game()
+        with pytest.raises(ModelException):
+            g.post_frame(p1, [Frame.Shot.one])
+        assert len(g.get_frames(p1.id)) == 0
+
+
+class TestRandomGames(object):
+    @pytest.mark.parametrize('seed', range(20))
+    def test_matches_reference(self, seed):
+        rng = random.Random(seed)
+        players = [Player('player %d' % i) for i in range(rng.randint(1, 30))]
+        for i, p in enumerate(players):
+            # Random IDs may collide
+            p.id = i + 1
+        g = Game(players)
+        ref = ReferenceGame(players)
+        while not g.complete:
+            player = players[ref.turns % len(players)]
+            assert g.current_player in (None, player)
+            if g.current_frame == Game.FRAMES:
+                # The original never scored fill balls - check the tenth
+                # against the rulebook
+                g.post_frame(player, random_frame(rng, True))
+                rolls = g.get_rolls(player.id)
+                check_rolls(rolls, pins(rolls.rolls))
+                ref.turns += 1
+                continue
+            shots = random_frame(rng)
+            g.post_frame(player, shots)
+            ref.post_frame(player, shots)
+            assert g.totals == ref.totals
+            assert g.current_frame == ref.current_frame
+            assert g.complete == ref.complete
+            for p in (player, players[0]):
+                assert ([(f.score, f.complete, f.shots) for f in g.get_frames(p.id)] ==
+                        [(f.score, f.complete, f.shots) for f in ref.frames[p.id]])
+        assert ref.turns == Game.FRAMES * len(players)
+        assert g.totals == dict((p.id, g.get_rolls(p.id).total) for p in players)
+        with pytest.raises(ModelException):
+            g.post_frame(g.current_player, random_frame(rng))
+
+
+class TestScoringTable(object):
+    """ The transition table against the rulebook """
+
+    def states(self):
+        """ The balls to reach every state the table has, one way each """
+        seen = {Game.PlayerRolls.START: []}
+        pending = [[]]
+        while pending:
+            balls = pending.pop()
+            rolls = bowl(balls)
+            for knocked in range(11):
+                try:
+                    t = Game.PlayerRolls.transition(rolls.state, knocked)
+                except ModelException:
+                    continue
+                if t[0] not in seen:
+                    seen[t[0]] = balls + [knocked]
+                    pending.append(balls + [knocked])
+        return seen
+
+    def test_every_transition(self):
+        states = self.states()
+        assert len(states) * Game.PlayerRolls.SYMBOLS == \
+            len(Game.PlayerRolls.TRANSITIONS)
+        for state, balls in states.items():
+            frame, standing, fresh = rack(balls)
+            for shot in list(range(11)) + ['X', '/']:
+                if shot == 'X':
+                    knocked, legal = 10, fresh
+                elif shot == '/':
+                    knocked, legal = standing, not fresh
+                else:
+                    knocked, legal = shot, shot <= standing
+                rolls = bowl(balls)
+                assert rolls.state == state
+                if frame == Game.FRAMES or not legal:
+                    with pytest.raises(ModelException):
+                        Game.PlayerRolls.transition(state, shot)
+                    continue
+                over = rolls.roll(Game.PlayerRolls.transition(state, shot))
+                check_rolls(rolls, balls + [knocked])
+                assert over == (rack(balls + [knocked])[0] != frame)
+
+    def packed(self, rolls):
+        buf = bytearray(Game.PlayerRolls.PACKED.size)
+        rolls.pack_into(buf, 0)
+        return buf, 0
+
+    @pytest.mark.parametrize('start', [
+        [1, 2] * 8,
+        [3, 4] * 7 + [6, 4],
+        [3, 4] * 7 + [10],
+        [3, 4] * 6 + [10, 10],
+    ], ids=['open', 'spare', 'strike', 'double'])
+    def test_every_ending(self, start):
+        """ Every ninth and tenth frame, after every kind of eighth """
+        base = bowl(start)
+        ninths = list(endings(start))
+        assert len(ninths) == 66
+        count = 0
+        for ninth in ninths:
+            for tenth in endings(start + ninth):
+                rolls = Game.PlayerRolls.unpack_from(*self.packed(base))
+                for knocked in ninth + tenth:
+                    rolls.roll(Game.PlayerRolls.transition(rolls.state, knocked))
+                assert rolls.state == Game.PlayerRolls.DONE
+                frames = score_pins(start + ninth + tenth)
+                assert rolls.total == sum(score for score, _ in frames)
+                assert rolls.complete == (1 << Game.FRAMES) - 1
+                assert [rolls.scores[i] for i in range(Game.FRAMES)] == \
+                    [score for score, _ in frames]
+                count += 1
+        assert count == 66 * 241
+
+    def test_perfect_game(self):
+        rolls = bowl([10] * 12)
+        assert rolls.total == 300
+        assert rolls.shots(9) == [Frame.Shot.strike] * 3
+        with pytest.raises(ModelException):
+            bowl([10] * 13)
+
 
 class TestFrame(object):
     def test_create_frame(self):
@@ -124,3 +501,32 @@ class TestFrame(object):
         assert f1.score == 0
         assert f1.player == p1
         assert f1.shots == [Frame.Shot.notyet, Frame.Shot.notyet]
+
+
+    @pytest.mark.parametrize('markings, shots', [
+        (['X', None], [Frame.Shot.strike, Frame.Shot.nil]),
+        ([7, '/'], [Frame.Shot.seven, Frame.Shot.spare]),
+        ([0, 10], [Frame.Shot.zero, Frame.Shot.spare]),
+        ([4, 5], [Frame.Shot.four, Frame.Shot.five]),
+        ((0, 0), [Frame.Shot.zero, Frame.Shot.zero]),
+    ])
+    def test_decode(self, markings, shots):
+        assert list(Frame.decode(markings)) == shots
+
+    @pytest.mark.parametrize('markings', [
+        [7, 5], ['/', 3], ['X', 0], [None, 'X'], [10, None], [1], [1, 2, 3],
+        [-1, 2], ['Q', 1], [[1], 2], 'X', None, {}, [True, 2], [1, False],
+        [7.0, 2], [4, 5.0],
+    ])
+    def test_decode_invalid(self, markings):
+        with pytest.raises(ValueError):
+            Frame.decode(markings)
+
+    def test_convert(self):
+        assert Frame.Shot.convert('X') == Frame.Shot.strike
+        assert Frame.Shot.convert('/') == Frame.Shot.spare
+        assert Frame.Shot.convert(None) == Frame.Shot.nil
+        assert Frame.Shot.convert(7) is Frame.Shot.seven
+        for marking in ('Q', 10, [1], True, False, 7.0):
+            with pytest.raises(ValueError):
+                Frame.Shot.convert(marking)
@@ -0,0 +1,318 @@
+from models import Player, Game, Frame
+from persistence import (DB, MemoryStorage, SQLiteStorage, JournalStorage,
+                         SharedMemoryStorage, TieredStorage)
+from benchmarks.frames import tenth
+
+import threading
+import time
+
+import pytest
+from flask_restful import marshal
+
+
+@pytest.fixture(params=['memory', 'sqlite', 'journal', 'tiered'])
+def storage(request, tmpdir):
+    if request.param == 'memory':
+        s = MemoryStorage()
+    elif request.param == 'sqlite':
+        s = SQLiteStorage(str(tmpdir.join('bowling.db')))
+    elif request.param == 'tiered':
+        s = TieredStorage(str(tmpdir.join('bowling.archive')))
+    else:
+        s = JournalStorage(str(tmpdir.join('bowling.journal')))
+    yield s
+    s.close()
+
+
+def play(storage, frames):
+    """ Create 2 players and a game, and post `frames` to it in turn """
+    p1, p2 = Player('mario'), Player('luigi')
+    storage.add(p1)
+    storage.add(p2)
+    g = Game([p1, p2])
+    storage.add(g)
+    for shots in frames:
+        player = g.current_player or p1
+        if g.current_frame == Game.FRAMES:
+            shots = tenth(shots)
+        g.post_frame(player, shots)
+        storage.frame_posted(g, player, shots)
+    return g
+
+
+FRAMES = [
+    [Frame.Shot.strike, Frame.Shot.nil],
+    [Frame.Shot.three, Frame.Shot.four],
+    [Frame.Shot.seven, Frame.Shot.spare],
+    [Frame.Shot.strike, Frame.Shot.nil],
+    [Frame.Shot.one, Frame.Shot.two],
+]
+
+
+def test_tables(storage):
+    g = play(storage, FRAMES)
+    assert storage.table(Game)[g.id] is g
+    assert set(storage.table(Player)) == set(p.id for p in g.players)
+
+
+def test_add_clashing_id(storage):
+    p1, p2 = Player('mario'), Player('luigi')
+    storage.add(p1)
+    p2.id = p1.id
+    storage.add(p2)
+    assert p2.id != p1.id
+    assert storage.table(Player)[p1.id] is p1
+    assert storage.table(Player)[p2.id] is p2
+
+
+def test_lock(storage):
+    g = play(storage, FRAMES)
+    assert storage.lock(g.id) is storage.lock(g.id)
+    with storage.lock(g.id):
+        with storage.lock(g.id):
+            pass
+
+
+def test_sqlite_reload(tmpdir):
+    path = str(tmpdir.join('bowling.db'))
+    s = SQLiteStorage(path)
+    g = play(s, FRAMES)
+    s.close()
+    s = SQLiteStorage(path)
+    loaded = s.table(Game)[g.id]
+    assert marshal(loaded, Game.serialize) == marshal(g, Game.serialize)
+    assert loaded.players[0] is s.table(Player)[g.players[0].id]
+    s.close()
+
+
+def test_sqlite_pool(tmpdir):
+    """ Threads that come and go don't leave connections behind """
+    s = SQLiteStorage(str(tmpdir.join('bowling.db')))
+    for i in range(50):
+        t = threading.Thread(target=s.add, args=(Player('bowler %d' % i),))
+        t.start()
+        t.join()
+    assert len(s._pool) <= SQLiteStorage.POOL_SIZE
+    s.close()
+    s = SQLiteStorage(str(tmpdir.join('bowling.db')))
+    assert len(s.table(Player)) == 50
+    s.close()
+
+
+@pytest.mark.parametrize('snapshot_every', [0, 1, 4])
+def test_journal_reload(tmpdir, snapshot_every):
+    path = str(tmpdir.join('bowling.journal'))
+    s = JournalStorage(path, snapshot_every=snapshot_every)
+    g = play(s, FRAMES)
+    s.add(Player('a rather long name, longer than 12 bytes'))
+    s.close()
+    s = JournalStorage(path, snapshot_every=snapshot_every)
+    loaded = s.table(Game)[g.id]
+    assert marshal(loaded, Game.serialize) == marshal(g, Game.serialize)
+    assert (sorted(p.name for p in s.table(Player).values()) ==
+            sorted(['luigi', 'mario', 'a rather long name, longer than 12 bytes']))
+    # Keep going after recovery
+    loaded.post_frame(loaded.current_player, FRAMES[0])
+    s.frame_posted(loaded, loaded.players[1], FRAMES[0])
+    s.close()
+    s = JournalStorage(path, snapshot_every=snapshot_every)
+    assert s.table(Game)[g.id].totals == loaded.totals
+    s.close()
+
+
+@pytest.mark.parametrize('backend', ['sqlite', 'journal'])
+def test_reload_shots(tmpdir, backend):
+    """ Shots posted one at a time come back, tenth frame fill balls and all
+    """
+    path = str(tmpdir.join('bowling.%s' % backend))
+    make = SQLiteStorage if backend == 'sqlite' else JournalStorage
+    s = make(path)
+    g = play(s, FRAMES * 3 + FRAMES[:3])
+    for shot in ('X', 'X', 7, 4, '/', 'X'):
+        player = g.current_player
+        s.frame_posted(g, player, (g.post_shot(player, shot),))
+    assert g.complete
+    s.close()
+    s = make(path)
+    loaded = s.table(Game)[g.id]
+    assert marshal(loaded, Game.serialize) == marshal(g, Game.serialize)
+    assert loaded.complete
+    s.close()
+
+
+def test_journal_torn_write(tmpdir):
+    path = str(tmpdir.join('bowling.journal'))
+    s = JournalStorage(path, snapshot_every=0)
+    g = play(s, FRAMES)
+    s.close()
+    with open(path, 'ab') as f:
+        f.write(b'\x03partial')
+    s = JournalStorage(path, snapshot_every=0)
+    assert s.table(Game)[g.id].totals == g.totals
+    s.close()
+    assert tmpdir.join('bowling.journal').size() % JournalStorage.RECORD.size == 0
+
+
+def test_journal_snapshot_mid_post(tmpdir):
+    # Another thread snapshots between a frame being posted and journaled
+    path = str(tmpdir.join('bowling.journal'))
+    s = JournalStorage(path, snapshot_every=0)
+    g = play(s, FRAMES)
+    shots = [Frame.Shot.four, Frame.Shot.four]
+    player = g.current_player
+    g.post_frame(player, shots)
+    s.snapshot()
+    s.frame_posted(g, player, shots)
+    s.close()
+    s = JournalStorage(path, snapshot_every=0)
+    assert marshal(s.table(Game)[g.id], Game.serialize) == marshal(g, Game.serialize)
+    s.close()
+
+
+def test_journal_snapshot_during_post(tmpdir):
+    # A snapshot taken while a frame is being rolled into a game has the game
+    # as it was before the post
+    path = str(tmpdir.join('bowling.journal'))
+    s = JournalStorage(path, snapshot_every=0)
+    g = play(s, FRAMES)
+    shots = [Frame.Shot.four, Frame.Shot.four]
+    player = g.current_player
+    seat = g._seats[player.id]
+    rolls = g._rolls[seat]
+    t = rolls.frame_transition(rolls.state, shots)
+    g._rolls[seat] = rolls = rolls.copy()
+    rolls.roll_frame(t, g.version + 1)
+    s.snapshot()
+    g._end_turn()
+    g.version += 1
+    g._publish()
+    s.frame_posted(g, player, shots)
+    s.close()
+    s = JournalStorage(path, snapshot_every=0)
+    assert marshal(s.table(Game)[g.id], Game.serialize) == marshal(g, Game.serialize)
+    s.close()
+
+
+def test_journal_snapshot_while_adding(tmpdir):
+    # Another thread adds a player while a snapshot is being written - here,
+    # as the snapshot reads a player's name
+    path = str(tmpdir.join('bowling.journal'))
+    s = JournalStorage(path, snapshot_every=0)
+
+    class Adding(Player):
+        @property
+        def name(self):
+            if not self.added:
+                self.added = True
+                MemoryStorage.add(s, Player('late'))
+            return self._name
+
+    mario = Player('mario')
+    s.add(mario)
+    s.add(Player('luigi'))
+    mario.__class__ = Adding
+    mario._name, mario.added = 'mario', False
+    s.snapshot()
+    assert len(s.table(Player)) == 3
+    s.close()
+    s = JournalStorage(path)
+    assert sorted(p.name for p in s.table(Player).values()) == ['luigi', 'mario']
+    s.close()
+
+
+def test_shared(tmpdir):
+    path = str(tmpdir.join('bowling.shm'))
+    s = SharedMemoryStorage(path, players=16, games=4)
+    g = play(s, FRAMES)
+    # Another worker attaching to the same file sees the same data
+    other = SharedMemoryStorage(path, players=1000, games=1000)
+    for storage in (s, other):
+        loaded = storage.table(Game)[g.id]
+        assert loaded is not g
+        assert marshal(loaded, Game.serialize) == marshal(g, Game.serialize)
+        assert sorted(storage.table(Player)) == sorted(p.id for p in g.players)
+        assert len(storage.table(Game)) == 1
+        assert storage.table(Player)[g.players[0].id].name == 'mario'
+    assert 12345 not in other.table(Game)
+    assert other.table(Game).get(12345) is None
+    other.close()
+    s.close()
+
+
+def test_shared_full(tmpdir):
+    s = SharedMemoryStorage(str(tmpdir.join('bowling.shm')), players=2,
+                            games=1, max_players=2)
+    p1, p2 = Player('mario'), Player('luigi')
+    s.add(p1)
+    p2.id = p1.id
+    s.add(p2)
+    assert p2.id != p1.id
+    with pytest.raises(IOError):
+        s.add(Player('peach'))
+    with pytest.raises(ValueError):
+        s.add(Game([p1, p2, p1]))
+    s.add(Game([p1, p2]))
+    with pytest.raises(IOError):
+        s.add(Game([p1, p2]))
+    s.close()
+
+
+def test_tiered(tmpdir):
+    s = TieredStorage(str(tmpdir.join('bowling.archive')), idle=60,
+                      cache_size=2)
+    games = [play(s, FRAMES * 4) for _ in range(5)]
+    playing = play(s, FRAMES)
+    assert all(g.complete for g in games)
+    expected = dict((g.id, marshal(g, Game.serialize)) for g in games)
+    # Nothing's been idle long enough yet
+    s.archive_idle()
+    assert len(s.games) == 6
+    # Two minutes later - but reading a game keeps it in memory
+    for gid in s._idle:
+        s._idle[gid] -= 120
+    assert s.table(Game)[games[0].id] is games[0]
+    s.archive_idle(time.time() + 2)
+    assert sorted(s.games) == sorted([games[0].id, playing.id])
+
+    table = s.table(Game)
+    assert len(table) == 6
+    assert sorted(table) == sorted(g.id for g in games + [playing])
+    for g in games[1:]:
+        assert g.id in table
+        loaded = table[g.id]
+        assert loaded is not g
+        assert marshal(loaded, Game.serialize) == expected[g.id]
+    # The last ones read are cached
+    assert table[games[4].id] is table[games[4].id]
+    assert 12345 not in table
+    assert table.get(12345) is None
+    with s.lock(games[1].id):
+        pass
+    assert s.lock(playing.id) is not s.lock(games[1].id)
+    s.close()
+
+
+def test_tiered_max_hot(tmpdir):
+    s = TieredStorage(str(tmpdir.join('bowling.archive')), max_hot=4)
+    s.BATCH = 2
+    games = [play(s, FRAMES * 4) for _ in range(6)]
+    # Archived early - least recently used first - to keep under the cap
+    assert len(s.games) <= 4
+    assert games[-1].id in s.games
+    assert games[0].id not in s.games
+    assert len(s.table(Game)) == 6
+    assert s.table(Game)[games[0].id].totals == games[0].totals
+    s.close()
+
+
+def test_use(tmpdir):
+    old = DB.storage
+    try:
+        DB.configure({'DB_BACKEND': 'sqlite',
+                      'DB_PATH': str(tmpdir.join('bowling.db'))})
+        assert isinstance(DB.storage, SQLiteStorage)
+        p = DB.add(Player('toad'))
+        assert DB.get(Player)[p.id] is p
+        assert DB.players is DB.get(Player)
+    finally:
+        DB.use(old)
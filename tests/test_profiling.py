@@ -0,0 +1,104 @@
+import cProfile
+import io
+import json
+import os
+
+import app
+import profiling
+
+
+def post(client, path, data, headers=None):
+    return client.post(path, data=json.dumps(data), headers=headers,
+                       content_type='application/json')
+
+
+def game(client, players):
+    pids = [json.loads(post(client, '/player', dict(name='bowler %d' % i)).data)['id']
+            for i in range(players)]
+    gid = json.loads(post(client, '/game', dict(players=pids)).data)['id']
+    return gid, pids
+
+
+def test_instrument(tmpdir):
+    directory = str(tmpdir.join('profiles'))
+    wsgi_app = app.app.wsgi_app
+    profiler = profiling.instrument(app.app, directory, keep=3)
+    try:
+        client = app.app.test_client()
+        gid, pids = game(client, 3)
+        # Only requests with the header are profiled
+        assert os.listdir(directory) == []
+        post(client, '/game/%d/player/%d/frame' % (gid, pids[0]),
+             dict(shots=[7, '/']), headers={'X-Profile': '1'})
+        client.get('/games', headers={'X-Profile': '1'})
+        names = sorted(os.listdir(directory))
+        assert len(names) == 2
+        tags = [profiling.Tags.parse(name) for name in names]
+        assert [(t.route, t.method, t.gid, t.players) for t in tags] == [
+            ('restframerecorder', 'POST', gid, 3), ('restgamelist', 'GET', 0, 0)]
+        assert tags[0].process == os.getpid()
+    finally:
+        app.app.wsgi_app = wsgi_app
+
+    profiling.instrument(app.app, directory, header=None, sample=1.0, keep=3)
+    try:
+        # Sampled, and only the latest kept
+        client.get('/game/%d' % gid, headers={'X-Profile': '1'})
+        client.get('/game/%d' % gid)
+        names = sorted(os.listdir(directory))
+        assert len(names) == 3
+        assert [profiling.Tags.parse(n).route for n in names] == [
+            'restgamelist', 'restgame', 'restgame']
+    finally:
+        app.app.wsgi_app = wsgi_app
+
+
+def test_report(tmpdir):
+    directory = str(tmpdir.join('profiles'))
+    wsgi_app = app.app.wsgi_app
+    profiling.instrument(app.app, directory)
+    try:
+        client = app.app.test_client()
+        big, pids = game(client, 6)
+        for pid in pids:
+            post(client, '/game/%d/player/%d/frame' % (big, pid),
+                 dict(shots=['X', None]), headers={'X-Profile': 'yes'})
+        small, (pid,) = game(client, 1)
+        post(client, '/game/%d/player/%d/frame' % (small, pid),
+             dict(shots=[1, 2]), headers={'X-Profile': 'yes'})
+        client.get('/game/%d' % small, headers={'X-Profile': 'yes'})
+    finally:
+        app.app.wsgi_app = wsgi_app
+    assert len(profiling.collect(directory)) == 8
+    assert len(profiling.collect(directory, method='post')) == 7
+    assert len(profiling.collect(directory, players=6)) == 6
+    assert len(profiling.collect(directory, gid=small)) == 2
+
+    out = io.StringIO()
+    profiling.report(profiling.collect(directory, route='restframerecorder',
+                                       players=6), top=None, stream=out)
+    out = out.getvalue()
+    assert out.startswith('6 profiles\n       6  POST restframerecorder\n')
+    assert 'frame_for_player' in out
+    assert 'post_frame' in out
+
+    out = io.StringIO()
+    profiling.report([], stream=out)
+    assert out.getvalue() == '0 profiles\n'
+
+
+def test_names(tmpdir):
+    profiler = profiling.Profiler(str(tmpdir))
+    tags = profiling.Tags(1760798708.5, 123, 'restgame', 'GET', 9, 4)
+    assert tags.name() == '1760798708500000-123-restgame-GET-9-4.prof'
+    parsed = profiling.Tags.parse(tags.name())
+    assert [getattr(parsed, k) for k in profiling.Tags.__slots__] == [
+        1760798708.5, 123, 'restgame', 'GET', 9, 4]
+    assert profiling.Tags.parse('notes.txt') is None
+    assert profiling.Tags.parse('1-2-three.prof') is None
+    # Requests in the same microsecond don't overwrite each other
+    paths = [profiler.dump(cProfile.Profile(),
+                           profiling.Tags(1760798708.5, 123, 'restgame', 'GET'))
+             for _ in range(3)]
+    assert len(set(paths)) == 3
+    assert sorted(os.listdir(str(tmpdir))) == [os.path.basename(p) for p in paths]
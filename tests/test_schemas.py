@@ -0,0 +1,56 @@
+import json
+
+import pytest
+from werkzeug.exceptions import HTTPException
+
+import app
+from schemas import Schema, Argument
+
+
+body = Schema('json',
+              Argument('name', str, required=True),
+              Argument('shots', list),
+              Argument('kind', default='open', choices=('open', 'closed')))
+query = Schema('args', Argument('limit', int, default=20), Argument('after', int))
+
+
+def parse(schema, **context):
+    with app.app.test_request_context('/', **context):
+        return schema.parse()
+
+
+def post(data, content_type='application/json'):
+    return dict(method='POST', data=data, content_type=content_type)
+
+
+def error(schema, **context):
+    with pytest.raises(HTTPException) as e:
+        parse(schema, **context)
+    return e.value.code, e.value.data['message']
+
+
+def test_json():
+    assert parse(body, **post('{"name": "mario", "shots": [1, 2]}')) == \
+        dict(name='mario', shots=[1, 2], kind='open')
+    assert parse(body, **post('{"name": 5, "shots": null, "kind": "closed"}')) == \
+        dict(name='5', shots=None, kind='closed')
+    assert parse(body, **post('{"name": "x"}', 'application/vnd.api+json'))['name'] == 'x'
+
+
+def test_json_errors():
+    missing = {'name': 'Missing required parameter in the JSON body'}
+    assert error(body, **post('{}')) == (400, missing)
+    assert error(body, **post('[1, 2]')) == (400, missing)
+    assert error(body, **post('{"name": "a", "shots": "X"}')) == \
+        (400, {'shots': 'shots must be a list'})
+    assert error(body, **post('{"name": "a", "kind": "odd"}')) == \
+        (400, {'kind': 'odd is not a valid choice'})
+    assert error(body, **post('{nope'))[0] == 400
+    assert error(body, **post(''))[0] == 400
+    assert error(body, **post(json.dumps(dict(name='a')), 'text/plain'))[0] == 415
+
+
+def test_query():
+    assert parse(query, query_string='limit=5') == dict(limit=5, after=None)
+    assert error(query, query_string='after=x') == \
+        (400, {'after': "invalid literal for int() with base 10: 'x'"})
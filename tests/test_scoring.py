@@ -0,0 +1,57 @@
+from models import Player, Game
+from benchmarks.frames import random_frame
+
+import pytest
+import random
+
+np = pytest.importorskip('numpy')
+import scoring
+
+X, S, N, T = -1, -2, -3, -4
+
+
+def row(*rolls):
+    return list(rolls) + [T] * (Game.ROLLS - len(rolls))
+
+
+class TestScore(object):
+    def test_known_games(self):
+        s = scoring.score([
+            row(*[X, N] * 9 + [X, X, X]),
+            row(*[5, S] * 9 + [5, S, 5]),
+            row(*[9, 0] * 10),
+            row(*[X, N] * 9 + [7, 2]),
+            row(*[0, 0] * 9 + [X, 5, S]),
+            row(X, N, X, N, 4),
+            row(),
+        ])
+        assert s.totals[:, -1].tolist() == [300, 150, 90, 265, 20, 24, 0]
+        assert s.frames[3].tolist() == [30] * 7 + [27, 19, 9]
+        # strike, strike, and a ball: only the first strike can be scored
+        assert s.frames[5].tolist()[:3] == [24, 0, 0]
+        assert s.complete[5].tolist()[:3] == [True, False, False]
+        assert not s.complete[6].any()
+
+    def test_bad_shape(self):
+        with pytest.raises(ValueError):
+            scoring.score([[0] * 20])
+
+    def test_matches_games(self):
+        rng = random.Random(42)
+        games = []
+        for _ in range(50):
+            players = [Player('p%d' % i) for i in range(rng.randint(1, 6))]
+            g = Game(players)
+            g.id = len(games) + 1
+            for i in range(rng.randint(0, 10 * len(players))):
+                g.post_frame(players[i % len(players)],
+                             random_frame(rng, g.current_frame == Game.FRAMES))
+            games.append(g)
+        rolls, keys = scoring.export(games)
+        assert rolls.shape == (len(keys), Game.ROLLS)
+        s = scoring.score(rolls)
+        by_id = dict((g.id, g) for g in games)
+        for i, (gid, pid) in enumerate(keys):
+            frames = by_id[gid].get_frames(pid)
+            assert s.frames[i, :len(frames)].tolist() == [f.score for f in frames]
+            assert s.totals[i, -1] == by_id[gid].totals[pid]
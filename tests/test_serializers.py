@@ -0,0 +1,78 @@
+from models import Player, Game
+from serializers import compile_fields
+from benchmarks.frames import random_frame
+import app
+
+import json
+import random
+import pytest
+from flask_restful import fields, marshal
+
+
+def games(rng):
+    """ Games at every stage of play """
+    for count in range(1, 5):
+        players = [Player('player %d' % i) for i in range(count)]
+        g = Game(players)
+        yield g
+        while not g.complete:
+            g.post_frame(g.current_player or players[0],
+                         random_frame(rng, g.current_frame == Game.FRAMES))
+            yield g
+
+
+def test_models_match_marshal():
+    serialize_game = compile_fields(Game.serialize)
+    serialize_player = compile_fields(Player.serialize)
+    for g in games(random.Random(1)):
+        assert json.dumps(serialize_game(g)) == json.dumps(marshal(g, Game.serialize))
+        for p in g.players:
+            assert (json.dumps(serialize_player(p)) ==
+                    json.dumps(marshal(p, Player.serialize)))
+
+
+class Thing(object):
+    pass
+
+
+def test_fields_match_marshal():
+    spec = {
+        'a': fields.Integer(default=3),
+        'b': fields.String(attribute='bee'),
+        'c': fields.List(fields.List(fields.Integer)),
+        'd': fields.Nested({'x': fields.Raw}),
+        'e': fields.Nested({'x': fields.Raw}, allow_null=True),
+        'f': {'g': fields.Boolean},
+        'h': fields.Float,
+        'i': fields.List(fields.Nested({'x': fields.Integer})),
+        'j': fields.String(attribute='thing.bee'),
+    }
+    serialize = compile_fields(spec)
+    full = Thing()
+    full.a, full.bee, full.c, full.g, full.h = 1, u'bee', [[1, 2], [3]], 0, 1.5
+    full.d = full.e = full.thing = full
+    full.x, full.i = 7, [full, None]
+    for obj in (full, Thing(), None):
+        assert json.dumps(serialize(obj)) == json.dumps(marshal(obj, spec))
+
+
+@pytest.fixture
+def client():
+    return app.app.test_client()
+
+
+def test_config_switch(client):
+    mario = json.loads(client.post('/player', data=json.dumps(dict(name='mario')),
+                                   content_type='application/json').data)
+    game = json.loads(client.post('/game', data=json.dumps(dict(players=[mario['id']])),
+                                  content_type='application/json').data)
+    client.post('/game/%s/player/%s/frame' % (game['id'], mario['id']),
+                data=json.dumps(dict(shots=['X', None])),
+                content_type='application/json')
+    bodies = []
+    for serializer in ('marshal', 'compiled'):
+        app.app.config['SERIALIZER'] = serializer
+        app.RestGame.rendered.clear()
+        bodies.append(client.get('/game/%s' % game['id']).data)
+    assert bodies[0] == bodies[1]
+    assert json.loads(bodies[1])['frames'][0]['frames'][0]['shots'] == [-1, -3]
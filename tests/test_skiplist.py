@@ -0,0 +1,41 @@
+from skiplist import SkipList
+
+import bisect
+import random
+
+import pytest
+
+
+def test_skiplist_matches_sorted_list():
+    rng = random.Random(3)
+    skiplist = SkipList()
+    model = []
+    for _ in range(5000):
+        key = rng.randint(0, 500)
+        i = bisect.bisect_left(model, key)
+        if i < len(model) and model[i] == key:
+            assert skiplist.index(key) == i
+            skiplist.remove(key)
+            del model[i]
+        else:
+            skiplist.insert(key)
+            model.insert(i, key)
+        assert len(skiplist) == len(model)
+    assert list(skiplist) == model
+    assert skiplist.first(10) == model[:10]
+    assert skiplist.after(model[5], 3) == model[6:9]
+    assert skiplist.after(model[5] + 0.5, 3) == model[6:9]
+    assert skiplist.after(-1, 2) == model[:2]
+    for i, key in enumerate(model):
+        assert skiplist.index(key) == i
+
+
+def test_skiplist_missing():
+    skiplist = SkipList()
+    skiplist.insert(1)
+    with pytest.raises(KeyError):
+        skiplist.insert(1)
+    with pytest.raises(KeyError):
+        skiplist.remove(2)
+    with pytest.raises(KeyError):
+        skiplist.index(0)
@@ -0,0 +1,102 @@
+import json
+
+import app
+import traffic
+from models import Game
+from persistence import DB
+
+
+def post(client, path, data):
+    return client.post(path, data=json.dumps(data),
+                       content_type='application/json')
+
+
+def play(client):
+    """ Some traffic: two players, a game two frames in, a poll with an ETag,
+    and a bad request """
+    pids = [json.loads(post(client, '/player', dict(name=name)).data)['id']
+            for name in ('mario', 'luigi')]
+    gid = json.loads(post(client, '/game', dict(players=pids)).data)['id']
+    post(client, '/game/%d/player/%d/frame' % (gid, pids[0]), dict(shots=['X', None]))
+    resp = post(client, '/game/%d/player/%d/frame' % (gid, pids[1]), dict(shots=[7, '/']))
+    client.get('/game/%d' % gid, headers={'If-None-Match': resp.headers['ETag']})
+    client.get('/games?after=%d&limit=5' % gid)
+    post(client, '/game/%d/player/%d/frame' % (gid, pids[0]), dict(shots=[9, 9]))
+    return pids, gid
+
+
+def test_record(tmpdir):
+    path = str(tmpdir.join('traffic.jsonl'))
+    wsgi_app = app.app.wsgi_app
+    recorder = traffic.record(app.app, path)
+    try:
+        pids, gid = play(app.app.test_client())
+    finally:
+        app.app.wsgi_app = wsgi_app
+        recorder.close()
+    entries = traffic.read(path)
+    assert [(e['method'], e['path'], e['status']) for e in entries] == [
+        ('POST', '/player', 200),
+        ('POST', '/player', 200),
+        ('POST', '/game', 200),
+        ('POST', '/game/%d/player/%d/frame' % (gid, pids[0]), 200),
+        ('POST', '/game/%d/player/%d/frame' % (gid, pids[1]), 200),
+        ('GET', '/game/%d' % gid, 304),
+        ('GET', '/games', 200),
+        ('POST', '/game/%d/player/%d/frame' % (gid, pids[0]), 422),
+    ]
+    assert [e['id'] for e in entries[:3]] == pids + [gid]
+    assert json.loads(entries[3]['body']) == dict(shots=['X', None])
+    assert entries[3]['type'] == 'application/json'
+    assert entries[5]['etag'] == '"%d-2"' % gid
+    assert entries[6]['query'] == 'after=%d&limit=5' % gid
+    assert 'body' not in entries[6]
+
+
+def test_replay(tmpdir):
+    path = str(tmpdir.join('traffic.jsonl'))
+    wsgi_app = app.app.wsgi_app
+    recorder = traffic.record(app.app, path)
+    try:
+        pids, gid = play(app.app.test_client())
+    finally:
+        app.app.wsgi_app = wsgi_app
+        recorder.close()
+    results = traffic.replay(traffic.read(path), traffic.TestClient(app.app),
+                             speed=0, threads=4)
+    assert [r[1] for r in results] == [r[2] for r in results]
+    assert sorted(r[0] for r in results) == [
+        'GET /game/:id', 'GET /games', 'POST /game',
+        'POST /game/:id/player/:id/frame', 'POST /game/:id/player/:id/frame',
+        'POST /game/:id/player/:id/frame', 'POST /player', 'POST /player']
+    # The replayed game is a new one, with new players
+    games = DB.get(Game)
+    game = games[max(games)]
+    assert game.id != gid
+    assert [p.id for p in game.players] != pids
+    assert game.version == 2
+    assert game.current_frame == 2
+
+
+def test_rewrite():
+    ids = traffic.IDs([1, 2, 3])
+    ids.set(1, 11)
+    ids.set(2, 12)
+    ids.set(3, None)
+    entry = dict(path='/game/1/player/2/frame', query='after=1&limit=5',
+                 body=json.dumps(dict(players=[1, 2, 3, 4])),
+                 etag='W/"1-7"')
+    path, query, body, etag = ids.rewrite(entry)
+    assert path == '/game/11/player/12/frame'
+    assert query == 'after=11&limit=5'
+    assert json.loads(body) == dict(players=[11, 12, 3, 4])
+    assert etag == 'W/"11-7"'
+    body = ids.rewrite(dict(path='/game/1/frames', body=json.dumps(dict(
+        frames=[dict(pid=2, shots=[1, 2])]))))[2]
+    assert json.loads(body) == dict(frames=[dict(pid=12, shots=[1, 2])])
+
+
+def test_label():
+    assert traffic.label('POST', '/game/12/player/3/frame') == \
+        'POST /game/:id/player/:id/frame'
+    assert traffic.label('GET', '/games') == 'GET /games'
@@ -0,0 +1,267 @@
+""" Recording API traffic to a file, and replaying it.
+
+`record()` wraps a Flask app so every request is appended to a file as a
+line of JSON: when it arrived, the method, path, query string, body and
+If-None-Match header, the status it got, and for players and games created,
+their new ID.  Set `RECORD_TRAFFIC` to a file to record a server's traffic.
+
+`replay()` sends recorded requests again, through a `Client` - the app's test
+client in this process, or HTTP to a server - at the recorded pace, or faster
+or slower.  IDs won't come out the same on the server replayed to, so
+requests are rewritten to use the IDs of the players and games created in the
+replay, and requests for the same game are sent in order, each after the last
+one's response.  Event streams are skipped, as they never finish.
+"""
+import io
+import json
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import client as httplib
+from urllib.parse import urlsplit
+
+# Paths POSTed to to create players and games, whose IDs are recorded
+CREATES = ('/player', '/game')
+
+_ID = re.compile(r'(?<=/)\d+(?=/|$)')
+_GAME = re.compile(r'^/game/(\d+)')
+
+
+class Recorder(object):
+    """ Appends requests to a file, a line of JSON each """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'a')
+        self._lock = threading.Lock()
+
+    def write(self, entry):
+        line = json.dumps(entry, separators=(',', ':')) + '\n'
+        with self._lock:
+            self.file.write(line)
+            self.file.flush()
+
+    def close(self):
+        with self._lock:
+            self.file.close()
+
+
+def record(app, path):
+    """ Record every request to a Flask app to the file at `path`.  Returns
+    the `Recorder`. """
+    recorder = Recorder(path)
+    wsgi_app = app.wsgi_app
+
+    def recording(environ, start_response):
+        entry = {'t': time.time(),
+                 'method': environ['REQUEST_METHOD'],
+                 'path': environ.get('PATH_INFO', '/')}
+        if environ.get('QUERY_STRING'):
+            entry['query'] = environ['QUERY_STRING']
+        if environ.get('HTTP_IF_NONE_MATCH'):
+            entry['etag'] = environ['HTTP_IF_NONE_MATCH']
+        length = int(environ.get('CONTENT_LENGTH') or 0)
+        if length:
+            body = environ['wsgi.input'].read(length)
+            environ['wsgi.input'] = io.BytesIO(body)
+            # Kept exactly, even if it isn't UTF-8
+            entry['body'] = body.decode('utf-8', 'surrogateescape')
+            entry['type'] = environ.get('CONTENT_TYPE', '')
+        status = []
+
+        def starting(line, headers, exc_info=None):
+            status.append(int(line[:3]))
+            return start_response(line, headers, exc_info)
+        response = wsgi_app(environ, starting)
+        entry['status'] = status[0] if status else 500
+        if entry['method'] == 'POST' and entry['path'] in CREATES and status == [200]:
+            chunks = list(response)
+            if hasattr(response, 'close'):
+                response.close()
+            response = chunks
+            entry['id'] = json.loads(b''.join(chunks))['id']
+        recorder.write(entry)
+        return response
+    app.wsgi_app = recording
+    return recorder
+
+
+def read(path):
+    """ The requests recorded in a file, in the order they arrived """
+    with open(path) as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    entries.sort(key=lambda entry: entry['t'])
+    return entries
+
+
+def label(method, path):
+    """ What to report a request's latency under - its method and path, with
+    IDs taken out """
+    return '%s %s' % (method, _ID.sub(':id', path))
+
+
+class Client(object):
+    """ Sends requests to the API.  `request()` returns the status, the body
+    and the response's headers. """
+
+    def request(self, method, path, body=None, headers=None):
+        raise NotImplementedError
+
+
+class TestClient(Client):
+    """ Requests to a Flask app in this process, through its test client - one
+    per thread """
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def request(self, method, path, body=None, headers=None):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        resp = client.open(path, method=method, data=body, headers=headers)
+        return resp.status_code, resp.get_data(), resp.headers
+
+
+class HTTPClient(Client):
+    """ Requests to a server over HTTP, e.g. 'http://127.0.0.1:5000', with a
+    connection kept open per thread """
+
+    def __init__(self, url, timeout=30):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.prefix = parts.path.rstrip('/')
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def request(self, method, path, body=None, headers=None):
+        for attempt in (1, 2):
+            conn = getattr(self._local, 'conn', None)
+            if conn is None:
+                conn = self._local.conn = httplib.HTTPConnection(
+                    self.host, self.port, timeout=self.timeout)
+            try:
+                conn.request(method, self.prefix + path, body, headers or {})
+                resp = conn.getresponse()
+                return resp.status, resp.read(), resp.msg
+            except (httplib.HTTPException, IOError):
+                # The server closed a kept-alive connection - reconnect once
+                conn.close()
+                self._local.conn = None
+                if attempt == 2:
+                    raise
+
+
+class IDs(object):
+    """ IDs recorded for new players and games -> the IDs they got when
+    replayed.  Looking up an ID that hasn't been replayed yet waits for it. """
+
+    def __init__(self, recorded):
+        self.recorded = set(recorded)
+        self.ids = {}
+        self._cond = threading.Condition()
+
+    def set(self, old, new):
+        with self._cond:
+            self.ids[old] = new
+            self._cond.notify_all()
+
+    def get(self, old, timeout=30):
+        """ The replayed ID for `old` - or `old` if it wasn't created in the
+        recording, or its create failed when replayed """
+        if old not in self.recorded:
+            return old
+        with self._cond:
+            self._cond.wait_for(lambda: old in self.ids, timeout)
+            new = self.ids.get(old)
+        return old if new is None else new
+
+    def rewrite(self, entry):
+        """ An entry's path, query, body and If-None-Match, with replayed IDs
+        """
+        path = _ID.sub(lambda m: str(self.get(int(m.group()))), entry['path'])
+        query = entry.get('query')
+        if query and 'after=' in query:
+            query = re.sub(r'(?<=after=)\d+',
+                           lambda m: str(self.get(int(m.group()))), query)
+        body = entry.get('body')
+        if body is not None and ('"players"' in body or '"pid"' in body):
+            body = self._body(body)
+        etag = entry.get('etag')
+        if etag:
+            etag = re.sub(r'(?<=")\d+(?=-)',
+                          lambda m: str(self.get(int(m.group()))), etag)
+        return path, query, body, etag
+
+    def _body(self, body):
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return body
+        if not isinstance(data, dict):
+            return body
+        if isinstance(data.get('players'), list):
+            data['players'] = [self.get(pid) if isinstance(pid, int) else pid
+                               for pid in data['players']]
+        if isinstance(data.get('frames'), list):
+            for frame in data['frames']:
+                if isinstance(frame, dict) and isinstance(frame.get('pid'), int):
+                    frame['pid'] = self.get(frame['pid'])
+        return json.dumps(data)
+
+
+def replay(entries, client, speed=1.0, threads=16):
+    """ Send recorded requests through `client`, `speed` times as fast as
+    they were recorded - 0 for as fast as they'll go.  Returns (label,
+    recorded status, replayed status, seconds) for each request sent. """
+    entries = [e for e in entries if not e['path'].endswith('/events')]
+    ids = IDs(e['id'] for e in entries if 'id' in e)
+    results = []
+    # Game ID -> the last request sent for it, which the next waits for
+    last = {}
+
+    def send(entry, previous):
+        if previous is not None:
+            previous.exception()
+        path, query, body, etag = ids.rewrite(entry)
+        headers = {}
+        if body is not None:
+            headers['Content-Type'] = entry.get('type') or 'application/json'
+            body = body.encode('utf-8', 'surrogateescape')
+        if etag:
+            headers['If-None-Match'] = etag
+        url = path + '?' + query if query else path
+        start = time.perf_counter()
+        try:
+            status, data, _ = client.request(entry['method'], url, body, headers)
+        except Exception:
+            status, data = 0, b''
+        seconds = time.perf_counter() - start
+        if 'id' in entry:
+            new = None
+            if status == 200:
+                new = json.loads(data)['id']
+            ids.set(entry['id'], new)
+        results.append((label(entry['method'], entry['path']), entry['status'],
+                        status, seconds))
+
+    with ThreadPoolExecutor(threads) as pool:
+        if not entries:
+            return results
+        first = entries[0]['t']
+        start = time.time()
+        for entry in entries:
+            if speed:
+                wait = start + (entry['t'] - first) / speed - time.time()
+                if wait > 0:
+                    time.sleep(wait)
+            match = _GAME.match(entry['path'])
+            key = int(match.group(1)) if match else None
+            future = pool.submit(send, entry, last.get(key))
+            if key is not None:
+                last[key] = future
+    return results
+